@@ -6,8 +6,14 @@ Created on Thu Nov  6 13:23:09 2025
 """
 
 import pandas as pd
+import re
+import threading
+import time
 import unicodedata
-from collections import deque, defaultdict
+from collections import deque, defaultdict, OrderedDict
+from functools import lru_cache
+
+_WHITESPACE = re.compile(r"\s+")
 
 # =============================================================================
 # Helpers
@@ -17,9 +23,16 @@ def norm_series(s: pd.Series) -> pd.Series:
     Normalize labels (trim/collapse whitespace, Unicode NFKC).
     Matches your original behavior (keeps strings; no casefold by default).
     """
-    s = s.astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
-    s = s.map(lambda x: unicodedata.normalize("NFKC", x))
-    return s
+    s = s.astype(str)
+    # Normalize each distinct label once; history frames repeat the same names every month
+    uniq = s.unique()
+    return s.map({x: norm_label(x) for x in uniq})
+
+
+@lru_cache(maxsize=None)
+def norm_label(x) -> str:
+    """Single-label form of norm_series, memoized across every date graph."""
+    return unicodedata.normalize("NFKC", _WHITESPACE.sub(" ", str(x)).strip())
 
 
 def build_edges(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
@@ -90,14 +103,14 @@ def build_edges(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
     hi_target_orig_to_norm = {}
     if hi_target_names_orig:
         for orig_name in hi_target_names_orig:
-            norm_name = norm_series(pd.Series([orig_name]))[0]
+            norm_name = norm_label(orig_name)
             hi_target_orig_to_norm[orig_name] = norm_name
     
     # Map original (HI) source names to their normalized versions
     hi_source_orig_to_norm = {}
     if hi_source_names_orig:
         for orig_name in hi_source_names_orig:
-            norm_name = norm_series(pd.Series([orig_name]))[0]
+            norm_name = norm_label(orig_name)
             hi_source_orig_to_norm[orig_name] = norm_name
     
     # Create reverse mapping: normalized (HI) target names -> original names
@@ -255,6 +268,50 @@ def extract_paths(children: dict[str, list[str]], roots: list[str], max_depth: i
     return pd.DataFrame(paths, columns=cols)
 
 
+def reachable_levels(children: dict[str, list[str]], roots: list[str], max_depth: int = 5) -> dict[str, set[int]]:
+    """
+    0-based positions at which each node sits on some root path of at most max_depth nodes, i.e. the
+    level columns extract_paths would place it in. Each node is visited once per depth, so shared
+    sub-structures cost O((V + E) * max_depth) instead of one visit per path through them.
+    """
+    levels = defaultdict(set)
+    frontier = list(dict.fromkeys(roots))
+    for depth in range(max_depth):
+        nxt = {}
+        for n in frontier:
+            levels[n].add(depth)
+            if depth + 1 < max_depth:
+                for c in children.get(n, []):
+                    nxt[c] = None
+        frontier = list(nxt)
+    return dict(levels)
+
+
+def ordered_level_edges(children: dict[str, list[str]], roots: list[str], max_depth: int = 5, key=lambda n: n):
+    """
+    Unique (parent, child) edges between consecutive levels, in the order the sorted extract_paths
+    table would first list them. Per depth only the smallest path prefix (by key) reaching each node
+    is kept, which is all the first appearance of an edge depends on.
+    """
+    best = {r: (key(r),) for r in dict.fromkeys(roots)}
+    seen, ordered = set(), []
+    for _ in range(max_depth - 1):
+        level_pairs, nxt = [], {}
+        for u, prefix in best.items():
+            for v in children.get(u, []):
+                candidate = prefix + (key(v),)
+                level_pairs.append((candidate, u, v))
+                if v not in nxt or candidate < nxt[v]:
+                    nxt[v] = candidate
+        level_pairs.sort(key=lambda p: p[0])
+        for _, u, v in level_pairs:
+            if (u, v) not in seen:
+                seen.add((u, v))
+                ordered.append((u, v))
+        best = nxt
+    return ordered
+
+
 # =============================================================================
 # Core Generator Function
 # =============================================================================
@@ -269,7 +326,31 @@ def generate_graph_for_date(combined: pd.DataFrame, target_date: pd.Timestamp):
         df_date = combined[combined["As of date"] == target_date].copy()
     else:
         df_date = combined.copy()
+    return graph_from_snapshot(df_date)
+
 
+def generate_graphs_for_dates(combined: pd.DataFrame, target_dates=None) -> dict:
+    """
+    Generates the graphs for many dates in one grouped pass over the history instead of
+    filtering the full frame once per date. target_dates=None builds every date.
+    Returns {pd.Timestamp: (nodes, edges)}.
+    """
+    if "As of date" not in combined.columns:
+        return {}
+    history = combined
+    if target_dates is not None:
+        target_dates = [pd.Timestamp(d) for d in target_dates]
+        history = combined[combined["As of date"].isin(target_dates)]
+    graphs = {}
+    for date, df_date in history.groupby("As of date", sort=False):
+        graphs[pd.Timestamp(date)] = graph_from_snapshot(df_date.copy())
+    return graphs
+
+
+def graph_from_snapshot(df_date: pd.DataFrame):
+    """
+    Builds the nodes and edges DataFrames from the positions of a single date.
+    """
     if df_date.empty:
         # Return empty structures if no data
         return pd.DataFrame(), pd.DataFrame()
@@ -280,34 +361,14 @@ def generate_graph_for_date(combined: pd.DataFrame, target_date: pd.Timestamp):
     stats = graph_stats(edges)
     orig_label = build_original_label_map(df_date)
 
-    # 3. Compute paths
-    paths_df = extract_paths(res["children"], stats["roots"], max_depth=5)
-    paths_df = paths_df.map(lambda x: orig_label.get(x, x) if pd.notna(x) else None)
-    paths_df = paths_df.sort_values(
-        by=list(paths_df.columns), 
-        ascending=[True] * len(paths_df.columns),
-        na_position='last'
-    ).reset_index(drop=True)
+    # 3. Walk the DAG once per level instead of listing every root-to-leaf path
+    label = lambda n: orig_label.get(n, n)
+    max_depth = 5
+    levels = reachable_levels(res["children"], stats["roots"], max_depth=max_depth)
 
     # 4. Build Edges (Cytoscape ready)
-    cols = [c for c in paths_df.columns if c.lower().startswith("level")]
-    paths_df_levels = paths_df[cols]
-    
-    edge_rows = []
-    for i in range(len(cols) - 1):
-        src_col, dst_col = cols[i], cols[i + 1]
-        pair = (
-            paths_df_levels[[src_col, dst_col]]
-            .dropna()
-            .drop_duplicates()
-            .rename(columns={src_col: "source", dst_col: "target"})
-        )
-        edge_rows.append(pair)
-    
-    if edge_rows:
-        edges_out = pd.concat(edge_rows, ignore_index=True).drop_duplicates()
-    else:
-        edges_out = pd.DataFrame(columns=["source", "target"])
+    pairs = ordered_level_edges(res["children"], stats["roots"], max_depth=max_depth, key=label)
+    edges_out = pd.DataFrame([(label(u), label(v)) for u, v in pairs], columns=["source", "target"])
 
     # Merge attributes
     edges_out = edges_out.merge(
@@ -321,25 +382,18 @@ def generate_graph_for_date(combined: pd.DataFrame, target_date: pd.Timestamp):
     hi_target_mask = edges_out["target"].astype(str).str.endswith("(HI)")
     edges_out.loc[~hi_target_mask, "percentage"] = edges_out.loc[~hi_target_mask, "percentage"].fillna(1.0)
 
-    # 5. Build Nodes
-    nodes_long = (
-        paths_df_levels.melt(var_name="level_col", value_name="label")
-        .dropna()
-        .drop_duplicates()
-    )
-    if not nodes_long.empty:
-        nodes_long["level"] = nodes_long["level_col"].str.extract(r"(\d+)").astype(int)
-        nodes_max_level = (
-            nodes_long.groupby("label")["level"].max().reset_index()
-            .rename(columns={"label": "id", "level": "max_level"})
+    # 5. Build Nodes (level = deepest position the node reaches on any path)
+    if levels:
+        nodes = (
+            pd.DataFrame([(label(n), max(depths) + 1) for n, depths in levels.items()], columns=["id", "level"])
+            .sort_values("id").reset_index(drop=True)
         )
-        nodes = nodes_max_level.rename(columns={"max_level": "level"}).copy()
         nodes["max_level"] = nodes["level"]
     else:
         nodes = pd.DataFrame(columns=["id", "label", "level", "max_level", "balance"])
 
     # 6. Calculate Balances
-    orig_to_norm = {orig: norm_series(pd.Series([orig]))[0] for orig in nodes["id"].unique()}
+    orig_to_norm = {orig: norm_label(orig) for orig in nodes["id"].unique()}
     
     outgoing_edge_sums = edges.groupby("src")["position_value"].sum().to_dict()
     incoming_edge_sums = edges.groupby("dst")["position_value"].sum().to_dict()
@@ -361,7 +415,7 @@ def generate_graph_for_date(combined: pd.DataFrame, target_date: pd.Timestamp):
     hi_nodes_norm_set = set()
     for node_id in nodes["id"]:
         if str(node_id).endswith("(HI)"):
-            node_norm = orig_to_norm.get(node_id, norm_series(pd.Series([node_id]))[0])
+            node_norm = orig_to_norm.get(node_id, norm_label(node_id))
             hi_nodes_norm_set.add(node_norm)
     
     parents_of_hi = set()
@@ -393,8 +447,8 @@ def generate_graph_for_date(combined: pd.DataFrame, target_date: pd.Timestamp):
         target = str(row["target"])
         source = str(row["source"])
         if target.endswith("(HI)"):
-            source_norm = orig_to_norm.get(source, norm_series(pd.Series([source]))[0])
-            target_norm = orig_to_norm.get(target, norm_series(pd.Series([target]))[0])
+            source_norm = orig_to_norm.get(source, norm_label(source))
+            target_norm = orig_to_norm.get(target, norm_label(target))
             original_edge_value = row["position_value"]
             hi_node_total_value = hi_total_values_from_edges.get(target_norm, 0.0)
             hi_children_of_parent = parent_to_hi_children.get(source_norm, [])
@@ -417,39 +471,189 @@ def generate_graph_for_date(combined: pd.DataFrame, target_date: pd.Timestamp):
     return nodes, edges_out
 
 
+class GraphCache:
+    """
+    Per-date cache of generated graphs, evicting the least recently used dates once the estimated
+    DataFrame memory passes max_bytes. build(nodes, edges) turns each generated graph into the
+    stored value (default: the (nodes, edges) tuple), so callers can keep prebuilt indexes with it.
+    Safe to share between the Dash request threads and the background precompute thread.
+    Cached values must not be mutated.
+    """
+    def __init__(self, combined: pd.DataFrame, max_bytes: int, build=None):
+        self.combined = combined
+        self.max_bytes = max_bytes
+        self.build = build or (lambda nodes, edges: (nodes, edges))
+        self.size_bytes = 0
+        self._graphs = OrderedDict()  # date -> (value, size)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _graph_size(nodes: pd.DataFrame, edges: pd.DataFrame) -> int:
+        return int(nodes.memory_usage(deep=True).sum() + edges.memory_usage(deep=True).sum())
+
+    def _store(self, date: pd.Timestamp, nodes: pd.DataFrame, edges: pd.DataFrame):
+        value = self.build(nodes, edges)
+        size = self._graph_size(nodes, edges)
+        with self._lock:
+            if date in self._graphs:
+                self.size_bytes -= self._graphs.pop(date)[1]
+            self._graphs[date] = (value, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes and len(self._graphs) > 1:
+                _, (_, old_size) = self._graphs.popitem(last=False)
+                self.size_bytes -= old_size
+        return value
+
+    def peek(self, date):
+        """Returns the cached value without building it, or None."""
+        date = pd.Timestamp(date)
+        with self._lock:
+            hit = self._graphs.get(date)
+            if hit is None:
+                return None
+            self._graphs.move_to_end(date)
+            return hit[0]
+
+    def get(self, date):
+        """Returns the value for a date, building and caching it on a miss."""
+        date = pd.Timestamp(date)
+        hit = self.peek(date)
+        if hit is not None:
+            return hit
+        return self._store(date, *generate_graph_for_date(self.combined, date))
+
+    def precompute(self, dates):
+        """Builds every uncached date in one grouped pass. Meant for a background thread."""
+        with self._lock:
+            missing = [pd.Timestamp(d) for d in dates if pd.Timestamp(d) not in self._graphs]
+        if not missing:
+            return
+        start = time.perf_counter()
+        graphs = generate_graphs_for_dates(self.combined, missing)
+        # store oldest first so the most recent dates are the last to be evicted
+        for date in sorted(graphs):
+            self._store(date, *graphs[date])
+        print(f"Precomputed {len(graphs)} date graphs in {time.perf_counter() - start:.1f}s "
+              f"({self.size_bytes / 1e6:.1f} MB cached)")
+
+
+class ReachabilityIndex:
+    """
+    Transitive closure of a date graph as one int bitset per node (bit i = node i in topological order),
+    so ancestor/descendant sets are lookups instead of a BFS per hover or drill-down.
+    Depth-limited queries use the closure whenever the node's longest path fits in the depth and only
+    fall back to a bounded BFS otherwise. Graphs with a cycle always use the BFS.
+    """
+    def __init__(self, children: dict[str, list[str]], parents: dict[str, list[str]]):
+        self.children = children
+        self.parents = parents
+        nodes = set(children) | set(parents)
+        in_deg = {n: len(parents.get(n, [])) for n in nodes}
+        order = [n for n in nodes if in_deg[n] == 0]
+        for u in order:  # Kahn's algorithm; order grows while iterating
+            for v in children.get(u, []):
+                in_deg[v] -= 1
+                if in_deg[v] == 0:
+                    order.append(v)
+        self.is_dag = len(order) == len(nodes)
+        self.order = order
+        self.idx = {n: i for i, n in enumerate(order)}
+        self.desc_bits, self.anc_bits = {}, {}
+        self.height, self.depth = {}, {}  # longest path down to a leaf / up to a root
+        self._desc_sets, self._anc_sets = {}, {}
+        if not self.is_dag:
+            return
+        for n in reversed(order):
+            bits, h = 0, 0
+            for c in children.get(n, []):
+                bits |= self.desc_bits[c] | (1 << self.idx[c])
+                h = max(h, self.height[c] + 1)
+            self.desc_bits[n], self.height[n] = bits, h
+        for n in order:
+            bits, d = 0, 0
+            for p in parents.get(n, []):
+                bits |= self.anc_bits[p] | (1 << self.idx[p])
+                d = max(d, self.depth[p] + 1)
+            self.anc_bits[n], self.depth[n] = bits, d
+
+    def _decode(self, bits: int, node: str) -> frozenset:
+        members = [node]
+        while bits:
+            low = bits & -bits
+            members.append(self.order[low.bit_length() - 1])
+            bits ^= low
+        return frozenset(members)
+
+    @staticmethod
+    def _bfs(start: str, adjacency: dict, max_depth: int | None) -> frozenset:
+        keep = {start}
+        frontier = deque([(start, 0)])
+        while frontier:
+            node, d = frontier.popleft()
+            if max_depth is not None and d >= max_depth:
+                continue
+            for nxt in adjacency.get(node, []):
+                if nxt not in keep:
+                    keep.add(nxt)
+                    frontier.append((nxt, d + 1))
+        return frozenset(keep)
+
+    def descendants(self, node: str, max_depth: int | None = None) -> frozenset:
+        """Node plus everything below it within max_depth edges."""
+        if not self.is_dag or node not in self.idx or (max_depth is not None and max_depth < self.height[node]):
+            return self._bfs(node, self.children, max_depth)
+        if node not in self._desc_sets:
+            self._desc_sets[node] = self._decode(self.desc_bits[node], node)
+        return self._desc_sets[node]
+
+    def ancestors(self, node: str, max_depth: int | None = None) -> frozenset:
+        """Node plus everything above it within max_depth edges."""
+        if not self.is_dag or node not in self.idx or (max_depth is not None and max_depth < self.depth[node]):
+            return self._bfs(node, self.parents, max_depth)
+        if node not in self._anc_sets:
+            self._anc_sets[node] = self._decode(self.anc_bits[node], node)
+        return self._anc_sets[node]
+
+
 def compute_subtree_positions(nodes_df, edges_df, root_ids, max_depth=5, 
                               layer_gap=160, col_gap=240, vertical_by_level=False,
-                              stagger_same_level=False, stagger_fraction=0.5, min_sep_px=160):
+                              stagger_same_level=False, stagger_fraction=0.5, min_sep_px=160,
+                              reach: ReachabilityIndex | None = None):
     """
     Compute positions for nodes in a subtree starting from root_ids.
+    reach: optional prebuilt ReachabilityIndex for the graph, which replaces the subtree BFS.
     Returns (positions_dict, keep_set, sub_edges_df)
     """
     from collections import deque, defaultdict
     
-    # Build children map
-    children_map = defaultdict(list)
-    for _, row in edges_df.iterrows():
-        children_map[str(row["source"])].append(str(row["target"]))
-    
     # Normalize root_ids to list
     if root_ids is None:
         return {}, set(), pd.DataFrame()
     root_list = root_ids if isinstance(root_ids, list) else [root_ids]
     root_list = [str(r) for r in root_list]
     
-    # BFS to collect all nodes in subtree
-    keep = set()
-    queue = deque([(r, 0) for r in root_list])  # (node_id, depth)
-    
-    while queue:
-        node_id, depth = queue.popleft()
-        if node_id in keep or depth > max_depth:
-            continue
-        keep.add(node_id)
+    if reach is not None:
+        children_map = reach.children
+        keep = set().union(*(reach.descendants(r, max_depth) for r in root_list))
+    else:
+        # Build children map
+        children_map = defaultdict(list)
+        for s, t in edges_df[["source", "target"]].itertuples(index=False):
+            children_map[str(s)].append(str(t))
         
-        for child in children_map.get(node_id, []):
-            if child not in keep:
-                queue.append((child, depth + 1))
+        # BFS to collect all nodes in subtree
+        keep = set()
+        queue = deque([(r, 0) for r in root_list])  # (node_id, depth)
+        
+        while queue:
+            node_id, depth = queue.popleft()
+            if node_id in keep or depth > max_depth:
+                continue
+            keep.add(node_id)
+            
+            for child in children_map.get(node_id, []):
+                if child not in keep:
+                    queue.append((child, depth + 1))
     
     # Filter edges to only those in the subtree
     sub_edges = edges_df[
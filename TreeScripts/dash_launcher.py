@@ -11,19 +11,30 @@ import os
 import sys
 import pandas as pd
 from typing import Optional
-import io
-import pickle
+import pyarrow as pa
 import TreeScripts.unifiedv2 as unifiedv2
 
 
-def launch_dash_app(data_pickle: bytes, initial_node: Optional[str] = None, 
+def read_dash_data(data_path: str) -> pd.DataFrame:
+    """
+    Memory-maps the Arrow IPC (Feather v2) position file written by DatabaseManager.writeDashData.
+    Numeric columns are read straight from the mapped pages instead of being unpickled from a pipe.
+    """
+    with pa.memory_map(data_path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    generation = (table.schema.metadata or {}).get(b"generation", b"unknown").decode()
+    print(f"Mapped Dash data generation {generation}: {table.num_rows} rows")
+    return table.to_pandas()
+
+
+def launch_dash_app(data_path: str, initial_node: Optional[str] = None, 
                     initial_date: Optional[str] = None, port: int = 8052,
                     inactivity_timeout: int = 30, active_flag_dict: Optional[dict] = None):
     """
     Main entry point for launching Dash app with pre-loaded data.
     
     Args:
-        data_pickle: Pickled DataFrame with position data
+        data_path: Path to the Arrow IPC position data file
         initial_node: Optional node name to pre-select in the focus dropdown
         initial_date: Optional date string (YYYY-MM-DD format) to pre-select
         port: Port number for the Dash server (default: 8052)
@@ -34,12 +45,12 @@ def launch_dash_app(data_pickle: bytes, initial_node: Optional[str] = None,
     print("Launching Tree Hierarchy Viewer")
     print("=" * 60)
     
-    # Unpickle the data
+    # Map the data file
     try:
-        full_data = pickle.loads(data_pickle)
+        full_data = read_dash_data(data_path)
         print(f"Data loaded successfully: {len(full_data)} rows")
     except Exception as e:
-        print(f"ERROR: Failed to unpickle data: {e}")
+        print(f"ERROR: Failed to read data file {data_path}: {e}")
         import traceback
         traceback.print_exc()
         return
@@ -77,7 +88,7 @@ def launch_dash_app(data_pickle: bytes, initial_node: Optional[str] = None,
         import traceback
         traceback.print_exc()
 
-def _run_dash_app_process(data_pickle, node=None, date=None, active_flag_dict=None, inactivity_timeout=30):
+def _run_dash_app_process(data_path, node=None, date=None, active_flag_dict=None, inactivity_timeout=30):
     """Target function for multiprocessing - runs in separate process with pre-loaded data"""
     import sys
     import os
@@ -91,9 +102,9 @@ def _run_dash_app_process(data_pickle, node=None, date=None, active_flag_dict=No
         sys.path.insert(0, tree_scripts_path)
     
     try:        
-        # Launch with pre-loaded pickled data
+        # Launch with the memory-mapped data file
         launch_dash_app(
-            data_pickle=data_pickle,
+            data_path=data_path,
             initial_node=node,
             initial_date=date,
             port=8052,
@@ -21,8 +21,8 @@ Unified Dash app (Version 7)
 """
 
 import json
-from typing import Dict, List, Set, Tuple
-from collections import defaultdict
+from typing import Dict, List, Tuple
+from collections import OrderedDict
 import os
 import numpy as np
 import pandas as pd
@@ -48,6 +48,9 @@ importlib.reload(create_all_paths)  # Reload to pick up new functions
 FULL_DATA = None
 DATE_OPTIONS = []
 DEFAULT_DATE = None
+GRAPH_CACHE = None
+GRAPH_CACHE_MAX_MB = 512      # memory cap for cached per-date graphs
+PRECOMPUTE_RECENT_DATES = 12  # most recent month-ends built in the background at startup
 
 
 def load_and_prepare_data(full_data=None):
@@ -152,55 +155,67 @@ def build_parents_map(edges_df: pd.DataFrame) -> Dict[str, List[str]]:
         pa.setdefault(s, [])
     return pa
 
-def ancestors_of(leaf: str, parents: Dict[str, List[str]], max_depth: int | None = None) -> Set[str]:
-    keep: Set[str] = {leaf}
-    frontier = [(leaf, 0)]
-    while frontier:
-        node, d = frontier.pop(0)
-        if max_depth is not None and d >= max_depth:
-            continue
-        for p in parents.get(node, []):
-            if p not in keep:
-                keep.add(p)
-                frontier.append((p, d + 1))
-    return keep
-
-def descendants_of(root: str, children: Dict[str, List[str]], max_depth: int | None = None) -> Set[str]:
-    keep: Set[str] = {root}
-    frontier = [(root, 0)]
-    while frontier:
-        node, d = frontier.pop(0)
-        if max_depth is not None and d >= max_depth:
-            continue
-        for c in children.get(node, []):
-            if c not in keep:
-                keep.add(c)
-                frontier.append((c, d + 1))
-    return keep
-
-def parse_store_data(data):
-    if not data:
-        return pd.DataFrame(), pd.DataFrame(), {}, {}, {}, {}, {}, {}
-    
-    nodes_df = pd.DataFrame(data['nodes'])
-    edges_df = pd.DataFrame(data['edges'])
-    
-    # Rebuild maps
-    parents_map = build_parents_map(edges_df)
-    children_map = build_children_map(edges_df)
-    
-    # Rebuild lookups
-    # Ensure correct types
-    if "level" in nodes_df.columns:
-        # handle potential mixed types
-        nodes_df["level"] = pd.to_numeric(nodes_df["level"], errors='coerce')
-        
-    level_by_id = nodes_df.set_index("id")["level"].to_dict()
-    balance_by_id = nodes_df.set_index("id")["balance"].to_dict()
-    in_deg = edges_df.groupby("target").size().to_dict()
-    out_deg = edges_df.groupby("source").size().to_dict()
-    
-    return nodes_df, edges_df, parents_map, children_map, level_by_id, balance_by_id, in_deg, out_deg
+LAYOUT_CACHE_SIZE = 64  # layouts kept per date
+
+class GraphIndex:
+    """
+    Server-side copy of one date's graph with the lookups the callbacks need, built once when the
+    graph is generated and kept in GRAPH_CACHE. The browser store only carries the date key.
+    """
+    def __init__(self, nodes_df: pd.DataFrame, edges_df: pd.DataFrame):
+        self.nodes_df = nodes_df
+        self.edges_df = edges_df
+        if nodes_df.empty or edges_df.empty:
+            self.parents_map, self.children_map = {}, {}
+            self.in_deg, self.out_deg, self.edge_value = {}, {}, {}
+        else:
+            self.parents_map = build_parents_map(edges_df)
+            self.children_map = build_children_map(edges_df)
+            self.in_deg = edges_df.groupby("target").size().to_dict()
+            self.out_deg = edges_df.groupby("source").size().to_dict()
+            self.edge_value = dict(zip(zip(edges_df["source"], edges_df["target"]), edges_df["position_value"]))
+        if nodes_df.empty:
+            self.level_by_id, self.balance_by_id, self.label_by_id = {}, {}, {}
+        else:
+            ids = nodes_df["id"]
+            self.level_by_id = dict(zip(ids, pd.to_numeric(nodes_df["level"], errors='coerce')))
+            self.balance_by_id = dict(zip(ids, nodes_df["balance"]))
+            self.label_by_id = dict(zip(ids, nodes_df["label"]))
+        self.node_ids = set(self.label_by_id)
+        self.reach = create_all_paths.ReachabilityIndex(self.children_map, self.parents_map)
+        self.roots = {n for n, ps in self.parents_map.items() if not ps}
+        levels = [int(l) for l in self.level_by_id.values() if pd.notna(l)]
+        self.max_level = max(levels) if levels else 0
+        by_label = sorted(self.label_by_id.items(), key=lambda kv: kv[1])
+        self.options = [{"label": label, "value": nid} for nid, label in by_label]
+        self.non_root_options = [opt for opt in self.options if opt["value"] not in self.roots]
+        self._layouts = OrderedDict()
+
+    def layout(self, key, compute):
+        """
+        Returns the cached layout for key (mode, roots, depth, options), computing it on a miss.
+        Positions are copied on the way out since the callbacks adjust them in place.
+        """
+        hit = self._layouts.get(key)
+        if hit is None:
+            hit = compute()
+            self._layouts[key] = hit
+            while len(self._layouts) > LAYOUT_CACHE_SIZE:
+                self._layouts.popitem(last=False)
+        else:
+            self._layouts.move_to_end(key)
+        positions, *rest = hit
+        return ({n: dict(p) for n, p in positions.items()}, *rest)
+
+    def as_tuple(self):
+        return (self.nodes_df, self.edges_df, self.parents_map, self.children_map,
+                self.level_by_id, self.balance_by_id, self.in_deg, self.out_deg)
+
+def get_graph(store_data) -> GraphIndex | None:
+    """Looks up the server-side graph for the date key held in the graph-store."""
+    if not store_data or not store_data.get("key"):
+        return None
+    return GRAPH_CACHE.get(store_data["key"])
 
 # =============================================================================
 # Layout / Styling
@@ -556,15 +571,12 @@ def update_graph_data(date_str):
         return {}
     
     target_date = pd.Timestamp(date_str)
-    print(f"Generating graph for {target_date}...")
-    nodes, edges = create_all_paths.generate_graph_for_date(FULL_DATA, target_date)
-    
-    graph_data = {
-        "nodes": nodes.to_dict(orient="records"),
-        "edges": edges.to_dict(orient="records")
-    }
+    if GRAPH_CACHE.peek(target_date) is None:
+        print(f"Generating graph for {target_date}...")
+    GRAPH_CACHE.get(target_date)
     
-    return graph_data
+    # The graph stays on the server; dependent callbacks look it up by this key
+    return {"key": date_str}
 
 # 2. Refresh Dropdown Options based on Mode & Current Data
 @app.callback(
@@ -577,7 +589,8 @@ def update_graph_data(date_str):
     prevent_initial_call='initial_duplicate',
 )
 def refresh_dropdown(mode, store_data, current_value, initial_node):
-    if not store_data:
+    graph = get_graph(store_data)
+    if graph is None:
         return [], None
     
     # Check what triggered this callback
@@ -586,18 +599,8 @@ def refresh_dropdown(mode, store_data, current_value, initial_node):
     mode_changed = "mode-radio.value" in triggered
     data_changed = "graph-store.data" in triggered
     
-    nodes_df = pd.DataFrame(store_data['nodes'])
-    edges_df = pd.DataFrame(store_data['edges'])
-    parents_map = build_parents_map(edges_df)
-    
-    if mode == "bottomup":
-        # roots = nodes with NO parents
-        roots = {n for n, ps in parents_map.items() if not ps}
-        sub = nodes_df[~nodes_df["id"].isin(roots)].sort_values("label")
-    else:
-        sub = nodes_df.sort_values("label")
-
-    options = [{"label": r["label"], "value": r["id"]} for _, r in sub.iterrows()]
+    # bottom-up cannot focus roots (nodes with NO parents)
+    options = graph.non_root_options if mode == "bottomup" else graph.options
     valid_values = {opt["value"] for opt in options}
     
     # If mode changed, always clear the dropdown
@@ -652,24 +655,12 @@ def clear_dropdown_on_reset(reset_clicks):
     State("depth-slider", "value"),
 )
 def update_depth_slider(store_data, current_value):
-    if not store_data:
+    graph = get_graph(store_data)
+    if graph is None or graph.nodes_df.empty:
         return 10, {i: str(i) for i in range(11)}, current_value
         
-    nodes = store_data.get("nodes", [])
-    if not nodes:
-        return 10, {i: str(i) for i in range(11)}, current_value
-        
-    # Calculate max level in the data
-    max_lvl = 0
-    for n in nodes:
-        l = n.get("level")
-        if l is not None:
-            try:
-                val = int(l)
-                if val > max_lvl:
-                    max_lvl = val
-            except (ValueError, TypeError):
-                pass
+    # Max level in the data
+    max_lvl = graph.max_level
                 
     # Ensure at least some range
     if max_lvl < 1:
@@ -730,7 +721,8 @@ def unify(tap_node, focus_value, mode, depth, small_thresh,
         return [], {"name": "breadthfirst"}, no_update, [], []
 
     # Parse data
-    nodes_df, edges_df, parents_map, children_map, _, _, _, _ = parse_store_data(store_data)
+    graph = get_graph(store_data)
+    nodes_df, edges_df, parents_map, children_map, _, _, _, _ = graph.as_tuple()
     
     triggered = [t["prop_id"] for t in dash.callback_context.triggered]
     
@@ -784,7 +776,7 @@ def unify(tap_node, focus_value, mode, depth, small_thresh,
         # Validation
         if cur_focus and mode != "tidy":
             # First check if the node exists in the graph
-            if cur_focus not in nodes_df["id"].values:
+            if cur_focus not in graph.node_ids:
                 cur_focus = None
             elif mode == "bottomup":
                 # In bottom-up mode, can't focus on root nodes
@@ -810,13 +802,18 @@ def unify(tap_node, focus_value, mode, depth, small_thresh,
 
     # Subgraph generation
     if mode == "topdown":
-        positions, keep, sub_edges = create_all_paths.compute_subtree_positions(
-            nodes_df, edges_df, root_ids=cur_focus, max_depth=depth,
-            layer_gap=160, col_gap=240,
-            vertical_by_level=False,
-            stagger_same_level=False,
-            stagger_fraction=0.5,
-            min_sep_px=160,
+        focus_key = tuple(cur_focus) if isinstance(cur_focus, list) else (cur_focus,)
+        positions, keep, sub_edges = graph.layout(
+            ("topdown", focus_key, depth),
+            lambda: create_all_paths.compute_subtree_positions(
+                nodes_df, edges_df, root_ids=cur_focus, max_depth=depth,
+                layer_gap=160, col_gap=240,
+                vertical_by_level=False,
+                stagger_same_level=False,
+                stagger_fraction=0.5,
+                min_sep_px=160,
+                reach=graph.reach,
+            ),
         )
         sub_nodes = nodes_df[nodes_df["id"].isin(keep)].copy()
         roots = cur_focus if isinstance(cur_focus, list) else [cur_focus]
@@ -831,21 +828,24 @@ def unify(tap_node, focus_value, mode, depth, small_thresh,
             stylesheet = base_stylesheet(curve_style="taxi")
             return elems, layout, no_update, history, stylesheet
         
-        keep = ancestors_of(cf, parents_map, max_depth=depth)
-        sub_nodes = nodes_df[nodes_df["id"].isin(keep)].copy()
-        sub_edges = edges_df[edges_df["source"].isin(keep) & edges_df["target"].isin(keep)].copy()
-        
-        # Compute bottom-up positions
-        positions, bottom_up_levels = create_all_paths._rank_bottom_up(sub_nodes, keep, parents_map)
-        
-        # Invert Y coordinates so leaves (focus node) appear at the bottom, roots (ancestors) at the top
-        if positions:
-            # Calculate max_y from positions directly to be robust
-            all_ys = [p["y"] for p in positions.values()]
-            if all_ys:
-                max_y = max(all_ys)
-                for node_id in positions:
-                    positions[node_id]["y"] = max_y - positions[node_id]["y"]
+        def bottom_up_layout():
+            keep = graph.reach.ancestors(cf, max_depth=depth)
+            sub_nodes = nodes_df[nodes_df["id"].isin(keep)].copy()
+            sub_edges = edges_df[edges_df["source"].isin(keep) & edges_df["target"].isin(keep)].copy()
+            
+            # Compute bottom-up positions
+            positions, bottom_up_levels = create_all_paths._rank_bottom_up(sub_nodes, keep, parents_map)
+            
+            # Invert Y coordinates so leaves (focus node) appear at the bottom, roots (ancestors) at the top
+            if positions:
+                # Calculate max_y from positions directly to be robust
+                all_ys = [p["y"] for p in positions.values()]
+                if all_ys:
+                    max_y = max(all_ys)
+                    for node_id in positions:
+                        positions[node_id]["y"] = max_y - positions[node_id]["y"]
+            return positions, keep, sub_nodes, sub_edges
+        positions, keep, sub_nodes, sub_edges = graph.layout(("bottomup", (cf,), depth), bottom_up_layout)
         
         # Roots for bottom-up are the top-level ancestors (nodes with no parents in the subgraph)
         roots = sorted([n for n in keep if not any(p in keep for p in parents_map.get(n, []))])
@@ -900,7 +900,8 @@ def update_tidy_tables(mode, focus_id, density, p_clicks, c_clicks, store_data):
     if not store_data or mode != "tidy" or not focus_id:
         return [], [], "", "", {"display": "none"}, {"display": "none"}, html.Div("Select a node to see its neighborhood.")
 
-    nodes_df, edges_df, parents_map, children_map, level_by_id, balance_by_id, in_deg, out_deg = parse_store_data(store_data)
+    graph = get_graph(store_data)
+    nodes_df, edges_df, parents_map, children_map, level_by_id, balance_by_id, in_deg, out_deg = graph.as_tuple()
 
     def get_tidy_rows(ids):
         rows = []
@@ -909,7 +910,7 @@ def update_tidy_tables(mode, focus_id, density, p_clicks, c_clicks, store_data):
             bal = balance_by_id.get(nid, None)
             val_str = format_money(bal) if pd.notna(bal) else ""
             
-            label = nodes_df.loc[nodes_df['id']==nid, 'label'].iloc[0] if (nodes_df['id']==nid).any() else nid
+            label = graph.label_by_id.get(nid, nid)
             
             rows.append({
                 "id": nid,
@@ -947,8 +948,7 @@ def update_tidy_tables(mode, focus_id, density, p_clicks, c_clicks, store_data):
     p_count = f"({p_total} total)" if p_total else "(0)"
     c_count = f"({c_total} total)" if c_total else "(0)"
 
-    focus_label = nodes_df.loc[nodes_df["id"] == focus_id, "label"]
-    focus_label = focus_label.iloc[0] if not focus_label.empty else focus_id
+    focus_label = graph.label_by_id.get(focus_id, focus_id)
     
     sibs = sorted({s for p in parents for s in children_map.get(p, []) if s != focus_id})
 
@@ -1022,7 +1022,8 @@ def show_hover_info(node_hover, edge_hover, mode, store_data):
         "fontSize": "12px", "zIndex": 10,
     }
     
-    if mode == "tidy" or not store_data:
+    graph = get_graph(store_data)
+    if mode == "tidy" or graph is None:
         base_style["display"] = "none"
         return base_style, []
     
@@ -1049,17 +1050,11 @@ def show_hover_info(node_hover, edge_hover, mode, store_data):
         
         # Look up raw value for better formatting
         val_str = hover_data.get("value", "-")
-        if store_data and 'edges' in store_data:
-             edges_df = pd.DataFrame(store_data['edges'])
-             match = edges_df[(edges_df["source"] == src) & (edges_df["target"] == tgt)]
-             if not match.empty:
-                 raw_val = match.iloc[0].get("position_value")
-                 val_str = format_money_full(raw_val)
+        if (src, tgt) in graph.edge_value:
+            val_str = format_money_full(graph.edge_value[(src, tgt)])
         
-        # Check target info from store
-        nodes_df = pd.DataFrame(store_data['nodes'])
-        target_row = nodes_df[nodes_df['id'] == tgt]
-        target_bal = target_row.iloc[0]['balance'] if not target_row.empty else None
+        # Check target info from the graph
+        target_bal = graph.balance_by_id.get(tgt)
         target_bal_str = format_money_full(target_bal) if pd.notna(target_bal) else "-"
         
         is_hi_target = str(tgt).endswith("(HI)")
@@ -1076,20 +1071,16 @@ def show_hover_info(node_hover, edge_hover, mode, store_data):
 
     # Node
     node_id = hover_data.get("id")
-    nodes_df = pd.DataFrame(store_data['nodes'])
-    edges_df = pd.DataFrame(store_data['edges'])
-    
-    row = nodes_df.loc[nodes_df["id"] == node_id]
-    if row.empty:
+    if node_id not in graph.node_ids:
         return base_style, [html.B(node_id or "(unknown)")]
     
-    label = str(row.iloc[0]["label"])
-    level = int(row.iloc[0]["level"]) if pd.notna(row.iloc[0]["level"]) else None
-    bal_val = row.iloc[0].get("balance")
+    label = str(graph.label_by_id[node_id])
+    level = int(graph.level_by_id[node_id]) if pd.notna(graph.level_by_id[node_id]) else None
+    bal_val = graph.balance_by_id.get(node_id)
     bal_str = format_money_full(bal_val) if pd.notna(bal_val) else "—"
     
-    in_deg = edges_df[edges_df["target"] == node_id].shape[0]
-    out_deg = edges_df[edges_df["source"] == node_id].shape[0]
+    in_deg = graph.in_deg.get(node_id, 0)
+    out_deg = graph.out_deg.get(node_id, 0)
     
     return base_style, [
         html.Div([
@@ -1144,23 +1135,14 @@ def highlight_paths(hover_data, store_data, mode, toggle_value, elements):
 
     # Mouseover logic
     hovered_id = hover_data["id"]
+    graph = get_graph(store_data)
+    if graph is None:
+        return dash.no_update
     
-    # Build graph structure
-    parents = defaultdict(list)
-    children = defaultdict(list)
-    
-    if elements:
-        for el in elements:
-            data = el.get("data", {})
-            if "source" in data and "target" in data:
-                s, t = data["source"], data["target"]
-                parents[t].append(s)
-                children[s].append(t)
-                
-    # Find all related nodes
-    ancs = ancestors_of(hovered_id, parents)
-    descs = descendants_of(hovered_id, children)
-    highlight_nodes = ancs | descs
+    # Related nodes come from the date's reachability index, limited to what is on screen
+    shown = {el["data"]["id"] for el in (elements or []) if "id" in el.get("data", {})}
+    highlight_nodes = (graph.reach.ancestors(hovered_id) | graph.reach.descendants(hovered_id)) & shown
+    children = graph.children_map
     
     # Construct new stylesheet
     new_styles = list(base)
@@ -1210,10 +1192,15 @@ def create_dash_app(full_data=None, initial_node=None, initial_date=None, port=8
         inactivity_timeout: Minutes of inactivity before auto-shutdown (default: 30)
         active_flag_dict: Shared multiprocessing dict with 'active' key to track parent app state
     """
-    global FULL_DATA, DATE_OPTIONS, DEFAULT_DATE
+    global FULL_DATA, DATE_OPTIONS, DEFAULT_DATE, GRAPH_CACHE
     
     # Load and prepare data
     FULL_DATA, DATE_OPTIONS, DEFAULT_DATE = load_and_prepare_data(full_data)
+    GRAPH_CACHE = create_all_paths.GraphCache(FULL_DATA, GRAPH_CACHE_MAX_MB * 1024 * 1024, build=GraphIndex)
+    
+    # Build the most recent month-ends while the server starts so paging through them is instant
+    recent_dates = [opt["value"] for opt in DATE_OPTIONS[:PRECOMPUTE_RECENT_DATES]]
+    threading.Thread(target=GRAPH_CACHE.precompute, args=(recent_dates,), daemon=True).start()
     
     # Create and set app layout
     app.layout = create_app_layout(initial_node=initial_node, initial_date=initial_date)
@@ -1,13 +1,16 @@
+from scripts import startupProfile #first import so every startup phase is timed
 import sys
 import os
 from scripts.instantiate_basics import instantiate_basics
 instantiate_basics(BASE_DIR= os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))) #prepares values needed for other class functionality and imports
+startupProfile.mark('basics')
 from scripts.commonValues import dynamoAPIenvName
-from scripts.basicFunctions import poll_queue
+from scripts.instantiate_basics import gui_queue
 from classes.returnsApp import returnsApp
 from multiprocessing import freeze_support
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import QTimer
+startupProfile.mark('app modules')
 
 
 
@@ -17,13 +20,14 @@ if __name__ == '__main__':
     key = os.environ.get(dynamoAPIenvName)
     ok = key
     app = QApplication(sys.argv)
-    queueTimer = QTimer()
-    queueTimer.timeout.connect(poll_queue)
-    queueTimer.start(500)
+    gui_queue.attach() #background threads wake the event loop directly instead of being polled
+    startupProfile.mark('QApplication')
 
     w = returnsApp(start_index=0 if not ok else 1)
     
     if ok: w.api_key = key
+    startupProfile.mark('main window built')
+    startupProfile.watchFirstPaint(w) #report, including any deferred module loaded too early, goes to assets/startupProfile.jsonl
     w.show()
     if ok:
         w.init_data_processing()
@@ -1,28 +1,36 @@
 from collections import defaultdict
 from datetime import datetime
 import os
-import threading
+import json
+import hashlib
+from contextlib import contextmanager
 import sqlite3
 import traceback
-import pyodbc
 import logging
-import pandas as pd
 from scripts.instantiate_basics import ASSETS_DIR, DATABASE_PATH
-from scripts.commonValues import nameHier, remoteDBmode, sqlPlaceholder, currentVersion, masterFilterOptions, nonFundCols, displayLinks, batch_size
+from scripts.commonValues import nameHier, remoteDBmode, sqlPlaceholder, currentVersion, masterFilterOptions, nonFundCols, displayLinks, batch_size, dynRowKeyCol, dbReaderConnections, runMetricsKept
 from scripts.basicFunctions import infer_sqlite_type, handleDuplicateFields
+from scripts.calcLog import logEvent
+from scripts.normalizeRows import calcDateTime, normalizeRows
+from scripts.balanceResolver import effectiveBalanceRows, resolveBalances
+from scripts.runMetrics import span
 from classes.nodeLibrary import nodeLibrary
+from classes.engineRecords import toEngineRecords
+from classes.connectionPool import connectionPool, timedLock
 
 class DatabaseManager:
     """Thread-safe SQLite database manager.
 
-    Uses a single connection with check_same_thread=False and an RLock to
-    serialize access. Suitable for simple concurrent usage via a thread pool.
+    Writes go through a single connection with check_same_thread=False behind a timed RLock.
+    In sqlite mode reads in load_from_db, loadFromDB and loadCalcs use a pool of read-only connections instead,
+    so WAL readers are not held up by a long write. lockMetrics() reports how long callers waited for each.
     """
 
     def __init__(self, db_path: str) -> None:
         self.db_path = db_path
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self._lock = threading.RLock()
+        self._lock = timedLock()
+        self.pool = None
         self.server = 'hf-server1.database.windows.net'
         self.database = "CRSPRdata"
         self.username = "carleton2022"
@@ -41,7 +49,9 @@ class DatabaseManager:
             self._conn.execute("PRAGMA journal_mode=WAL;")
             self._conn.execute("PRAGMA foreign_keys=ON;")
             self._conn.commit()
+            self.pool = connectionPool(self.db_path, self._conn, self._lock, readers = dbReaderConnections)
         else:
+            import pyodbc #only the remote mode needs the odbc driver
             attemptIdx = 0
             print("\n")
             while True:
@@ -66,6 +76,7 @@ class DatabaseManager:
         if not remoteDBmode:
             conn = sqlite3.connect(self.db_path, check_same_thread=False)
         else:
+            import pyodbc
             print("Attempting connection with pyodbc...")
             conn = pyodbc.connect(
                 f"DRIVER={{{self.driver}}};"
@@ -81,6 +92,23 @@ class DatabaseManager:
             print("✓ pyodbc connection successful!")
         return conn
 
+    @contextmanager
+    def reader(self):
+        #connection for a read. Remote mode has no pool so reads share the writer
+        if self.pool is None:
+            with self._lock:
+                yield self._conn
+        else:
+            with self.pool.reader() as conn:
+                yield conn
+    def lockMetrics(self):
+        if self.pool is None:
+            return {'writer' : self._lock.stats.snapshot()}
+        return self.pool.metrics()
+    def lockMetricsSummary(self):
+        metrics = self.lockMetrics()
+        return ', '.join(f"{name}: {m['acquires']} acquires, {m['slowWaits']} slow, worst {m['worstWait']}s, total {m['totalWait']}s"
+                         for name, m in metrics.items() if isinstance(m, dict))
     def get_cursor(self):
         cursor = self._conn.cursor()
         if remoteDBmode:
@@ -251,6 +279,79 @@ class DatabaseManager:
                 ],
                 primary_keys=['month','section','lineNum']
             )
+            self.create_table_if_not_exists(
+                cur,
+                'aggregateCubeMeta',
+                [
+                    ('cubeKey', 'TEXT'),
+                    ('hierarchy' , 'TEXT'),
+                    ('signature','TEXT'),
+                    ('structure', 'TEXT'),
+                    ('builtAt', 'TEXT'),
+                ],
+                primary_keys=['cubeKey']
+            )
+            self.create_table_if_not_exists(
+                cur,
+                'aggregateCube',
+                [
+                    ('cubeKey', 'TEXT'),
+                    ('idx', 'INTEGER'),
+                    ('dateTime' , 'TEXT'),
+                    ('entry', 'TEXT'),
+                ],
+                primary_keys=['cubeKey','idx']
+            )
+            self.create_table_if_not_exists(
+                cur,
+                'snapshotTotals',
+                [
+                    ('[Source name]', 'TEXT'),
+                    ('dateTime' , 'TEXT'),
+                    ('NAV', 'REAL'),
+                    ('[Monthly Gain]', 'REAL'),
+                    ('Contributions', 'REAL'),
+                    ('Redemptions', 'REAL'),
+                    ('Distributions', 'REAL'),
+                    ('[Gain ITD]', 'REAL'),
+                ],
+                primary_keys=['[Source name]','dateTime']
+            )
+            self.create_table_if_not_exists(
+                cur,
+                'runMetrics',
+                [
+                    ('runId', 'TEXT'),
+                    ('lastImport', 'TEXT'),
+                    ('status', 'TEXT'),
+                    ('name', 'TEXT'),
+                    ('detail', 'TEXT'),
+                    ('start', 'REAL'),
+                    ('duration', 'REAL'),
+                    ('pid', 'INTEGER'),
+                    ('thread', 'TEXT'),
+                    ('[rows]', 'INTEGER'),
+                    ('peakRSSmb', 'REAL'),
+                    ('attrs', 'TEXT'),
+                ]
+            )
+            self.create_table_if_not_exists(
+                cur,
+                'effectiveBalances',
+                [
+                    ('Date', 'TEXT'),
+                    ('[Source name]', 'TEXT'),
+                    ('[Target name]', 'TEXT'),
+                    ('Fundclass', 'TEXT'),
+                    ('InvestsThrough', 'TEXT'),
+                    ('Balancetype', 'TEXT'),
+                    ('ValueInSystemCurrency', 'REAL'),
+                    ('positionKey', 'TEXT'),
+                    ('overrides', 'TEXT'),
+                ]
+            )
+            if not remoteDBmode:
+                cur.execute("CREATE INDEX IF NOT EXISTS effectiveBalances_target ON effectiveBalances ([Target name], Date)")
             
             cur.execute("SELECT * FROM history")
             history = cur.fetchall()
@@ -378,12 +479,13 @@ class DatabaseManager:
             fund2Date = {'last' : {}, 'inception' : {}}
             try:
                 self.buildNodeLib() #builds if does not exist yet
+                self.ensureEffectiveBalances()
                 targs = self.nodeLib.targets
                 placeholder = ','.join(sqlPlaceholder for _ in targs)
                 with self._lock:
                     cursor = self._conn.cursor()
-                    #positions with actual balance type
-                    cursor.execute(f"SELECT * FROM positions WHERE Balancetype IN ({sqlPlaceholder},{sqlPlaceholder}) and [Target name] IN ({placeholder})", tuple(['Actual','Internal Valuation',*targs]))
+                    #effective balances with actual balance type
+                    cursor.execute(f"SELECT [Target name], Date FROM effectiveBalances WHERE Balancetype IN ({sqlPlaceholder},{sqlPlaceholder}) and [Target name] IN ({placeholder})", tuple(['Actual','Internal Valuation',*targs]))
                     headers = [d[0] for d in cursor.description]
                     actualPositions = [dict(zip(headers,row)) for row in cursor.fetchall()]
                     #transactions for the targets
@@ -396,8 +498,7 @@ class DatabaseManager:
                     targ = row.get('Target name')
                     date = row.get('Date')
                     if targ and date:
-                        date = date.replace('T',' ')
-                        dt = datetime.strptime(date,'%Y-%m-%d %H:%M:%S')
+                        dt = calcDateTime(date.replace('T',' '))
                         if targ not in fund2Date['last']:
                             fund2Date['last'][targ] = dt
                         else:
@@ -407,8 +508,7 @@ class DatabaseManager:
                     date = t.get('Date')
                     cashFlow = t.get('CashFlowSys')
                     if cashFlow and targ and date:
-                        date = date.replace('T',' ')
-                        dt = datetime.strptime(date,'%Y-%m-%d %H:%M:%S')
+                        dt = calcDateTime(date.replace('T',' '))
                         if targ not in fund2Date['inception']:
                             fund2Date['inception'][targ] = dt
                         else:
@@ -612,6 +712,7 @@ class DatabaseManager:
             pd.DataFrame with columns: Source name, Target name, position_value, 
             As of date, Fundclass, Holding, HoldingsInsightID, percentage
         """
+        import pandas as pd #pandas loads with the first Dash launch, not at startup
         try:
             print("Loading position data from DatabaseManager for Dash app...")
             
@@ -644,8 +745,8 @@ class DatabaseManager:
                 df['As of date'] = pd.to_datetime(df['As of date'], errors='coerce')
             
             # Fill NaN values in position_value
-            if 'position_value' in df.columns:
-                df['position_value'] = df['position_value'].fillna(0.0)
+            if 'position_value' in df.columns: #stored 'None' values would leave an object column Arrow cannot write
+                df['position_value'] = pd.to_numeric(df['position_value'], errors='coerce').fillna(0.0)
             
             # Add percentage column (will be recalculated in create_all_paths)
             df['percentage'] = 1.0
@@ -655,18 +756,88 @@ class DatabaseManager:
         except Exception as e:
             print(f"Error loading data from DatabaseManager: {e}")
             return None
-    
+    def dashDataStamp(self):
+        #lastImport of the data in the database. Changes with every import, including another client's in remoteDBmode
+        history = self.loadFromDB('history')
+        return str(history[0].get('lastImport')) if history else ''
+    def _dashDataIndex(self):
+        #dashPositions.json next to the database: the current Dash data file and the lastImport it is valid for
+        return os.path.join(os.path.dirname(self.db_path), "dashPositions.json")
+    def _readDashDataIndex(self):
+        #{'file' : name, 'lastImport' : stamp} with the file's full path, or None if there is no current file
+        try:
+            with open(self._dashDataIndex()) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return None
+        index['path'] = os.path.join(os.path.dirname(self.db_path), index.get('file', ''))
+        return index if os.path.isfile(index['path']) else None
+    def dashDataFile(self, stamp : str = None):
+        """Dash position data file for the current lastImport (or stamp), or None if it has not been written for it"""
+        stamp = self.dashDataStamp() if stamp is None else str(stamp)
+        index = self._readDashDataIndex()
+        return index['path'] if index is not None and index.get('lastImport') == stamp else None
+    def stampDashData(self, stamp : str):
+        #an import that left positions unchanged keeps the current file. Returns False if there is no file to keep
+        index = self._readDashDataIndex()
+        if index is None:
+            return False
+        self._writeDashDataIndex(index['file'], str(stamp))
+        return True
+    def _writeDashDataIndex(self, fileName : str, stamp : str):
+        indexPath = self._dashDataIndex()
+        with open(indexPath + ".tmp", 'w') as file:
+            json.dump({'file' : fileName, 'lastImport' : stamp}, file)
+        os.replace(indexPath + ".tmp", indexPath)
+    def writeDashData(self, stamp : str = None):
+        """
+        Writes the Dash position data once as an uncompressed Arrow IPC (Feather v2) file that the Dash process memory-maps.
+        The generation stamp is in both the file name and the schema metadata. Each generation gets a new file because
+        a running Dash process may still have the previous one mapped, which blocks replacing it on Windows.
+        stamp is the lastImport the data belongs to (the current one by default). dashDataFile serves the file only while it matches.
+        """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        try:
+            stamp = self.dashDataStamp() if stamp is None else str(stamp)
+            df = self.load_dash_data()
+            if df is None or df.empty:
+                return None
+            generation = datetime.now().strftime("%Y%m%d%H%M%S%f")
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"generation" : generation.encode(), b"lastImport" : stamp.encode()})
+            path = os.path.join(os.path.dirname(self.db_path), f"dashPositions_{generation}.arrow")
+            feather.write_feather(table, path + ".tmp", compression="uncompressed")
+            os.replace(path + ".tmp", path)
+            self._writeDashDataIndex(os.path.basename(path), stamp)
+            self.clearDashData(keep = path)
+            print(f"Dash data written: {len(df)} rows, generation {generation}")
+            return path
+        except Exception as e:
+            print(f"Error writing Dash data file: {e}")
+            return None
+    def clearDashData(self, keep : str = None):
+        #removes old generations. Files still mapped by a running Dash process are left for the next cleanup
+        folder = os.path.dirname(self.db_path)
+        for f in os.listdir(folder):
+            path = os.path.join(folder, f)
+            if f.startswith("dashPositions_") and path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
     def loadCalcs(self,condStatement,inputs):
-        with self._lock:
-            cursor = self._conn.cursor()
+        with self.reader() as conn:
+            cursor = conn.cursor()
             cursor.execute('SELECT * FROM calculations' + condStatement,tuple(inputs))
             headers = [d[0] for d in cursor.description]
             rows = [dict(zip(headers,row)) for row in cursor.fetchall()]
             cursor.close()
         return rows
     def loadFromDB(self,table,condStatement = None,inputs = None):
-        with self._lock:
-            cursor = self._conn.cursor()
+        with self.reader() as conn:
+            cursor = conn.cursor()
             if condStatement and inputs:
                 cursor.execute(f'SELECT * FROM {table}' + condStatement,tuple(inputs))
             elif condStatement:
@@ -677,8 +848,182 @@ class DatabaseManager:
             rows = [dict(zip(headers,row)) for row in cursor.fetchall()]
             cursor.close()
         return rows
+    def saveAggregateCube(self, cubeKey : str, hierarchy : list[str], signature : str, structure : list[str], entries : list[dict]):
+        """Replaces the stored aggregates for one cube. Entries are kept as json so mixed value types survive the round trip"""
+        vals = [(cubeKey, idx, entry.get('dateTime'), json.dumps(entry, default=str)) for idx, entry in enumerate(entries)]
+        with self._lock:
+            cursor = self.get_cursor()
+            cursor.execute(f"DELETE FROM aggregateCube WHERE cubeKey = {sqlPlaceholder}", (cubeKey,))
+            cursor.execute(f"DELETE FROM aggregateCubeMeta WHERE cubeKey = {sqlPlaceholder}", (cubeKey,))
+            cursor.execute(f"INSERT INTO aggregateCubeMeta (cubeKey, hierarchy, signature, structure, builtAt) VALUES ({','.join(sqlPlaceholder for _ in range(5))})",
+                            (cubeKey, json.dumps(hierarchy), signature, json.dumps(structure), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            _batched_executemany(cursor, f"INSERT INTO aggregateCube (cubeKey, idx, dateTime, entry) VALUES ({','.join(sqlPlaceholder for _ in range(4))})", vals, self.batch_size)
+            self._conn.commit()
+            cursor.close()
+    def loadAggregateCube(self, cubeKey : str, startDate : str, endDate : str):
+        """Returns (meta, entries within the date range) for a cube or (None, []) if it has not been built"""
+        meta = self.loadFromDB('aggregateCubeMeta', f' WHERE cubeKey = {sqlPlaceholder}', (cubeKey,))
+        if not meta:
+            return None, []
+        meta = meta[0]
+        meta['hierarchy'] = json.loads(meta['hierarchy'])
+        meta['structure'] = json.loads(meta['structure'])
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT entry FROM aggregateCube WHERE cubeKey = {sqlPlaceholder} AND [dateTime] >= {sqlPlaceholder} AND [dateTime] <= {sqlPlaceholder} ORDER BY idx",
+                            (cubeKey, startDate, endDate))
+            entries = [json.loads(row[0]) for row in cursor.fetchall()]
+            cursor.close()
+        return meta, entries
+    def clearAggregateCubes(self):
+        with self._lock:
+            cursor = self.get_cursor()
+            cursor.execute("DELETE FROM aggregateCube")
+            cursor.execute("DELETE FROM aggregateCubeMeta")
+            self._conn.commit()
+            cursor.close()
+    def buildSnapshotTotals(self):
+        """
+        Rebuilds the per investor monthly totals the report snapshot reads, summed from the calculations in SQL.
+        Gain ITD is the running sum of Monthly Gain through each month so inception gains need one row instead of the full history.
+        Flow columns are already inception to date in the calculations. Scans the whole calculations table, so run it off the GUI thread.
+        """
+        with span('snapshotTotals'), self._lock:
+            cursor = self.get_cursor()
+            cursor.execute("DELETE FROM snapshotTotals")
+            cursor.execute("""INSERT INTO snapshotTotals ([Source name], dateTime, NAV, [Monthly Gain], Contributions, Redemptions, Distributions, [Gain ITD])
+                            SELECT [Source name], dateTime, SUM(NAV), SUM([Monthly Gain]), SUM(Contributions), SUM(Redemptions), SUM(Distributions),
+                                SUM(SUM([Monthly Gain])) OVER (PARTITION BY [Source name] ORDER BY dateTime ROWS UNBOUNDED PRECEDING)
+                            FROM calculations GROUP BY [Source name], dateTime""")
+            self._conn.commit()
+            cursor.execute("SELECT COUNT(*) FROM snapshotTotals")
+            self.snapshotTotalsBuilt = cursor.fetchone()[0] > 0
+            cursor.close()
+    def loadSnapshotTotals(self, investors : list[str], dates : list[str]):
+        """Returns {dateTime : summed totals} across the investors for only the requested months"""
+        if not investors or not dates:
+            return {}
+        self.ensureSnapshotTotals()
+        invPh = ','.join(sqlPlaceholder for _ in investors)
+        datePh = ','.join(sqlPlaceholder for _ in dates)
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""SELECT dateTime, SUM(NAV), SUM([Monthly Gain]), SUM(Contributions), SUM(Redemptions), SUM(Distributions)
+                            FROM snapshotTotals WHERE [Source name] IN ({invPh}) AND dateTime IN ({datePh}) GROUP BY dateTime""",
+                            (*investors, *dates))
+            totals = {row[0] : dict(zip(('NAV','Monthly Gain','Contributions','Redemptions','Distributions'), row[1:])) for row in cursor.fetchall()}
+            cursor.close()
+        return totals
+    def loadFilteredTotals(self, condStatement : str, parameters : list, dates : list[str]):
+        """loadSnapshotTotals for a returns table's filters (pyqtFunctions.filt2Query), summed from the calculations they select"""
+        datePh = ','.join(sqlPlaceholder for _ in dates)
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""SELECT dateTime, SUM(NAV), SUM([Monthly Gain]), SUM(Contributions), SUM(Redemptions), SUM(Distributions)
+                            FROM calculations {condStatement} AND dateTime IN ({datePh}) GROUP BY dateTime""", (*parameters, *dates))
+            totals = {row[0] : dict(zip(('NAV','Monthly Gain','Contributions','Redemptions','Distributions'), row[1:])) for row in cursor.fetchall()}
+            cursor.close()
+        return totals
+    def loadFilteredGain(self, condStatement : str, parameters : list, fromDate : str = None):
+        #Monthly Gain summed over a returns table's filters, from fromDate on if given
+        fromCond = f" AND dateTime >= {sqlPlaceholder}" if fromDate is not None else ''
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT SUM([Monthly Gain]) FROM calculations {condStatement}{fromCond}", (*parameters, *((fromDate,) if fromDate is not None else ())))
+            gain = cursor.fetchone()[0]
+            cursor.close()
+        return gain or 0.0
+    def loadGainITD(self, investors : list[str], beforeDate : str):
+        """Sums each investor's Gain ITD from their last month before beforeDate, so investors that have exited still count"""
+        if not investors:
+            return 0.0
+        self.ensureSnapshotTotals()
+        invPh = ','.join(sqlPlaceholder for _ in investors)
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""SELECT SUM(t.[Gain ITD]) FROM snapshotTotals t
+                            JOIN (SELECT [Source name], MAX(dateTime) AS lastDt FROM snapshotTotals
+                                    WHERE [Source name] IN ({invPh}) AND dateTime < {sqlPlaceholder} GROUP BY [Source name]) l
+                            ON t.[Source name] = l.[Source name] AND t.dateTime = l.lastDt""", (*investors, beforeDate))
+            gain = cursor.fetchone()[0]
+            cursor.close()
+        return gain or 0.0
+    def dataGeneration(self):
+        """
+        Stamp of the data a returns table is built from. Calculations only change through an import, which updates history,
+        and the rest is the small tables the user edits: options, benchmark links and asset classes.
+        """
+        parts = {table : self.loadFromDB(table) for table in ('history', 'options', 'benchmarkLinks', 'assetClasses')}
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    def saveRunMetrics(self, runId : str, lastImport : str, status : str, spans : list[dict]):
+        """Stores the spans of one import run. lastImport matches the history row the run wrote. Only the newest runMetricsKept runs are kept"""
+        cols = ('runId', 'lastImport', 'status', 'name', 'detail', 'start', 'duration', 'pid', 'thread', '[rows]', 'peakRSSmb', 'attrs')
+        vals = [(runId, lastImport, status, s['name'], None if s['detail'] is None else str(s['detail']), s['start'], s['duration'], s['pid'], s['thread'],
+                 s['rows'], s['peakRSSmb'], json.dumps(s['attrs'], default=str)) for s in spans]
+        with self._lock:
+            cursor = self.get_cursor()
+            cursor.executemany(f"INSERT INTO runMetrics ({','.join(cols)}) VALUES ({','.join(sqlPlaceholder for _ in cols)})", vals)
+            cursor.execute("SELECT DISTINCT runId FROM runMetrics")
+            dropIds = sorted((row[0] for row in cursor.fetchall()), reverse = True)[runMetricsKept:]
+            if dropIds:
+                cursor.execute(f"DELETE FROM runMetrics WHERE runId IN ({','.join(sqlPlaceholder for _ in dropIds)})", dropIds)
+            self._conn.commit()
+            cursor.close()
+    def runMetricsIds(self):
+        #saved runs, newest first
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT runId FROM runMetrics")
+            runIds = sorted((row[0] for row in cursor.fetchall()), reverse = True)
+            cursor.close()
+        return runIds
+    def loadRunMetrics(self, runId : str):
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT name, detail, start, duration, pid, thread, [rows], peakRSSmb, attrs FROM runMetrics WHERE runId = {sqlPlaceholder} ORDER BY start", (runId,))
+            spans = [{'name' : row[0], 'detail' : row[1], 'start' : row[2], 'duration' : row[3], 'pid' : row[4], 'thread' : row[5], 'rows' : row[6],
+                      'peakRSSmb' : row[7], 'attrs' : json.loads(row[8]) if row[8] else {}} for row in cursor.fetchall()]
+            cursor.close()
+        return spans
+    def saveEffectiveBalances(self, rows : list[dict]):
+        """Replaces the effective balances with the latest import's (scripts.balanceResolver.effectiveBalanceRows)"""
+        cols = ('Date', 'Source name', 'Target name', 'Fundclass', 'InvestsThrough', 'Balancetype', 'ValueInSystemCurrency', 'positionKey', 'overrides')
+        vals = [tuple(row.get(c) for c in cols) for row in rows]
+        with self._lock:
+            cursor = self.get_cursor()
+            cursor.execute("DELETE FROM effectiveBalances")
+            _batched_executemany(cursor, f"INSERT INTO effectiveBalances ({','.join(f'[{c}]' for c in cols)}) VALUES ({','.join(sqlPlaceholder for _ in cols)})", vals, batch_size)
+            self._conn.commit()
+            cursor.close()
+        self.effectiveBalancesBuilt = len(rows) > 0
+    def ensureEffectiveBalances(self):
+        #databases calculated before the table existed resolve it from the stored positions on first use. The next import replaces it
+        if getattr(self, 'effectiveBalancesBuilt', False):
+            return
+        with self._lock:
+            cursor = self.get_cursor()
+            cursor.execute("SELECT COUNT(*) FROM effectiveBalances")
+            self.effectiveBalancesBuilt = cursor.fetchone()[0] > 0
+            cursor.close()
+        if not self.effectiveBalancesBuilt:
+            records = toEngineRecords('positions', normalizeRows('positions', load_from_db(self, 'positions')))
+            _, _, index = resolveBalances(records)
+            self.saveEffectiveBalances(effectiveBalanceRows(index, records))
+    def ensureSnapshotTotals(self):
+        #databases calculated before the totals table existed get it built on first use
+        if getattr(self, 'snapshotTotalsBuilt', False):
+            return
+        with self._lock:
+            cursor = self.get_cursor()
+            cursor.execute("SELECT COUNT(*) FROM snapshotTotals")
+            self.snapshotTotalsBuilt = cursor.fetchone()[0] > 0
+            cursor.close()
+        if not self.snapshotTotalsBuilt:
+            self.buildSnapshotTotals()
     def close(self) -> None:
         try:
+            if self.pool is not None:
+                self.pool.close()
             with self._lock:
                 self._conn.close()
         except Exception:
@@ -698,10 +1043,11 @@ def _batched_executemany(cursor, sql, values, batch_size, progress_label=None):
             if progress_label:
                 progress = min(i + batch_size, total_rows)
                 if progress == total_rows or (i // batch_size) % 5 == 0:
-                    print(f"    {progress_label}: {progress}/{total_rows} rows inserted ({progress*100//total_rows}%)")
+                    logEvent('insertProgress', f"{progress}/{total_rows} rows inserted ({progress*100//total_rows}%)", subject = progress_label, level = logging.INFO)
 
 def save_to_db(db : DatabaseManager, table, rows, action = "", query = "",inputs = None, keys = None):
     cur = None
+    saveSpan = span('save_to_db', table, rows = len(rows) if rows else 0, action = action or 'rewrite')
     try:
         conn = db._conn
         with db._lock:
@@ -809,17 +1155,205 @@ def save_to_db(db : DatabaseManager, table, rows, action = "", query = "",inputs
         print(f"DB save failed. closing connections {e}, {e.args}") 
         return False
     finally:
+        saveSpan.end()
         try:
             if cur:
                 cur.close()
         except:
             pass
         return False
+def stagingTableName(table):
+    return f"{table}_staging"
+def drop_staging_table(db : DatabaseManager, table):
+    staging = stagingTableName(table)
+    with db._lock:
+        cur = db._conn.cursor()
+        try:
+            if remoteDBmode:
+                cur.execute(f"IF OBJECT_ID(N'{staging}', N'U') IS NOT NULL DROP TABLE [{staging}]")
+            else:
+                cur.execute(f'DROP TABLE IF EXISTS "{staging}"')
+            db._conn.commit()
+        finally:
+            cur.close()
+def stage_rows(db : DatabaseManager, table, rows, columns : list[str]):
+    """
+    Appends rows to the staging copy of a table, creating it on the first batch and adding columns as new keys appear.
+    columns: the staging columns created so far (empty before the first batch). Returns the updated column list.
+    """
+    if not rows:
+        return columns
+    staging = stagingTableName(table)
+    known = set(columns)
+    newCols = {}
+    for row in rows:
+        for c, val in row.items():
+            if c not in known and c not in newCols:
+                newCols[c] = val
+    with db._lock:
+        cur = db._conn.cursor()
+        try:
+            if not columns:
+                if not remoteDBmode:
+                    col_defs = ','.join(f'"{c}" {infer_sqlite_type(val, colHeader = c)}' for c, val in newCols.items())
+                    cur.execute(f'CREATE TABLE "{staging}" ({col_defs})')
+                else:
+                    col_defs = ','.join(f'[{c}] NVARCHAR(MAX)' for c in newCols)
+                    cur.execute(f'CREATE TABLE [{staging}] ({col_defs})')
+            else:
+                for c, val in newCols.items(): #rows already staged read '' for a new column, matching save_to_db's fill value
+                    if not remoteDBmode:
+                        cur.execute(f'ALTER TABLE "{staging}" ADD COLUMN "{c}" {infer_sqlite_type(val, colHeader = c)} DEFAULT \'\'')
+                    else:
+                        cur.execute(f"ALTER TABLE [{staging}] ADD [{c}] NVARCHAR(MAX) DEFAULT '' WITH VALUES")
+            columns = [*columns, *newCols]
+            quoted_cols = ','.join(f'"{c}"' for c in columns)
+            placeholders = ','.join(sqlPlaceholder for _ in columns)
+            vals = [tuple(str(row.get(c, '')) for c in columns) for row in rows]
+            _batched_executemany(cur, f'INSERT INTO "{staging}" ({quoted_cols}) VALUES ({placeholders})', vals, batch_size)
+            db._conn.commit()
+        finally:
+            cur.close()
+    return columns
+def swap_staging_table(db : DatabaseManager, table):
+    #replaces the live table with its fully written staging copy
+    staging = stagingTableName(table)
+    with db._lock:
+        cur = db._conn.cursor()
+        try:
+            if remoteDBmode:
+                cur.execute(f"IF OBJECT_ID(N'{table}', N'U') IS NOT NULL DROP TABLE [{table}]")
+                cur.execute(f"EXEC sp_rename '{staging}', '{table}'")
+            else:
+                if db._conn.in_transaction:
+                    db._conn.commit()
+                cur.execute("BEGIN") #drop and rename land together
+                cur.execute(f'DROP TABLE IF EXISTS "{table}"')
+                cur.execute(f'ALTER TABLE "{staging}" RENAME TO "{table}"')
+            db._conn.commit()
+        except:
+            db._conn.rollback()
+            raise
+        finally:
+            cur.close()
+def _storedValueMatches(old, new : str):
+    #values are written as str() but read back with the column's affinity, so '5' may return as 5.0
+    if old is None:
+        return new in ('', 'None')
+    if str(old) == new:
+        return True
+    try:
+        return float(old) == float(new)
+    except (TypeError, ValueError):
+        return False
+def _createRowKeyIndex(cur, table):
+    if not remoteDBmode: #remote tables are NVARCHAR(MAX) columns, which sql server cannot index
+        cur.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table}_{dynRowKeyCol}" ON "{table}" ("{dynRowKeyCol}")')
+def upsert_rows(db : DatabaseManager, table, keyedRows : dict[str, dict], keepNames : list[str] = None):
+    """
+    Writes only the difference between keyedRows ({rowKey : row}) and the stored table, matched on its unique rowKey column.
+    New keys are inserted, rows with changed values are replaced and stored keys no longer present are deleted.
+    keepNames are the nodes whose rows were not recalculated and so are not in keyedRows. Stored rows with one of them as
+    Source name or Target name are never deleted.
+    A table saved before the key column existed gets it empty, so its rows are replaced as their data is recalculated.
+    Returns the number of rows inserted, updated, deleted and left unchanged.
+    """
+    counts = {'inserted' : 0, 'updated' : 0, 'deleted' : 0, 'unchanged' : 0}
+    if not keyedRows:
+        print(f"No rows found for data input to '{table}'")
+        return counts
+    with db._lock:
+        cur = db._conn.cursor()
+        try:
+            try:
+                cur.execute(f'SELECT * FROM "{table}" WHERE 1 = 0')
+                storedCols = [d[0] for d in cur.description]
+            except Exception:
+                storedCols = []
+            if not storedCols:
+                save_to_db(db, table, [{**row, dynRowKeyCol : key} for key, row in keyedRows.items()])
+                _createRowKeyIndex(cur, table)
+                db._conn.commit()
+                counts['inserted'] = len(keyedRows)
+                print(f"Created {table} with row keys: {len(keyedRows)} rows")
+                return counts
+            if dynRowKeyCol not in storedCols: #NULL keys match no incoming key
+                cur.execute(f'ALTER TABLE "{table}" ADD COLUMN "{dynRowKeyCol}" TEXT' if not remoteDBmode else
+                            f'ALTER TABLE [{table}] ADD [{dynRowKeyCol}] NVARCHAR(MAX) NULL')
+                storedCols.append(dynRowKeyCol)
+            _createRowKeyIndex(cur, table)
+            known = set(storedCols)
+            newCols = {}
+            for row in keyedRows.values():
+                for c, val in row.items():
+                    if c not in known and c not in newCols:
+                        newCols[c] = val
+            for c, val in newCols.items(): #stored rows read '' for a new column, matching save_to_db's fill value
+                if not remoteDBmode:
+                    cur.execute(f'ALTER TABLE "{table}" ADD COLUMN "{c}" {infer_sqlite_type(val, colHeader = c)} DEFAULT \'\'')
+                else:
+                    cur.execute(f"ALTER TABLE [{table}] ADD [{c}] NVARCHAR(MAX) DEFAULT '' WITH VALUES")
+            cols = [*storedCols, *newCols]
+            keyIdx = storedCols.index(dynRowKeyCol)
+            #the incoming keys go to a temp table, so only the stored rows they match are read and removed keys are deleted in SQL
+            keyTable = '#upsertKeys' if remoteDBmode else 'upsertKeys'
+            cur.execute(f'DROP TABLE IF EXISTS {keyTable}')
+            cur.execute(f'CREATE TABLE {keyTable} ("{dynRowKeyCol}" NVARCHAR(450) PRIMARY KEY)' if remoteDBmode else
+                        f'CREATE TEMP TABLE {keyTable} ("{dynRowKeyCol}" TEXT PRIMARY KEY)')
+            _batched_executemany(cur, f'INSERT INTO {keyTable} ("{dynRowKeyCol}") VALUES ({sqlPlaceholder})', [(key,) for key in keyedRows], batch_size)
+            cur.execute(f'SELECT t.* FROM "{table}" t JOIN {keyTable} k ON t."{dynRowKeyCol}" = k."{dynRowKeyCol}"')
+            stored = {}
+            while True:
+                batch = cur.fetchmany(db.fetch_batch_size)
+                if not batch:
+                    break
+                for rec in batch:
+                    stored[rec[keyIdx]] = tuple(rec)
+            deleteKeys = []
+            inserts = []
+            for key, row in keyedRows.items():
+                vals = tuple(key if c == dynRowKeyCol else str(row.get(c, '')) for c in cols)
+                old = stored.get(key)
+                if old is None:
+                    counts['inserted'] += 1
+                elif all(_storedValueMatches(o, v) for o, v in zip(old, vals)) and all(v == '' for v in vals[len(storedCols):]):
+                    counts['unchanged'] += 1
+                    continue
+                else:
+                    counts['updated'] += 1
+                    deleteKeys.append((key,))
+                inserts.append(vals)
+            deleteCond = f'("{dynRowKeyCol}" IS NULL OR "{dynRowKeyCol}" NOT IN (SELECT "{dynRowKeyCol}" FROM {keyTable}))'
+            keepTable = '#upsertKeep' if remoteDBmode else 'upsertKeep'
+            if keepNames:
+                cur.execute(f'DROP TABLE IF EXISTS {keepTable}')
+                cur.execute(f'CREATE TABLE {keepTable} (name NVARCHAR(450) PRIMARY KEY)' if remoteDBmode else
+                            f'CREATE TEMP TABLE {keepTable} (name TEXT PRIMARY KEY)')
+                _batched_executemany(cur, f'INSERT INTO {keepTable} (name) VALUES ({sqlPlaceholder})', [(name,) for name in set(keepNames)], batch_size)
+                for col in ('Source name', 'Target name'):
+                    deleteCond += f' AND COALESCE("{col}", \'\') NOT IN (SELECT name FROM {keepTable})'
+            cur.execute(f'DELETE FROM "{table}" WHERE {deleteCond}')
+            counts['deleted'] = max(cur.rowcount, 0)
+            cur.execute(f'DROP TABLE {keyTable}')
+            if keepNames:
+                cur.execute(f'DROP TABLE {keepTable}')
+            quoted_cols = ','.join(f'"{c}"' for c in cols)
+            placeholders = ','.join(sqlPlaceholder for _ in cols)
+            _batched_executemany(cur, f'DELETE FROM "{table}" WHERE "{dynRowKeyCol}" = {sqlPlaceholder}', deleteKeys, batch_size)
+            _batched_executemany(cur, f'INSERT INTO "{table}" ({quoted_cols}) VALUES ({placeholders})', inserts, batch_size)
+            db._conn.commit()
+        except:
+            db._conn.rollback()
+            raise
+        finally:
+            cur.close()
+    print(f"Upserted {table}: {counts}")
+    return counts
 def load_from_db(db : DatabaseManager, table, condStatement = "",parameters = None):
+    cur = None
     try:
-        conn = db._conn
-        with db._lock:
-            cur = db._conn.cursor()
+        with db.reader() as conn:
+            cur = conn.cursor()
             try:
                 if condStatement != "" and parameters is not None:
                     processed_cond = condStatement.replace('?', sqlPlaceholder)
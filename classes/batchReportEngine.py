@@ -0,0 +1,146 @@
+import copy
+import os
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from multiprocessing import Pool
+
+from classes.tableBuildScheduler import tableBuildCancelled
+from scripts.instantiate_basics import ASSETS_DIR, gui_queue
+from scripts.basicFunctions import setViewFilter
+from scripts.batchReports import initReportWorker, prefetchReportData, renderReportJob, reportFileName, timingSummary
+from scripts.pyqtFunctions import holdingsHeaderOrder, viewHoldings
+from scripts.reportWorkbooks import portfolioSnapshot
+
+class batchReportEngine:
+    """
+    Builds a PDF for each report job. Each report's tables are built from a plain view of the returns page controls
+    (rApp.viewTable) on a background thread, one report at a time, and each finished report is handed straight to a worker
+    pool so rendering overlaps with preparing the next one. The returns page is never driven, so the app stays usable.
+    The view is the controls after a filter reset, captured when the export starts.
+    Callbacks run on the GUI thread: onProgress(done, total, text) and onFinished(results, summary).
+    """
+    def __init__(self, rApp, jobs : list[dict], asOfDate : datetime, outDir : str, fullReport : bool, classification : str = '',
+                 onProgress = None, onFinished = None):
+        self.rApp = rApp
+        self.jobs = jobs
+        self.asOfDate = asOfDate
+        self.outDir = outDir
+        self.fullReport = fullReport
+        self.classification = classification
+        self.onProgress = onProgress
+        self.onFinished = onFinished
+        self.results = {}
+        self.prepared = False #set on the GUI thread once every job is prepared or failed and the pool is closed
+        self.finished = False
+        self.cancelEvent = threading.Event() #also stops the table build in progress
+        self.pool = None
+        self.prepThread = ThreadPoolExecutor(max_workers = 1)
+
+    def start(self):
+        #GUI thread. Only the controls are read here, the data is pulled and built on the prepare thread
+        self.startTime = time.perf_counter()
+        self.baseView = self.rApp.resetView()
+        self.baseView['end'] = datetime.strftime(self.asOfDate,'%B %Y')
+        self.headerOrder = holdingsHeaderOrder(self.rApp)
+        workers = max(1, min(len(self.jobs), (os.cpu_count() or 2) - 1))
+        self.pool = Pool(processes = workers, initializer = initReportWorker, initargs = (ASSETS_DIR,))
+        self._progress('Preparing report data')
+        self.prepThread.submit(self._prepareAll)
+
+    def cancel(self):
+        if self.cancelEvent.is_set():
+            return
+        self.cancelEvent.set()
+        if self.prepared: #only rendering is left so stop the pool now. Otherwise _allPrepared stops it once the prepare thread returns
+            self.pool.terminate()
+            self._finish()
+
+    def _progress(self, text):
+        if self.onProgress:
+            self.onProgress(len(self.results), len(self.jobs), text)
+
+    def _prepareJob(self, job, prefetched):
+        view = copy.deepcopy(self.baseView)
+        setViewFilter(view, 'Source name', job['investors'])
+        if self.classification != '':
+            setViewFilter(view, 'Classification', [self.classification,])
+        data, colorDepths, headerOrder, unitMax = viewHoldings(self.rApp, view, self.headerOrder, self.cancelEvent)
+        footerData = {'reportDate' : self.asOfDate, 'portfolioSource' : job['name'], 'classification' : self.classification, 'headerUnits' : unitMax}
+        snapshotWb, summary, benchmarks = None, None, None
+        if self.fullReport:
+            snapshotWb = portfolioSnapshot(self.rApp, job['investors'], self.asOfDate, holdApp = False, sportsRows = prefetched['sports'],
+                                           flows = prefetched['flows'][job['name']], baseView = self.baseView, cancelEvent = self.cancelEvent)
+            summary = prefetched['summary']
+            benchmarks = prefetched['benchmarks'] #the same frame for every report, so the workers share its cached charts
+        return {'holdingDict' : data, 'colorDepths' : colorDepths, 'holdings_header_order' : headerOrder, 'footerData' : footerData,
+                'onlyHoldings' : not self.fullReport, 'snapshotWb' : snapshotWb, 'benchmarks_df' : benchmarks, 'narrative_text' : summary}
+
+    def _prepareAll(self):
+        #prepare thread. Reports are built one at a time so only one report's tables are held at once
+        try:
+            prefetched, prefetchError = None, None
+            if self.fullReport:
+                try:
+                    prefetched = prefetchReportData(self.rApp.db, self.jobs, self.asOfDate)
+                except Exception as e:
+                    print(f"Error pulling the snapshot data for the reports: {e}")
+                    print(traceback.format_exc())
+                    prefetchError = e
+            for job in self.jobs:
+                if self.cancelEvent.is_set():
+                    break
+                start = time.perf_counter()
+                try:
+                    if prefetchError is not None:
+                        raise prefetchError
+                    renderArgs = self._prepareJob(job, prefetched)
+                    prepSeconds = time.perf_counter() - start
+                    outPath = os.path.join(self.outDir, reportFileName(job['name'], self.asOfDate))
+                    self.pool.apply_async(renderReportJob, args = (job['name'], outPath, renderArgs),
+                                          callback = lambda result, prep = prepSeconds: gui_queue.put(lambda: self._landed(result, prep)),
+                                          error_callback = lambda e, name = job['name'], prep = prepSeconds: gui_queue.put(
+                                              lambda: self._landed({'name' : name, 'path' : None, 'error' : str(e)}, prep)))
+                    gui_queue.put(lambda name = job['name']: self._progress(f"Prepared {name}"))
+                except tableBuildCancelled:
+                    break
+                except Exception as e:
+                    print(f"Error preparing report data for {job['name']}: {e}")
+                    print(traceback.format_exc())
+                    result = {'name' : job['name'], 'path' : None, 'error' : str(e)}
+                    gui_queue.put(lambda result = result, prep = time.perf_counter() - start: self._landed(result, prep))
+        finally:
+            self.pool.close()
+            gui_queue.put(self._allPrepared) #queued after every failure above, so the last one lands before the engine can finish
+
+    def _allPrepared(self):
+        self.prepared = True
+        if self.cancelEvent.is_set():
+            self.pool.terminate()
+            self._finish()
+        elif len(self.results) == len(self.jobs):
+            self._finish()
+        else:
+            self._progress('Rendering reports')
+
+    def _landed(self, result, prepSeconds):
+        result['prepSeconds'] = prepSeconds
+        self.results[result['name']] = result
+        print(f"Report {result['name']}: prep {prepSeconds:.1f}s, render {result.get('renderSeconds',0.0):.1f}s")
+        self._progress(f"Finished {result['name']}")
+        if self.prepared and not self.cancelEvent.is_set() and len(self.results) == len(self.jobs):
+            self._finish()
+
+    def _finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        self.pool.join()
+        self.prepThread.shutdown(wait = False)
+        ordered = [self.results[job['name']] for job in self.jobs if job['name'] in self.results]
+        summary = timingSummary(ordered, time.perf_counter() - self.startTime)
+        print(summary)
+        if self.onFinished:
+            self.onFinished(ordered, summary)
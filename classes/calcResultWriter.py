@@ -0,0 +1,108 @@
+import queue
+import threading
+import traceback
+from classes.engineRecords import toDBrow
+from classes.DatabaseManager import DatabaseManager, drop_staging_table, stage_rows, swap_staging_table, upsert_rows
+from scripts.commonValues import mainTableNames
+from scripts.basicFunctions import accountBalanceKey, transactionKey
+
+class calcResultWriter:
+    """
+    Streams worker results into staging tables on a dedicated thread while the pool is still calculating.
+    Pool callbacks only enqueue, so the result handler is never blocked by database writes.
+    Once every clump has landed, swap() replaces the live calculations with the staged copy.
+    Positions and transactions from the recalculated clumps are collected by row key instead and upserted by diff, so an
+    import writes only what changed. keepNames are the nodes of the clumps that were not recalculated, whose stored rows stay.
+    sourceRows are the imported rows per table that the workers' engine records point back to. Records become full dicts here.
+    """
+    def __init__(self, db : DatabaseManager, expected : int, sourceRows : dict[list[dict]] = None, keepNames : list[str] = None):
+        self.db = db
+        self.expected = expected
+        self.sourceRows = sourceRows or {}
+        self.keepNames = keepNames or []
+        self.landed = 0
+        self.tables = ('calculations', *mainTableNames)
+        self.columns = {'calculations' : []}
+        self.rowCounts = {table : 0 for table in self.tables}
+        self.keyedRows = {table : {} for table in mainTableNames}
+        self.writeCounts = {}
+        self.writeError = None
+        self._queue = queue.Queue()
+        for table in self.tables: #clear leftovers from an interrupted run
+            drop_staging_table(db, table)
+        self._thread = threading.Thread(target=self._run, name="calcResultWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, result):
+        #pool callback for a finished clump: (calculations, {table : rows})
+        self._queue.put((result, True))
+    def submitError(self, error):
+        #pool error callback. Still counts as landed so completion is not held up
+        print(f"Worker result failed and will not be saved: {error}")
+        self._queue.put((([], {}), True))
+    def addRows(self, calculations : list[dict]):
+        #calculations carried over from clumps that were not recalculated. Their positions and transactions stay as stored
+        self._queue.put(((calculations, {}), False))
+
+    def _keyRows(self, table, rows : list[dict]):
+        #later rows win for a repeated balance key. Transactions are grouped by key and numbered in transactionRows
+        keyed = self.keyedRows[table]
+        sourceRows = self.sourceRows.get(table)
+        for row in rows:
+            rowId = getattr(row, 'rowId', None)
+            row = toDBrow(row, sourceRows)
+            if table == 'positions':
+                keyed[accountBalanceKey(row)] = row
+            else:
+                group = keyed.setdefault(transactionKey(row), {})
+                group[(rowId is None, rowId if rowId is not None else len(group))] = row #a record filed twice is one row
+    def transactionRows(self):
+        #identical transactions are numbered in import order, so the keys do not depend on which worker landed first
+        return {f"{key}#{occurrence}" : group[rowOrder] for key, group in self.keyedRows['transactions'].items()
+                for occurrence, rowOrder in enumerate(sorted(group), start = 1)}
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            (calculations, dynTables), fromWorker = item
+            if self.writeError is None:
+                try:
+                    self.columns['calculations'] = stage_rows(self.db, 'calculations', calculations, self.columns['calculations'])
+                    self.rowCounts['calculations'] += len(calculations)
+                    for table in mainTableNames:
+                        self._keyRows(table, dynTables.get(table, []))
+                        self.rowCounts[table] += len(dynTables.get(table, []))
+                except Exception as e:
+                    self.writeError = e
+                    print(f"Error staging calculation results: {e}")
+                    print(traceback.format_exc())
+            if fromWorker:
+                self.landed += 1
+
+    def finish(self):
+        #waits for every queued result to be written
+        self._queue.put(None)
+        self._thread.join()
+        if self.writeError is not None:
+            raise self.writeError
+        print(f"Staged {self.rowCounts} rows from {self.landed}/{self.expected} result sets")
+        return self.rowCounts
+    def swap(self):
+        #tables with nothing staged keep their current data, as save_to_db does for empty inputs
+        if self.rowCounts['calculations']:
+            swap_staging_table(self.db, 'calculations')
+        else:
+            print("No rows found for data input to 'calculations'")
+            drop_staging_table(self.db, 'calculations')
+        for table in mainTableNames:
+            keyedRows = self.transactionRows() if table == 'transactions' else self.keyedRows[table]
+            self.writeCounts[table] = upsert_rows(self.db, table, keyedRows, keepNames = self.keepNames)
+        self.keyedRows = {table : {} for table in mainTableNames}
+    def abort(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.keyedRows = {table : {} for table in mainTableNames}
+        for table in self.tables:
+            drop_staging_table(self.db, table)
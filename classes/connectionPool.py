@@ -0,0 +1,116 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+class waitStats:
+    """Running count, total and worst wait in seconds for one lock or pool. Slow waits are the ones over slowWait"""
+    def __init__(self, slowWait : float = 0.05):
+        self.slowWait = slowWait
+        self.count = 0
+        self.slow = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self._lock = threading.Lock()
+    def record(self, seconds : float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds > self.worst:
+                self.worst = seconds
+            if seconds >= self.slowWait:
+                self.slow += 1
+    def snapshot(self):
+        with self._lock:
+            return {'acquires' : self.count, 'slowWaits' : self.slow, 'totalWait' : round(self.total, 4), 'worstWait' : round(self.worst, 4),
+                    'avgWait' : round(self.total / self.count, 6) if self.count else 0.0}
+    def reset(self):
+        with self._lock:
+            self.count = self.slow = 0
+            self.total = self.worst = 0.0
+
+class timedLock:
+    """
+    Reentrant lock that records how long each acquire waited and which thread holds it.
+    Used as the database writer lock so import contention shows up in the pool metrics.
+    """
+    def __init__(self, stats : waitStats = None):
+        self._inner = threading.RLock()
+        self.stats = stats or waitStats()
+        self._owner = None
+        self._depth = 0
+    def acquire(self, blocking : bool = True, timeout : float = -1):
+        start = time.perf_counter()
+        acquired = self._inner.acquire(blocking, timeout)
+        if acquired:
+            if self._depth == 0: #nested acquires by the holder never wait so only the outer one is timed
+                self.stats.record(time.perf_counter() - start)
+            self._owner = threading.get_ident()
+            self._depth += 1
+        return acquired
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+        self._inner.release()
+    def __enter__(self):
+        self.acquire()
+        return self
+    def __exit__(self, *_):
+        self.release()
+    def heldByCurrentThread(self):
+        return self._owner == threading.get_ident()
+
+class connectionPool:
+    """
+    Read-only reader connections next to the single writer connection of a WAL mode SQLite database.
+    Each thread checks out its own reader, so table builds, filter queries and exports keep reading while an import holds the writer.
+    A thread that already holds the writer lock reads through the writer so it sees its own uncommitted rows.
+    """
+    def __init__(self, dbPath : str, writer, writeLock : timedLock, readers : int = 4):
+        self.writer = writer
+        self.writeLock = writeLock
+        self.readerStats = waitStats()
+        self._idle = queue.LifoQueue()
+        self._local = threading.local()
+        self._readers = []
+        uri = Path(os.path.abspath(dbPath)).as_uri()
+        for _ in range(readers):
+            conn = sqlite3.connect(uri, uri = True, check_same_thread = False)
+            conn.execute("PRAGMA query_only=ON;")
+            self._readers.append(conn)
+            self._idle.put(conn)
+
+    @contextmanager
+    def reader(self):
+        if self.writeLock.heldByCurrentThread():
+            yield self.writer
+            return
+        held = getattr(self._local, 'conn', None)
+        if held is not None: #nested reads on the same thread reuse its checkout
+            yield held
+            return
+        start = time.perf_counter()
+        conn = self._idle.get()
+        self.readerStats.record(time.perf_counter() - start)
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    def metrics(self):
+        return {'writer' : self.writeLock.stats.snapshot(), 'readers' : self.readerStats.snapshot(),
+                'readerConnections' : len(self._readers), 'idleReaders' : self._idle.qsize()}
+
+    def close(self):
+        for conn in self._readers:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._readers = []
@@ -0,0 +1,125 @@
+import sys
+from scripts.commonValues import nameHier
+from scripts.normalizeRows import isoDateParts
+
+class _missingType:
+    #marks a column the source row did not have, so 'in' and get defaults behave as they did on the dict
+    __slots__ = ()
+    def __reduce__(self):
+        return '_missing'
+    def __repr__(self):
+        return '<missing>'
+_missing = _missingType()
+
+class engineRecord:
+    """
+    Engine view of one imported position or transaction. Only the columns the calculations read are kept, in slots, with
+    names and dates interned, so the copies filed under every month bucket and direction and pickled to the workers stay
+    small. Supports the dict access the engine uses: row[key], get, in, assignment, keys and items.
+    Columns the engine does not read stay in the parent's imported row. toDict merges the two back at the DB boundary.
+    dateParts is the parsed Date (scripts.normalizeRows), kept up to date when Date is assigned.
+    overrides are the rowIds of the balances this one won over (scripts.balanceResolver). Neither is a column.
+    """
+    __slots__ = ('rowId', '_extra', 'dateParts', 'overrides')
+    columns = ()
+    _slotOf = {}
+
+    @classmethod
+    def fromDict(cls, row : dict, rowId : int):
+        rec = cls.__new__(cls)
+        rec.rowId = rowId
+        rec._extra = None
+        rec.overrides = ()
+        for column, slot in cls._slotOf.items():
+            val = row.get(column, _missing)
+            object.__setattr__(rec, slot, sys.intern(val) if type(val) is str else val)
+        rec._parseDate()
+        return rec
+    def _parseDate(self):
+        date = self.get('Date')
+        try:
+            self.dateParts = isoDateParts(date) if date is not None else None
+        except ValueError:
+            self.dateParts = None #normalizeRows drops these at import
+
+    def __getstate__(self):
+        return (self.rowId, self._extra, self.dateParts, self.overrides, tuple(getattr(self, slot) for slot in self._slotOf.values()))
+    def __setstate__(self, state):
+        self.rowId, self._extra, self.dateParts, self.overrides, vals = state
+        for slot, val in zip(self._slotOf.values(), vals):
+            object.__setattr__(self, slot, val)
+    def __deepcopy__(self, memo):
+        rec = self.__class__.__new__(self.__class__)
+        rec.__setstate__(self.__getstate__())
+        if rec._extra is not None:
+            rec._extra = dict(rec._extra)
+        return rec
+
+    def __getitem__(self, key):
+        slot = self._slotOf.get(key)
+        if slot is not None:
+            val = getattr(self, slot)
+            if val is not _missing:
+                return val
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+    def get(self, key, default = None):
+        slot = self._slotOf.get(key)
+        if slot is not None:
+            val = getattr(self, slot)
+            return default if val is _missing else val
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+    def __setitem__(self, key, val):
+        slot = self._slotOf.get(key)
+        if slot is not None:
+            object.__setattr__(self, slot, val)
+            if key == 'Date':
+                self._parseDate()
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = val
+    def __contains__(self, key):
+        slot = self._slotOf.get(key)
+        if slot is not None:
+            return getattr(self, slot) is not _missing
+        return self._extra is not None and key in self._extra
+    def keys(self):
+        present = [column for column, slot in self._slotOf.items() if getattr(self, slot) is not _missing]
+        return present + list(self._extra) if self._extra else present
+    def __iter__(self):
+        return iter(self.keys())
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self.items())})"
+
+    def toDict(self, sourceRows : list[dict] = None):
+        #the full row for the database: the imported row with the engine's values on top
+        row = dict(sourceRows[self.rowId]) if sourceRows is not None and self.rowId is not None else {}
+        row.update(self.items())
+        return row
+
+def _recordClass(name : str, columns : tuple):
+    slots = tuple(f'c{idx}' for idx in range(len(columns)))
+    return type(name, (engineRecord,), {'__slots__' : slots, 'columns' : columns, '_slotOf' : dict(zip(columns, slots))})
+
+#every column processNode, processOneLevelInvestments, processClump and the balance/transaction keys read or write
+positionRecord = _recordClass('positionRecord', ('Date', 'Source name', 'Target name', 'node', nameHier["Value"]["dynLow"], 'Balancetype',
+                                                 'InvestsThrough', nameHier["FundClass"]["dynLow"], nameHier["Commitment"]["local"],
+                                                 nameHier["Unfunded"]["local"], 'Contributions', 'Distributions', 'Redemptions'))
+transactionRecord = _recordClass('transactionRecord', ('Date', 'Source name', 'Target name', 'node', 'TransactionType', 'HFCashFlowType',
+                                                       nameHier["CashFlow"]["dynLow"], nameHier["Unfunded"]["dynLow"], nameHier["Commitment"]["dynLow"],
+                                                       nameHier["Transaction Time"]["dynLow"], 'Calculation Date'))
+recordClasses = {'positions' : positionRecord, 'transactions' : transactionRecord}
+
+def toEngineRecords(table : str, rows : list[dict]):
+    """Records for one imported table. rowId is the row's index in rows, which toDict needs back at the DB boundary"""
+    recordClass = recordClasses[table]
+    return [recordClass.fromDict(row, rowId) for rowId, row in enumerate(rows)]
+
+def toDBrow(row, sourceRows : list[dict] = None):
+    return row.toDict(sourceRows) if isinstance(row, engineRecord) else row
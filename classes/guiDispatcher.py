@@ -0,0 +1,87 @@
+import threading
+import time
+import traceback
+from collections import deque
+
+class guiDispatcher:
+    """
+    Hands GUI work from background threads to the main thread. Drop-in for the old gui_queue: put(callback) from any thread.
+    Once attach() is called on the main thread, a put wakes it straight away through a queued Qt signal instead of waiting
+    for the next poll. Without attach (scripts and tests) drain() still runs everything pending, as poll_queue did.
+    put(callback, key) coalesces: a newer callback with the same key replaces a pending one, so only the latest progress value
+    is drawn. Queue latency from put to run is recorded for latencySummary().
+    """
+    def __init__(self, slowLatency : float = 0.1):
+        self.slowLatency = slowLatency
+        self._pending = deque() #(key or None, callback, queuedAt)
+        self._keyed = {} #key : [callback, queuedAt] for keyed entries still waiting
+        self._lock = threading.Lock()
+        self._wakePending = False
+        self._bridge = None
+        self.ran = 0
+        self.coalesced = 0
+        self.slow = 0
+        self.totalLatency = 0.0
+        self.worstLatency = 0.0
+
+    def attach(self):
+        #must be called on the main thread once the QApplication exists
+        from PyQt5.QtCore import QObject, Qt, pyqtSignal
+        class dispatchBridge(QObject):
+            wake = pyqtSignal()
+        self._bridge = dispatchBridge()
+        self._bridge.wake.connect(self.drain, Qt.QueuedConnection)
+        self._wake()
+
+    def put(self, callback, key : str = None):
+        now = time.perf_counter()
+        with self._lock:
+            if key is not None and key in self._keyed:
+                self._keyed[key][0] = callback #the entry keeps its place in line and original queue time
+                self.coalesced += 1
+                return
+            if key is not None:
+                self._keyed[key] = [callback, now]
+            self._pending.append((key, callback, now))
+        self._wake()
+
+    def _wake(self):
+        with self._lock:
+            if self._bridge is None or self._wakePending or not self._pending:
+                return
+            self._wakePending = True
+        self._bridge.wake.emit()
+
+    def drain(self):
+        with self._lock:
+            self._wakePending = False #puts made while this batch runs wake another drain
+            batch = []
+            while self._pending:
+                key, callback, queuedAt = self._pending.popleft()
+                if key is not None:
+                    callback, queuedAt = self._keyed.pop(key)
+                batch.append((callback, queuedAt))
+        for callback, queuedAt in batch:
+            self._record(time.perf_counter() - queuedAt)
+            try:
+                callback() # Run the GUI update in the main thread
+            except Exception as e:
+                trace = traceback.format_exc()
+                print(f"Error occured while attempting to run background gui update: {e}. \n traceback: \n {trace}")
+
+    def _record(self, latency : float):
+        self.ran += 1
+        self.totalLatency += latency
+        if latency > self.worstLatency:
+            self.worstLatency = latency
+        if latency >= self.slowLatency:
+            self.slow += 1
+
+    def latencyStats(self):
+        return {'ran' : self.ran, 'coalesced' : self.coalesced, 'slow' : self.slow, 'worstLatency' : round(self.worstLatency, 4),
+                'avgLatency' : round(self.totalLatency / self.ran, 6) if self.ran else 0.0}
+
+    def latencySummary(self):
+        stats = self.latencyStats()
+        return (f"GUI dispatch: {stats['ran']} updates, {stats['coalesced']} coalesced, avg {stats['avgLatency'] * 1000:.1f}ms, "
+                f"worst {stats['worstLatency'] * 1000:.1f}ms, {stats['slow']} over {self.slowLatency * 1000:.0f}ms")
@@ -5,25 +5,34 @@ from scripts.instantiate_basics import ASSETS_DIR, DATABASE_PATH, gui_queue, exe
 from classes.widgetClasses import CheckboxIntInputWidget, simpleMonthSelector, MultiSelectBox, SortButtonWidget
 from scripts.commonValues import (currentVersion, dataTimeStart, headerSortExclusions, invNodeOnlyHeaders, nameHier, headerOptions, nonAggregatingCols, nonDefaultHeaders, ownershipCorrect, masterFilterOptions, importInterval, 
                     currentVersion, demoMode, fullRecalculations, calculationPingTime, dashInactiveMinutes, nonFundCols, mainTableNames,
-                    nodePathSplitter,assetClass1Order, assetClass2Order,headerOptions, dataOptions, assetLevelLinks, textCols,
-                    yearOptions, percent_headers, mainURL, dynamoAPIenvName)
+                    nodePathSplitter,assetClass1Order,aggregateCubeHierarchies, assetClass2Order,headerOptions, dataOptions, assetLevelLinks, textCols,
+                    yearOptions, percent_headers, mainURL, dynamoAPIenvName, fullPortStr, sqlPlaceholder)
 from scripts.processInvestments import processInvestments
-from scripts.basicFunctions import (calc_DPI_TVPI, findSign, updateStatus, annualizeITD, submitAPIcall, get_connected_node_groups, 
-                                 descendingNavSort, accountBalanceKey, separateRowCode, findSourceName)
+from scripts.basicFunctions import (calc_DPI_TVPI, findSign, updateStatus, submitAPIcall, get_connected_node_groups, 
+                                 descendingNavSort, separateRowCode, findSourceName, rowColorDepths, setViewFilter)
 from classes.windowClasses import investablesMenu, reportDataWindow, reportExportWindow, underlyingDataWindow, linkBenchmarksWindow, tableWindow, exportWindow, displayWindow
 from classes.tableWidgets import DictListModel, SmartStretchTable
-from TreeScripts.dash_launcher import _run_dash_app_process
 from classes.transactionApp import transactionApp
 from scripts.pyqtFunctions import basicHoldingsReportExport, filt2Query
 from scripts.processClump import processClump
+from scripts.returnSeries import trailingWindowReturns
 from classes.nodeLibrary import nodeLibrary
-from openpyxl.utils import get_column_letter
+from classes.calcResultWriter import calcResultWriter
+from classes.engineRecords import toEngineRecords
+from scripts.balanceResolver import effectiveBalanceRows, resolveBalances
+from classes.tableBuildScheduler import tableBuildCancelled, tableBuildScheduler
+from classes.viewPrefetcher import viewPrefetcher
+from scripts.calcLog import endRun, initWorkerLogging, logEvent, startRun, startWorkerListener
+from scripts.runMetrics import finishRunMetrics, span, startRunMetrics
+from scripts.normalizeRows import calcDateTime, isoDateParts, monthOrdinals, normalizeRows, partsDateTime, rowMonths
+from scripts.tableSnapshot import saveTableSnapshot, loadTableSnapshot, clearTableSnapshots
 import statistics
 
 
 import os
 import re
 import json
+import hashlib
 import time
 import copy
 import logging
@@ -33,14 +42,10 @@ import traceback
 import threading
 import subprocess
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl import load_workbook
 from concurrent.futures import wait
 from collections import defaultdict
 from multiprocessing import Pool, Manager
-from openpyxl.utils import get_column_letter
 from dateutil.relativedelta import relativedelta
-from openpyxl.styles import PatternFill, Alignment, Font
 
 
 from PyQt5.QtWidgets import (
@@ -68,8 +73,7 @@ class returnsApp(QWidget):
         self.api_key = None
         self.filterCallLock = False
         self.cancel = False
-        self.lock = threading.Lock()
-        self.db._lock = self.lock #attach the lock to the database manager
+        self.lock = self.db._lock #share the database manager's writer lock
         self.tableWindows = {}
         self.dataTimeStart = dataTimeStart
         self.earliestChangeDate = datetime.now() + relativedelta(months=1)
@@ -79,6 +83,9 @@ class returnsApp(QWidget):
         self.fullLevelOptions = {}
         self.buildTableCancel = None
         self.buildTableFuture = None
+        self.tableBuilds = tableBuildScheduler(self)
+        self.aggregationCache = None #(inputs key, row structure, aggregated data) of the last database build
+        self.prefetcher = viewPrefetcher(self) #aggregates popular views after each import
         self.cFundsCalculated = False
         self.previousGrouping = set()
 
@@ -193,8 +200,12 @@ class returnsApp(QWidget):
             # Close database connection
             if hasattr(self, 'db') and hasattr(self.db, '_conn'):
                 print("Closing database connection...")
-                self.db._conn.close()
+                self.db.close()
                 print("Database connection closed.")
+            print(gui_queue.latencySummary())
+            if hasattr(self, 'prefetcher'):
+                print(self.prefetcher.summary())
+                self.prefetcher.shutdown()
             
             # Shutdown the manager (this will also signal subprocesses)
             if hasattr(self, 'dash_manager'):
@@ -359,7 +370,7 @@ class returnsApp(QWidget):
             buttonLayout.addWidget(rb)
         self.returnOutputType = QComboBox()
         self.returnOutputType.addItems([opt for opt in headerOptions if opt not in textCols])
-        self.returnOutputType.currentTextChanged.connect(self.buildReturnTable)
+        self.returnOutputType.currentTextChanged.connect(self.presentationChange)
         self.dataTypeBox = QWidget()
         dataTypeLayout = QHBoxLayout()
         dataTypeLayout.addWidget(QLabel("Data type:"))
@@ -368,7 +379,7 @@ class returnsApp(QWidget):
         buttonLayout.addWidget(self.dataTypeBox)
         buttonBox.setLayout(buttonLayout)
         optionsGrid.addWidget(buttonBox, 0,1,2,1)
-        self.tableBtnGroup.buttonClicked.connect(self.buildReturnTable)
+        self.tableBtnGroup.buttonClicked.connect(self.presentationChange)
         self.complexTableBtn.setChecked(True)
         
         self.dataStartSelect = simpleMonthSelector()
@@ -392,7 +403,7 @@ class returnsApp(QWidget):
         optionsGrid.addWidget(self.consolidateFundsBtn,0,6)
         self.exitedFundsInput = CheckboxIntInputWidget('Hide Funds With 0 NAV for ', 1, ' Months')
         self.exitedFundsInput.setChecked(False)
-        self.exitedFundsInput.valChange.connect(self.buildReturnTable)
+        self.exitedFundsInput.valChange.connect(self.presentationChange)
         optionsGrid.addWidget(self.exitedFundsInput,1,6)
         self.headerSort = SortButtonWidget()
         self.headerSort.exclusions = headerSortExclusions
@@ -527,6 +538,7 @@ class returnsApp(QWidget):
         self.dataStartSelect.currentTextChanged.connect(self.buildReturnTable)
     def init_data_processing(self):
         self.calcSubmitted = False
+        snapshotCurrent = self.showTableSnapshot() #last session's table shows before anything loads
         self.lastImportDB = load_from_db(self.db,"history")
         if len(self.lastImportDB) != 1:
             self.lastImportDB = None
@@ -549,7 +561,8 @@ class returnsApp(QWidget):
                 calculations = load_from_db(self.db,"calculations")
                 if calculations != []:
                     self.populate(self.calculationTable,calculations)
-                    self.buildReturnTable()
+                    if not snapshotCurrent: #nothing changed since the snapshot was built, so there is nothing to rebuild
+                        self.buildReturnTable()
                 else:
                     executor.submit(self.pullData)
     def watchForUpdateTime(self):
@@ -665,10 +678,10 @@ class returnsApp(QWidget):
         # Load data in background thread, then launch in separate process
         def load_and_launch():
             try:
-                # Load data using DatabaseManager
-                data_df = self.db.load_dash_data()
+                # The Arrow file is written once per import. It is rebuilt when the database's lastImport moved on without it (another client's import)
+                data_path = self.db.dashDataFile() or self.db.writeDashData()
                 
-                if data_df is None or data_df.empty:
+                if data_path is None:
                     # Close loading message and show warning
                     gui_queue.put(self._close_dash_loading_msg)
                     gui_queue.put(lambda: QMessageBox.warning(
@@ -678,18 +691,15 @@ class returnsApp(QWidget):
                     ))
                     return
                 
-                # Pickle the data for passing to subprocess
-                import pickle
-                data_pickle = pickle.dumps(data_df)
-                
                 # Close loading message
                 gui_queue.put(self._close_dash_loading_msg)
                 
                 # Launch in separate process with pre-loaded data
                 from multiprocessing import Process
+                from TreeScripts.dash_launcher import _run_dash_app_process #dash and plotly load on the first launch, not at startup
                 inactivity_timeout = dashInactiveMinutes  # Minutes of inactivity before auto-shutdown
                 # Pass the shared active flag dict to the subprocess
-                p = Process(target=_run_dash_app_process, args=(data_pickle, target_node, target_date, self.dash_active_flag, inactivity_timeout))
+                p = Process(target=_run_dash_app_process, args=(data_path, target_node, target_date, self.dash_active_flag, inactivity_timeout))
                 p.daemon = False  # Allow it to continue after main app closes
                 p.start()
                 
@@ -829,16 +839,6 @@ class returnsApp(QWidget):
         self.exportCurrentTable(ACcols = export_type == ACopt)
     def exportCurrentTable(self,*_, ACcols = False):
         #excel export for the returns app excel export
-        # helper to darken a 6-digit hex color by a given factor
-        def darken_color(hex_color, factor=0.01):
-            h = hex_color.strip("#")
-            r = int(h[0:2], 16)
-            g = int(h[2:4], 16)
-            b = int(h[4:6], 16)
-            dr = max(0, int(r * factor))
-            dg = max(0, int(g * factor))
-            db = max(0, int(b * factor))
-            return f"{dr:02X}{dg:02X}{db:02X}"
         # 1) prompt user
         path, _ = QFileDialog.getSaveFileName(
             self, "Save as…", "", "Excel Files (*.xlsx)"
@@ -849,6 +849,7 @@ class returnsApp(QWidget):
             path += ".xlsx"
 
         def processExport():
+            from scripts.excelExport import excelExportEngine, darken_color, get_column_letter #openpyxl loads on the first export, not at startup
             try:
                 data = self.filteredReturnsTableData
 
@@ -893,147 +894,11 @@ class returnsApp(QWidget):
                         sourceCol = None
                     sorted_cols = ['Level','Name',*insertCols,'AC1','AC2','AC3','HF Classification','HF sub-Classification','Node','Investment',*sorted_cols]
                     fund2trait = self.db.fund2trait
-                # 4) create workbook or add sheet if already exists
-                if os.path.exists(path):
-                    wb = load_workbook(path)
-                    # Create a unique sheet name for export
-                    base_name = "Export"
-                    i = 1
-                    while True:
-                        sheet_name = f"{base_name}{i}"
-                        if sheet_name not in wb.sheetnames:
-                            break
-                        i += 1
-                    ws = wb.create_sheet(sheet_name)
-                else:
-                    wb = Workbook()
-                    ws = wb.active
-
-                rowStart = 3
-                # 5) header row
+                # 4) streaming workbook, or a new sheet if the file already exists
+                engine = excelExportEngine(path)
                 startCol = 1 if ACcols else 2
                 freezeCol = 3 if ACcols else 2
-                for idx, colname in enumerate(sorted_cols, start=startCol):
-                    ws.cell(row=rowStart, column=idx, value=colname)
-
-                split_cell = f"{get_column_letter(freezeCol)}4"
-                ws.freeze_panes = split_cell
-
-                # 7) populate rows
-                sortHier = self.sortHierarchy.checkedItems()
-                maxDepth   = max(len(sortHier),1) + 1
-                nodeDicts = self.db.fetchNodes()
-                nodes = set(nD['name'] for nD in nodeDicts)
-                for r, (row_name, row_dict) in enumerate(data.items(), start=rowStart + 1):
-                    row_name, code = separateRowCode(row_name)
-                    dtype = row_dict.get("dataType")
-                    if dtype != "benchmark": #keeps benchmark as the previous hierarchy level
-                        level = hierarchy_levels.index(dtype) if dtype in hierarchy_levels else 0
-                        # fills
-                        data_color = "FFFFFF"
-                        if dtype != "Total Target name":
-                            depth      = code.count("::") if dtype != "Total" else code.count("::") - 1
-                            data_color = darken_color(data_color,depth/maxDepth/3 + 2/3)
-                        else:
-                            depth = maxDepth
-                        header_color = data_color
-                        data_fill   = PatternFill("solid", data_color, data_color)
-                        header_fill = PatternFill("solid", header_color, header_color)
-
-                    if not ACcols:
-                        cell = ws.cell(row=r, column=1, value=row_name.strip())
-                        cell.fill = header_fill
-                        cell.font = Font(bold=True)
-                        if dtype == "benchmark":
-                            cell.font = Font(color="0000FF")
-                        cell.alignment = Alignment(indent=level)
-                    else:
-                        sortHierT = sortHier.copy()
-                        itemDepth = depth + 2 if dtype != "Total Target name" else depth + 1#TODO: solve to find real depth w node issues
-                        itemHier = code.removeprefix("##(").removesuffix(")##").split("::")
-
-                        if 'Node' in sortHier and sortHier.index('Node') < depth:
-                            prevNodeCnt = 0
-                            for nodeTier in (tier for tier in itemHier if tier in nodes):
-                                prevNodeCnt += 1 #find num of nodes passed to adjust depth
-                            if prevNodeCnt > 0:
-                                prevNodeCnt -= 1 #account for the initial node
-                                if dtype != "Total Target name":
-                                    itemDepth -= prevNodeCnt #reduce depth by all previous nodes more than 1
-                                sortHierT = sortHier[:sortHier.index('Node')] + prevNodeCnt * ['Node',] + sortHier[sortHier.index('Node'):]
-                        if dtype != "benchmark":
-                            row_dict['Level'] = f'L{itemDepth}' #move to 1 indexed. Push past total
-                        else:
-                            row_dict['Level'] = f'B{itemDepth}'
-                        row_dict['Name'] = row_name
-                        if dtype == 'Total':
-                            row_dict['Level'] = 'L1'
-                        elif dtype == "Total Target name":
-                            row_dict['Investment'] = row_name
-                            target = list(self.cFundToFundLinks.get(row_name,[row_name,]))[0] #convert any consolidated funds to one of their sub-funds
-                            fundTraits = fund2trait.get(target,{})
-                            AC1 = fundTraits.get('assetClass','Not Found')
-                            AC2 = fundTraits.get('subAssetClass','Not Found')
-                            AC3 = fundTraits.get('subAssetSleeve','Not Found')
-                            HFclass = fundTraits.get('Classification','Not Found')
-                            HFsubClass = fundTraits.get('subClassification','Not Found')
-                            for txt,var in (['AC1',AC1],['AC2',AC2],['AC3',AC3],['HF Classification',HFclass],['HF sub-Classification',HFsubClass]):
-                                row_dict[txt] = var
-                        else:
-                            for rowTxt, AClvl in (['AC1','assetClass'],['AC2','subAssetClass'],['AC3','sleeve'],['HF Classification', 'Classification'],['HF sub-Classification', 'subClassification']):
-                                if AClvl in sortHierT and sortHierT.index(AClvl) <= len(itemHier) - 1: #check viability
-                                    try:
-                                        row_dict[rowTxt] = itemHier[sortHierT.index(AClvl)]
-                                    except:
-                                        print('Failed assigning AC levels')
-                                        raise
-                        if dtype == 'Node':
-                            row_dict['Node'] = row_name
-                        for stripKey in (key for key in row_dict if key in ('AC1','AC2','AC3','Name')):
-                            row_dict[stripKey] = row_dict[stripKey].strip() #remove spaces from these cols. (ex: 'Cash  ' --> 'Cash')
-                        
-                        sourceSearch = []
-                        if famCol:
-                            sourceSearch.append(['Family Branch','Family Branch'])
-                        if sourceCol:
-                            sourceSearch.append(['Investor','Source name'])
-                        sourceSearch.append(['Node','Node'])
-                        if sourceSearch:
-                            for rowTxt, lvl in sourceSearch:
-                                if itemHier != [''] and lvl in sortHierT and sortHierT.index(lvl) <= len(itemHier) - 1: #check viability
-                                    try:
-                                        row_dict[rowTxt] = itemHier[sortHierT.index(lvl)]
-                                    except:
-                                        print('Failed assigning investors and family branches')
-                                        raise
-
-                                    
-
-
-                    # data cells with proper formatting
-                    for c, colname in enumerate(sorted_cols, start=startCol):
-                        val = row_dict.get(colname, None)
-                        cell = ws.cell(row=r, column=c, value=val)
-                        cell.fill = data_fill
-                        if dtype == "benchmark":
-                            cell.font = Font(color="0000FF")
-                        if isinstance(val, (int, float)):
-                            if colname not in percent_headers:
-                                # show with commas, two decimals
-                                cell.number_format = "#,##0.00"
-                            else:
-                                # interpret val as percentage (e.g. 10.5 → 10.5%)
-                                cell.value = val / 100.0
-                                cell.number_format = "0.00%"
-
-                # 8) autofit column widths
-                for idx, col_cells in enumerate(ws.columns, start=1):
-                    max_len = 0
-                    for cell in col_cells:
-                        if cell.value is not None:
-                            text = str(cell.value)
-                            max_len = max(max_len, len(text))
-                    ws.column_dimensions[get_column_letter(idx)].width = max_len + 2
+                engine.freeze(f"{get_column_letter(freezeCol)}4")
 
                 filterSelections = {}
                 for filter in self.filterOptions:
@@ -1061,24 +926,111 @@ class returnsApp(QWidget):
                     elif date_end:
                         date_range_str = f"End: {date_end}"
 
-                if filterSelections or date_range_str:
-                    # Date range in column A
-                    ws.cell(row=1, column=1, value="Date Range:")
-                    ws.cell(row=2, column=1, value=date_range_str)
-                    ws.cell(row=1, column=1).font = Font(bold=True)
-                    ws.cell(row=2, column=1).font = Font(bold=True)
-                    # Filters start at column 2
-                    ws.cell(row=1, column=2, value="Filters:")
-                    ws.cell(row=2, column=2, value="Selections:")
-                    ws.cell(row=1, column=2).font = Font(bold=True)
-                    ws.cell(row=2, column=2).font = Font(bold=True)
-                    for idx, filter in enumerate(filterSelections, start=3):
-                        ws.cell(row=1, column=idx, value=filter)
-                        cell = ws.cell(row=2, column=idx, value=filterSelections.get(filter))
-                        cell.alignment = Alignment(wrap_text=True)
+                def tableRows():
+                    #rows 1-2 hold the date range and filters. Write-only sheets are filled top down so they come first
+                    if filterSelections or date_range_str:
+                        bold = engine.style(bold=True)
+                        wrap = engine.style(wrap=True)
+                        yield [engine.cell("Date Range:", bold), engine.cell("Filters:", bold), *filterSelections]
+                        yield [engine.cell(date_range_str, bold), engine.cell("Selections:", bold),
+                               *(engine.cell(filterSelections.get(filter), wrap) for filter in filterSelections)]
+                    else:
+                        yield []
+                        yield []
+                    # 5) header row
+                    yield [None] * (startCol - 1) + list(sorted_cols)
+
+                    # 7) populate rows
+                    sortHier = self.sortHierarchy.checkedItems()
+                    maxDepth   = max(len(sortHier),1) + 1
+                    nodeDicts = self.db.fetchNodes()
+                    nodes = set(nD['name'] for nD in nodeDicts)
+                    for row_name, row_dict in data.items():
+                        row_name, code = separateRowCode(row_name)
+                        dtype = row_dict.get("dataType")
+                        if dtype != "benchmark": #keeps benchmark as the previous hierarchy level
+                            level = hierarchy_levels.index(dtype) if dtype in hierarchy_levels else 0
+                            # fills
+                            data_color = "FFFFFF"
+                            if dtype != "Total Target name":
+                                depth      = code.count("::") if dtype != "Total" else code.count("::") - 1
+                                data_color = darken_color(data_color,depth/maxDepth/3 + 2/3)
+                            else:
+                                depth = maxDepth
+                        fontColor = "0000FF" if dtype == "benchmark" else None
+                        cells = []
+                        if not ACcols:
+                            cells.append(engine.cell(row_name.strip(), engine.style(data_color, bold = dtype != "benchmark", color = fontColor, indent = level)))
+                        else:
+                            sortHierT = sortHier.copy()
+                            itemDepth = depth + 2 if dtype != "Total Target name" else depth + 1#TODO: solve to find real depth w node issues
+                            itemHier = code.removeprefix("##(").removesuffix(")##").split("::")
+
+                            if 'Node' in sortHier and sortHier.index('Node') < depth:
+                                prevNodeCnt = 0
+                                for nodeTier in (tier for tier in itemHier if tier in nodes):
+                                    prevNodeCnt += 1 #find num of nodes passed to adjust depth
+                                if prevNodeCnt > 0:
+                                    prevNodeCnt -= 1 #account for the initial node
+                                    if dtype != "Total Target name":
+                                        itemDepth -= prevNodeCnt #reduce depth by all previous nodes more than 1
+                                    sortHierT = sortHier[:sortHier.index('Node')] + prevNodeCnt * ['Node',] + sortHier[sortHier.index('Node'):]
+                            if dtype != "benchmark":
+                                row_dict['Level'] = f'L{itemDepth}' #move to 1 indexed. Push past total
+                            else:
+                                row_dict['Level'] = f'B{itemDepth}'
+                            row_dict['Name'] = row_name
+                            if dtype == 'Total':
+                                row_dict['Level'] = 'L1'
+                            elif dtype == "Total Target name":
+                                row_dict['Investment'] = row_name
+                                target = list(self.cFundToFundLinks.get(row_name,[row_name,]))[0] #convert any consolidated funds to one of their sub-funds
+                                fundTraits = fund2trait.get(target,{})
+                                AC1 = fundTraits.get('assetClass','Not Found')
+                                AC2 = fundTraits.get('subAssetClass','Not Found')
+                                AC3 = fundTraits.get('subAssetSleeve','Not Found')
+                                HFclass = fundTraits.get('Classification','Not Found')
+                                HFsubClass = fundTraits.get('subClassification','Not Found')
+                                for txt,var in (['AC1',AC1],['AC2',AC2],['AC3',AC3],['HF Classification',HFclass],['HF sub-Classification',HFsubClass]):
+                                    row_dict[txt] = var
+                            else:
+                                for rowTxt, AClvl in (['AC1','assetClass'],['AC2','subAssetClass'],['AC3','sleeve'],['HF Classification', 'Classification'],['HF sub-Classification', 'subClassification']):
+                                    if AClvl in sortHierT and sortHierT.index(AClvl) <= len(itemHier) - 1: #check viability
+                                        try:
+                                            row_dict[rowTxt] = itemHier[sortHierT.index(AClvl)]
+                                        except:
+                                            print('Failed assigning AC levels')
+                                            raise
+                            if dtype == 'Node':
+                                row_dict['Node'] = row_name
+                            for stripKey in (key for key in row_dict if key in ('AC1','AC2','AC3','Name')):
+                                row_dict[stripKey] = row_dict[stripKey].strip() #remove spaces from these cols. (ex: 'Cash  ' --> 'Cash')
+                        
+                            sourceSearch = []
+                            if famCol:
+                                sourceSearch.append(['Family Branch','Family Branch'])
+                            if sourceCol:
+                                sourceSearch.append(['Investor','Source name'])
+                            sourceSearch.append(['Node','Node'])
+                            if sourceSearch:
+                                for rowTxt, lvl in sourceSearch:
+                                    if itemHier != [''] and lvl in sortHierT and sortHierT.index(lvl) <= len(itemHier) - 1: #check viability
+                                        try:
+                                            row_dict[rowTxt] = itemHier[sortHierT.index(lvl)]
+                                        except:
+                                            print('Failed assigning investors and family branches')
+                                            raise
 
-            
-                wb.save(path)
+                                    
+
+
+                        # data cells with proper formatting
+                        for colname in sorted_cols:
+                            cells.append(engine.valueCell(colname, row_dict.get(colname, None), fill = data_color, color = fontColor))
+                        yield cells
+
+                engine.writeRows(tableRows(), total = len(data) + 3)
+                engine.save()
             except Exception as e:
                 gui_queue.put(lambda error=e, trace = traceback.format_exc(): QMessageBox.critical(self, "Save error", trace))
             else:
@@ -1155,6 +1107,11 @@ class returnsApp(QWidget):
             return
         for table in ("calculations","positions","transactions"):
             save_to_db(self.db,table,None,action="clear") #reset all tables so everything will be fresh data
+        self.db.clearAggregateCubes()
+        executor.submit(self.db.buildSnapshotTotals) #empties the totals along with the cleared calculations
+        self.db.clearDashData()
+        clearTableSnapshots()
+        self.prefetcher.stop()
         self.nodeChangeDates = {"active" : False}
         executor.submit(self.pullData)
     def beginImport(self, *_):
@@ -1182,344 +1139,362 @@ class returnsApp(QWidget):
         self.linkBenchmarksWindow = linkBenchmarksWindow(parentSource=self)
         self.linkBenchmarksWindow.show()
     def updateTableLoading(self, val : int, text = None):
-        gui_queue.put(lambda: self.buildTableLoadingBar.setValue(val))
+        gui_queue.put(lambda: self.buildTableLoadingBar.setValue(val), key = 'tableLoadingBar')
         if text:
-            gui_queue.put(lambda: self.tableLoadingLabel.setText(f"Building returns table...       ({text})"))
+            gui_queue.put(lambda: self.tableLoadingLabel.setText(f"Building returns table...       ({text})"), key = 'tableLoadingLabel')
         else:
-            gui_queue.put(lambda: self.tableLoadingLabel.setText("Building returns table..."))
-    def buildReturnTable(self, *_):
+            gui_queue.put(lambda: self.tableLoadingLabel.setText("Building returns table..."), key = 'tableLoadingLabel')
+    def buildReturnTable(self, *_, reuseData = False):
         self.buildTableLoadingBox.setVisible(True)
         self.updateTableLoading(7)
         if not self.cFundsCalculated:
             self.processFunds()
-        
-        if self.buildTableCancel:
-            self.buildTableCancel.set()
-        if self.buildTableFuture and not self.buildTableFuture.done():
-            self.buildTableFuture.cancel()
-
-        cancelEvent = threading.Event()
-        self.buildTableCancel = cancelEvent
         self.stack.setCurrentIndex(1)
-        future = executor.submit(self.buildTable, cancelEvent)
-        self.buildTableFuture = future
-    def buildTable(self, cancelEvent, populateTable = True):
+        self.tableBuilds.request(reuseData = reuseData) #debounced. Only the latest request in a burst is built
+    def presentationChange(self, *_):
+        #output type, table mode and hidden months don't change what is loaded and aggregated
+        self.buildReturnTable(reuseData = True)
+    def aggregationKey(self, view, condStatement, parameters):
+        #everything the loaded and aggregated data depends on. Anything else only changes how it is presented
+        return (condStatement, tuple(parameters), view['start'], view['end'], tuple(view['sortHierarchy']), tuple(view['filters']["Target name"]),
+                view['benchmarkLinks'], view['consolidate'], view['hideNonInvestables'], view['sortStyle'])
+    def tableView(self):
+        #every control the built and displayed table depends on, as plain values so a view can also be described without the widgets
+        return {'filters' : {key : box.checkedItems() for key, box in self.filterDict.items()}, 'sortHierarchy' : self.sortHierarchy.checkedItems(),
+                'benchmarks' : self.benchmarkSelection.checkedItems(), 'benchmarkLinks' : self.showBenchmarkLinksBtn.isChecked(),
+                'start' : self.dataStartSelect.currentText(), 'end' : self.dataEndSelect.currentText(), 'mode' : self.tableBtnGroup.checkedButton().text(),
+                'outputType' : self.returnOutputType.currentText(), 'exitedFunds' : self.exitedFundsInput.getStatus(),
+                'consolidate' : self.consolidateFundsBtn.isChecked(), 'hideNonInvestables' : self.hideNonInvestablesBtn.isChecked(),
+                'sortStyle' : self.sortStyle.text(), 'visible' : {key : btn.isChecked() for key, btn in self.filterRadioBtnDict.items()}}
+    def resetView(self, view : dict = None):
+        #the view (current controls by default) with the filters instantiateFilters leaves: none besides the default classification
+        view = copy.deepcopy(view or self.tableView())
+        view['options'] = {key : box.items() for key, box in self.filterDict.items()} #for setViewFilter off the GUI thread
+        view['filters'] = {key : [] for key in view['filters']}
+        setViewFilter(view, 'Classification', ["HFC"])
+        return view
+    def tableConfigKey(self, view = None):
+        #a snapshot is only shown for the same selections
+        return json.dumps(view or self.tableView(), sort_keys=True, default=str)
+    def showTableSnapshot(self):
+        """
+        Shows the table saved by the last build with the current controls.
+        Returns True if it was built from the current data and lays out the same, so the launch build can be skipped.
+        """
+        try:
+            snapshot = loadTableSnapshot(self.tableConfigKey())
+            if snapshot is None:
+                return False
+            self.stack.setCurrentIndex(1)
+            self.currentTableData = snapshot['rows']
+            self.currentTableFlags = snapshot['flags']
+            self.populateReturnsTable(self.currentTableData, self.currentTableFlags)
+            current = (snapshot['generation'] == self.db.dataGeneration() and self.filteredHeaders == snapshot['headers']
+                        and self.tableColorDepths == snapshot['colorDepths'])
+            print(f"Showing the returns table saved {snapshot['savedAt']}{'' if current else '. It is stale and will be rebuilt'}")
+            return current
+        except Exception as e:
+            print(f"Could not show the returns table snapshot: {e} {e.args}")
+            return False
+    def viewQuery(self, view : dict):
+        #(condStatement, parameters) for the calculations a view loads
+        startDate = datetime.strptime(view['start'], "%B %Y")
+        endDate = datetime.strptime(view['end'], "%B %Y")
+        invSort = any(invStr in view['sortHierarchy'] for invStr in ('Source name', 'Family Branch'))
+        return filt2Query(self.db, view['filters'], startDate, endDate, invSort = invSort, hideNonInvestables = view['hideNonInvestables'])
+    def viewTable(self, view : dict, cancelEvent):
+        """
+        Builds the (rows, flags) a table view would show, as buildTable leaves them in currentTableData and currentTableFlags.
+        Reads only the view and the database, so it can run off the GUI thread, and leaves the returns table alone.
+        A set cancelEvent raises tableBuildCancelled.
+        """
+        if not self.cFundsCalculated:
+            self.processFunds()
+        condStatement, parameters = self.viewQuery(view)
+        data = load_from_db(self.db,"calculations",condStatement, tuple(parameters))
+        for entry in data:
+            entry['ownershipAdjust'] = entry['ownershipAdjust'] == 'True'
+        if cancelEvent.is_set():
+            raise tableBuildCancelled()
+        structure, data = self.calculateUpperLevels({"Total##()##" : {}}, data, hierarchy = view['sortHierarchy'], navSort = "NAV" in view['sortStyle'],
+                                                   benchLinks = view['benchmarkLinks'], consolidate = view['consolidate'], cancelEvent = cancelEvent,
+                                                   targets = view['filters']["Target name"], endMonth = view['end'])
+        built = self.viewRows(view, structure, data, cancelEvent)
+        if built is None:
+            raise tableBuildCancelled()
+        return built
+    def buildTable(self, cancelEvent, populateTable = True, reuseAggregation = False):
         try:
             print("Building return table...")
             tranEffects = self.db.pullTranEffects()
             self.currentTableData = None #resets so a failed build won't be used
-            complexMode = self.tableBtnGroup.checkedButton().text() == "Complex Table"
+            view = self.tableView()
+            complexMode = view['mode'] == "Complex Table"
             gui_queue.put(lambda: self.dataTypeBox.setVisible(not complexMode))
-            startDate = datetime.strptime(self.dataStartSelect.currentText(), "%B %Y")
-            endDate = datetime.strptime(self.dataEndSelect.currentText(), "%B %Y")
-            sortHier = self.sortHierarchy.checkedItems()
-            invSort = any(invStr in sortHier for invStr in ('Source name', 'Family Branch'))
-            hideNonInvestables = self.hideNonInvestablesBtn.isChecked()
-            condStatement, parameters = filt2Query(self.db, self.filterDict,startDate,endDate, invSort = invSort, hideNonInvestables =  hideNonInvestables)
+            startDate = datetime.strptime(view['start'], "%B %Y")
+            endDate = datetime.strptime(view['end'], "%B %Y")
+            condStatement, parameters = self.viewQuery(view)
+            generation = self.db.dataGeneration() #stamped before loading, so a build that overlaps an import is saved as stale
+            snapshotKey = (self.tableConfigKey(view), generation) if populateTable else None
             self.updateTableLoading(20,  text = 'Loading from Database')
             if cancelEvent.is_set(): #exit if new table build request is made
                 return
-            data = load_from_db(self.db,"calculations",condStatement, tuple(parameters))
-            for idx in range(len(data)):
-                data[idx]['ownershipAdjust'] = data[idx]['ownershipAdjust'] == 'True'
-            output = {"Total##()##" : {}}
-            flagOutput = {"Total##()##" : {}}
-            if self.benchmarkSelection.checkedItems() != [] or self.showBenchmarkLinksBtn.isChecked():
-                output = self.applyBenchmarks(output)
-            self.updateTableLoading(45,  text = 'Sorting and aggregating')
-            if cancelEvent.is_set(): #exit if new table build request is made
-                return
-            output , data = self.calculateUpperLevels(output,data)
-            for benchmark in self.pendingBenchmarks: #remove the benchmarks used only in benchmark links
-                if benchmark not in self.benchmarkChoices and benchmark + self.buildCode([]) in output.keys():
-                    output.pop(benchmark + self.buildCode([]))
-            self.updateTableLoading(80,  text = 'Inserting data into table')
-            if cancelEvent.is_set(): #exit if new table build request is made
-                return
-            complexOutput = copy.deepcopy(output)
-            multiData = {}
-            # Cache frequently used values and avoid repeated lookups/parsing in the loop
-            headerOptions_local = headerOptions
-            complexMode_local = complexMode
-            end_month_str = self.dataEndSelect.currentText()
-            cFunds_checked = self.consolidateFundsBtn.isChecked()
-            consolidatedFunds_local = self.consolidatedFunds
-            investor_checked = self.filterDict["Source name"].checkedItems() != []
-            fam_checked = self.filterDict["Family Branch"].checkedItems() != []
-            investorMode = investor_checked or fam_checked
-            if not investorMode:
-                headerOptions_local = [h for h in headerOptions_local if h != 'Redemptions'] #full portfolio mode : distributions
+            aggKey = self.aggregationKey(view, condStatement, parameters)
+            cached = self.aggregationCache
+            if not reuseAggregation or cached is None or cached[0] != aggKey:
+                prefetched = self.prefetcher.lookup(aggKey, generation) #aggregated in the background after the last import
+                cached = (aggKey, list(prefetched[0]), prefetched[1]) if prefetched is not None else None
+                if cached is not None and not cancelEvent.is_set():
+                    self.aggregationCache = cached
+            if cached is not None:
+                _, structure, data = cached #only presentation changed or the view was prefetched, so the load and aggregation are done
             else:
-                headerOptions_local = [h for h in headerOptions_local if h != 'Distributions'] #investor mode: redemptions
-            # Map "%" to NAV only for non-complex mode
-            dataOutputType = self.returnOutputType.currentText() if not complexMode_local else "Return"
-            if not complexMode_local and dataOutputType == "%":
-                dataOutputType = "NAV"
-            # Cache month string conversions by timestamp
-            month_cache = {}
-            get_month = month_cache.get
-            set_month = month_cache.__setitem__
-            # Local refs for speed
-            out_ref = output
-            c_out_ref = complexOutput
-            flag_ref = flagOutput
-            dtS = self.dataTimeStart
-            hideMonths , hideMonthsNum = self.exitedFundsInput.getStatus()
-            exitedCheck = {key : dtS for key in out_ref} #dict of all rowkeys and their earliest date with a NAV != 0
-            fund2LastDate = self.db.fetchFund2Date(dateType = 'last')
-            fund2Inception = self.db.fetchFund2Date(dateType = 'inception')
-            for entry in data:
-                e_get = entry.get
-                # month string from dateTime (with small cache)
-                dt_str = e_get("dateTime","")
-                if dt_str is None:
-                    print(f"Warning: data with no date in table build: {entry}")
-                    continue #can't use data with no date. Shouldn't have gotten this far anyways
-                month_str = get_month(dt_str)
-                if month_str is None:
-                    month_str = datetime.strftime(datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S"), "%B %Y")
-                    set_month(dt_str, month_str)
-                Dtype = entry["Calculation Type"]
-                targ = e_get('Target name')
-                if complexMode_local and Dtype == 'Total Target name': 
-                    if targ in fund2LastDate:
-                        entry['Last Actual Date'] = fund2LastDate[targ]
-                    if targ in fund2Inception:
-                        entry['Inception'] = fund2Inception[targ]
-                level = entry["rowKey"]
-                if hideMonths and e_get('NAV',0) != 0: #set the date to the most recent with a NAV
-                    exitedCheck[level] = max(exitedCheck.get(level,dtS), datetime.strptime(dt_str,'%Y-%m-%d %H:%M:%S'))
-                if dataOutputType == "IRR ITD" and ((cFunds_checked and e_get("Target name") in consolidatedFunds_local) or e_get("Calculation Type") != "Total Target name"):
-                    # skip IRR for consolidated funds or non-total
-                    continue
-                # ensure output[level]
-                lvl_out = out_ref.get(level)
-                if lvl_out is None:
-                    lvl_out = {}
-                    out_ref[level] = lvl_out
-                val = e_get(dataOutputType)
-                if val not in (None, "None", "") and not (dataOutputType == 'Return' and e_get('MDdenominator') == 0):
-                    #only add if there is a value and if it is not adding a return for empty level
-                    # flags
-                    level_flags = flag_ref.setdefault(level, {})
-                    level_flags.setdefault(month_str, False)
-                    level_flags[month_str] = (e_get("ownershipAdjust", False)) or level_flags[month_str]
-                    # aggregate
-                    if month_str not in lvl_out:
-                        lvl_out[month_str] = float(val)  if dataOutputType not in textCols else val
-                    elif dataOutputType not in ("Return", "Ownership"):
-                        lvl_out[month_str] += float(val)
-                    else:
-                        # same row needs special handling later
-                        multiData.setdefault(level, {})
-                if "dataType" not in lvl_out:
-                    lvl_out["dataType"] = Dtype
-                # complex table accumulation only at end month
-                if complexMode_local and month_str == end_month_str:
-                    lvl_c_out = c_out_ref.get(level)
-                    if lvl_c_out is None:
-                        lvl_c_out = {}
-                        c_out_ref[level] = lvl_c_out
-                    if "dataType" not in lvl_c_out:
-                        lvl_c_out["dataType"] = Dtype
-                    level_flags = flag_ref.setdefault(level, {})
-                    nav_flag = level_flags.setdefault("NAV", False)
-                    level_flags["NAV"] = (e_get("ownershipAdjust", False)) or nav_flag
-                    consolidated = (cFunds_checked and e_get("Target name") in consolidatedFunds_local)
-                    if headerOptions_local and headerOptions_local[0] not in lvl_c_out:
-                        for option in headerOptions_local:
-                            if (option in ('IRR ITD',*textCols) and (consolidated or e_get("Calculation Type") != "Total Target name")):
-                                continue #skip IRR for consolidated or aggregate levels  OR ownership for consolidated funds #TODO: build lowestAggregates to handle consolidated ownership
-                            ov = e_get(option)
-                            lvl_c_out[option] = float(ov if ov not in (None, "None", "") else 0) if option not in textCols else ov
-                    else:
-                        print(f'WARNING: multiple per rowkey. entry: {entry}')
-                        for option in headerOptions_local:
-                            if option not in ("Ownership", "IRR ITD"):
-                                ov = e_get(option)
-                                lvl_c_out[option] += float(ov if ov not in (None, "None", "") else 0)
-                    if e_get("Ownership") not in (None, "None") and (investor_checked or fam_checked):
-                        own = float(entry["Ownership"]) if entry.get("Ownership") not in (None, "None") else 0.0
-                        if "Ownership" not in lvl_c_out:
-                            lvl_c_out["Ownership"] = own
-                        else:
-                            lvl_c_out["Ownership"] += own
-                        # else:
-                        #     complexOutput[level]["Ownership"] += float(entry["Ownership"])
-            for tableStruc in (output,complexOutput): 
-                #remove bad table entries with no dataType (means data was somehow irrelevant. (ex: fund starts after the selected range))
-                keys = tableStruc.keys()
-                pops = [key for key in keys if "dataType" not in tableStruc[key]]
-                for pop in pops:
-                    tableStruc.pop(pop)
-            if multiData and dataOutputType == "Return": #must iterate through data again to correct for returns of multi pool funds
-                for entry in (entry for entry in data if entry.get("rowKey") in multiData):
-                    #only occurs for the multifunds
-                    #sums all gains and MDden for a row for a month
-                    dateTime = entry.get("dateTime")
-                    if dateTime not in multiData[entry.get("rowKey")]:
-                        multiData[entry.get("rowKey")][entry.get("dateTime")] = {"MDdenominator" : float(entry.get("MDdenominator")), "Monthly Gain" : float(entry.get("Monthly Gain"))}
-                    else:
-                        multiData[entry.get("rowKey")][entry.get("dateTime")]["MDdenominator"] += float(entry.get("MDdenominator"))
-                        multiData[entry.get("rowKey")][entry.get("dateTime")]["Monthly Gain"] += float(entry.get("Monthly Gain"))
-                for rowKey in multiData: #set proper return values
-                    for date in multiData.get(rowKey):
-                        strDate = datetime.strftime(datetime.strptime(date, "%Y-%m-%d %H:%M:%S"), "%B %Y")
-                        MDden = multiData.get(rowKey).get(date).get("MDdenominator")
-                        returnVal = multiData.get(rowKey).get(date).get("Monthly Gain") / MDden * 100 if MDden != 0 else 0
-                        output[rowKey][strDate] = returnVal
-                        if complexMode and strDate == self.dataEndSelect.currentText():
-                            complexOutput[rowKey]["Return"] = returnVal
-            if hideMonths:
-                monthThresh = datetime.strptime(self.dataEndSelect.currentText(), '%B %Y') - relativedelta(months=hideMonthsNum)
-                deleteKeys = {key for key in set(output.keys()) | set(complexOutput.keys()) if exitedCheck.get(key,dtS) <= monthThresh and output[key]['dataType'] != 'benchmark'}
-                for table in (output,complexOutput): #delete the keys from both tables of funds that are empty
-                    for dKey in (key for key in deleteKeys if key in table):
-                        table.pop(dKey)
-            if complexMode:
-                for rowKey in (key for key in complexOutput if complexOutput[key].get("NAV",0.0) != 0):
-                    complexOutput[rowKey]["%"] = complexOutput[rowKey].get("NAV",0.0) / complexOutput["Total##()##"].get("NAV",0.0) * 100 if complexOutput["Total##()##"]["NAV"] != 0 else 0
-            elif self.returnOutputType.currentText() == "%":
-                for rowKey in reversed(output): #iterate through backwards so total is affected last
-                    for date in [header for header in output[rowKey].keys() if header != "dataType"]:
-                        output[rowKey][date] = float(output[rowKey][date]) / float(output["Total##()##"][date]) * 100 if  float(output["Total##()##"][date]) != 0 else 0                
-            self.updateTableLoading(85,  text = 'Calculating time based data')
-            if cancelEvent.is_set(): #exit if new table build request is made
-                return
-            if  complexMode:
-                output = self.calculateComplexTable(output,complexOutput)
-            if investorMode:
-                self.updateTableLoading(87, text = 'Clearing non-investor data')
-                sortHier = self.sortHierarchy.checkedItems()
-                badAboves = ('assetClass','subAssetClass','sleeve')
-                viableDataTypes = ('Total Node','Total')
-                nodeIn = 'Node' in sortHier
-                if nodeIn and any(bad_above in sortHier and sortHier.index(bad_above) < sortHier.index('Node') for bad_above in badAboves):
-                    viableDataTypes = ('Total') #don't keep node values if they may be split (no longer makes sense)
-                for rowKey in output:
-                    if output[rowKey]['dataType'] not in viableDataTypes:
-                        for h in (he for he in output[rowKey] if he in invNodeOnlyHeaders):
-                            output[rowKey][h] = None
-            self.updateTableLoading(90, text = 'Populating table')
-            if cancelEvent.is_set(): #exit if new table build request is made
+                cubeResult = self.cubeAggregation(startDate, endDate) #None if the selections need live aggregation
+                if cubeResult is None:
+                    data = load_from_db(self.db,"calculations",condStatement, tuple(parameters))
+                    for idx in range(len(data)):
+                        data[idx]['ownershipAdjust'] = data[idx]['ownershipAdjust'] == 'True'
+                    self.updateTableLoading(45,  text = 'Sorting and aggregating')
+                    if cancelEvent.is_set(): #exit if new table build request is made
+                        return
+                    structure, data = self.calculateUpperLevels({"Total##()##" : {}}, data, cancelEvent = cancelEvent)
+                else:
+                    structure, data = cubeResult
+                if cancelEvent.is_set(): #a stale build must not replace the cache a newer request may rely on
+                    return
+                self.aggregationCache = (aggKey, list(structure), data)
+            built = self.viewRows(view, structure, data, cancelEvent, progress = self.updateTableLoading)
+            if built is None or cancelEvent.is_set(): #a newer build owns the table now
                 return
-            for key in (key for key in output.keys() if len(output[key].keys()) == 0):
-                output.pop(key) #remove empty entries
+            output, flagOutput = built
             if populateTable:
-                gui_queue.put(lambda: self.populateReturnsTable(output,flagStruc=flagOutput))
+                gui_queue.put(lambda: self.populateReturnsTable(output,flagStruc=flagOutput, snapshotKey=snapshotKey) if not cancelEvent.is_set() else None)
             self.currentTableData = output
             self.currentTableFlags = flagOutput
+        except tableBuildCancelled:
+            return
         except Exception as e:
             tracebackMsg = traceback.format_exc()
             gui_queue.put(lambda error = e: QMessageBox.warning(self, "Error building returns table", f"Error: {error}. {error.args}. Data entry: \n  \n Traceback:  \n {tracebackMsg}"))
             gui_queue.put(lambda: self.buildTableLoadingBox.setVisible(False))
-    def calculateComplexTable(self,monthOutput,complexOutput):
-        # Precompute end-of-period and month sequences
-        endTime = datetime.strptime(self.dataEndSelect.currentText(), "%B %Y")
-        end_month_str = datetime.strftime(endTime, "%B %Y")
-        MTDtime = [end_month_str]
-        # avoid repeated int() calls
-        end_month = endTime.month
-        q_len = (end_month % 3) if (end_month % 3) != 0 else 3
-        y_len = (end_month % 12) if (end_month % 12) != 0 else 12
-        QTDtimes = [datetime.strftime(endTime - relativedelta(months=i), "%B %Y") for i in range(q_len)]
-        YTDtimes = [datetime.strftime(endTime - relativedelta(months=i), "%B %Y") for i in range(y_len)]
-        timeSections = {"MTD": MTDtime, "QTD": QTDtimes, "YTD": YTDtimes}
-        # Year windows
-        YR_times = {yr: [datetime.strftime(endTime - relativedelta(months=i), "%B %Y") for i in range(12 * yr)] for yr in yearOptions}
-
+    def viewRows(self, view : dict, structure, data : list[dict], cancelEvent, progress = None):
+        """
+        Lays the aggregated calculations out as the table rows for a view. Returns (rows, flags), or None once cancelEvent is set.
+        progress(value, text = ...) reports to the returns page loading bar for interactive builds.
+        """
+        progress = progress or (lambda *_, **__: None)
+        complexMode = view['mode'] == "Complex Table"
+        output = {"Total##()##" : {}}
+        flagOutput = {"Total##()##" : {}}
+        linkOnlyBenchmarks = set()
+        if view['benchmarks'] != [] or view['benchmarkLinks']:
+            output, linkOnlyBenchmarks = self.applyBenchmarks(output, view)
+        for rowKey in structure: #benchmark rows stay ahead of the aggregated rows, as when they were passed into the aggregation
+            output.setdefault(rowKey, {})
+        for benchmark in linkOnlyBenchmarks: #remove the benchmarks used only in benchmark links
+            if benchmark + self.buildCode([]) in output.keys():
+                output.pop(benchmark + self.buildCode([]))
+        progress(80,  text = 'Inserting data into table')
+        if cancelEvent.is_set(): #exit if new table build request is made
+            return
+        complexOutput = copy.deepcopy(output)
+        multiData = {}
+        # Cache frequently used values and avoid repeated lookups/parsing in the loop
+        headerOptions_local = headerOptions
+        complexMode_local = complexMode
+        end_month_str = view['end']
+        cFunds_checked = view['consolidate']
+        consolidatedFunds_local = self.consolidatedFunds
+        investor_checked = view['filters']["Source name"] != []
+        fam_checked = view['filters']["Family Branch"] != []
+        investorMode = investor_checked or fam_checked
+        if not investorMode:
+            headerOptions_local = [h for h in headerOptions_local if h != 'Redemptions'] #full portfolio mode : distributions
+        else:
+            headerOptions_local = [h for h in headerOptions_local if h != 'Distributions'] #investor mode: redemptions
+        # Map "%" to NAV only for non-complex mode
+        dataOutputType = view['outputType'] if not complexMode_local else "Return"
+        if not complexMode_local and dataOutputType == "%":
+            dataOutputType = "NAV"
+        # Cache month string conversions by timestamp
+        month_cache = {}
+        get_month = month_cache.get
+        set_month = month_cache.__setitem__
         # Local refs for speed
-        mo = monthOutput
-        co = complexOutput
-
-        # Cache for parsing month strings
-        month_dt_cache = {}
-        def parse_month_str(s):
-            dt = month_dt_cache.get(s)
-            if dt is None:
-                dt = datetime.strptime(s, "%B %Y")
-                month_dt_cache[s] = dt
-            return dt
-
-        for level, lvl_month in mo.items():
-            lvl_co = co.get(level)
-            if not lvl_co or lvl_co.get('dataType') == "benchmark":
-                # Skip filtered rows and benchmarks (imported separately)
+        out_ref = output
+        c_out_ref = complexOutput
+        flag_ref = flagOutput
+        dtS = self.dataTimeStart
+        hideMonths , hideMonthsNum = view['exitedFunds']
+        exitedCheck = {key : dtS for key in out_ref} #dict of all rowkeys and their earliest date with a NAV != 0
+        fund2LastDate = self.db.fetchFund2Date(dateType = 'last')
+        fund2Inception = self.db.fetchFund2Date(dateType = 'inception')
+        for idx, entry in enumerate(data):
+            if not idx % 5000 and cancelEvent.is_set(): #exit if new table build request is made
+                return
+            e_get = entry.get
+            # month string from dateTime (with small cache)
+            dt_str = e_get("dateTime","")
+            if dt_str is None:
+                print(f"Warning: data with no date in table build: {entry}")
+                continue #can't use data with no date. Shouldn't have gotten this far anyways
+            month_str = get_month(dt_str)
+            if month_str is None:
+                month_str = datetime.strftime(calcDateTime(dt_str), "%B %Y")
+                set_month(dt_str, month_str)
+            Dtype = entry["Calculation Type"]
+            targ = e_get('Target name')
+            if complexMode_local and Dtype == 'Total Target name': 
+                if targ in fund2LastDate:
+                    entry['Last Actual Date'] = fund2LastDate[targ]
+                if targ in fund2Inception:
+                    entry['Inception'] = fund2Inception[targ]
+            level = entry["rowKey"]
+            if hideMonths and e_get('NAV',0) != 0: #set the date to the most recent with a NAV
+                exitedCheck[level] = max(exitedCheck.get(level,dtS), calcDateTime(dt_str))
+            if dataOutputType == "IRR ITD" and ((cFunds_checked and e_get("Target name") in consolidatedFunds_local) or e_get("Calculation Type") != "Total Target name"):
+                # skip IRR for consolidated funds or non-total
                 continue
-            #TVPI and DPI
-            lvl_co = calc_DPI_TVPI(lvl_co)
-
-            # Aggregate MTD/QTD/YTD compounded performance
-            for timeFrame, monthOpts in timeSections.items():
-                cPerf = 1.0
-                # multiply only months present
-                for monthO in monthOpts:
-                    val = lvl_month.get(monthO)
-                    if val is not None:
-                        cPerf *= (1.0 + float(val) / 100.0)
-                    if cPerf < 0:
-                        cPerf = -1.999
-                        break
-                lvl_co[timeFrame] = (cPerf - 1.0) * 100.0 if cPerf > 0 else 'N/A'
-
-            # Yearly windows compounded and annualized
-            lvl_month_keys = lvl_month.keys()
-            nav_zero = (lvl_co.get("NAV", 1) == 0)
-            for yearKey, months in YR_times.items():
-                # Ensure all months are present
-                if not all(m in lvl_month_keys for m in months):
-                    continue
-                # Skip if NAV==0 and any month return is 0
-                if nav_zero and any(float(lvl_month[m]) == 0 for m in months):
-                    continue
-                cYR = 1.0
-                for m in months:
-                    cYR *= (1.0 + float(lvl_month[m]) / 100.0)
-                    if cYR < 0:
-                        cYR = -1.999
-                        break
-                lvl_co[f"{yearKey}YR"] = (((cYR ** (1 / int(yearKey))) - 1) * 100.0) if cYR > 0 else 'N/A'
-
-            # ITD
-            try:
-                if lvl_month.get("dataType", "") != "benchmark":
-                    if end_month_str in lvl_month:
-                        # months up to endTime
-                        # build list of (dt, str) once, ignoring 'dataType'
-                        month_pairs = []
-                        for m in lvl_month_keys:
-                            if m == "dataType":
-                                continue
-                            dt = parse_month_str(m)
-                            if dt <= endTime:
-                                month_pairs.append((dt, m))
-                        if len(month_pairs) >= 2:
-                            month_pairs.sort(key=lambda x: x[0])
-                            cITD = 1.0
-                            monthCount = 0
-                            for _, m in month_pairs:
-                                monthCount += 1
-                                cITD *= (1.0 + float(lvl_month[m]) / 100.0)
-                                if cITD < 0:
-                                    cITD = -1.999
-                                    monthCount = 14
-                                    break
-                            lvl_co["ITD"] = annualizeITD(cITD, monthCount)
-                        else:
-                            # ITD is just the previous month if no more months are found
-                            lvl_co["ITD"] = lvl_month[MTDtime]
+            # ensure output[level]
+            lvl_out = out_ref.get(level)
+            if lvl_out is None:
+                lvl_out = {}
+                out_ref[level] = lvl_out
+            val = e_get(dataOutputType)
+            if val not in (None, "None", "") and not (dataOutputType == 'Return' and e_get('MDdenominator') == 0):
+                #only add if there is a value and if it is not adding a return for empty level
+                # flags
+                level_flags = flag_ref.setdefault(level, {})
+                level_flags.setdefault(month_str, False)
+                level_flags[month_str] = (e_get("ownershipAdjust", False)) or level_flags[month_str]
+                # aggregate
+                if month_str not in lvl_out:
+                    lvl_out[month_str] = float(val)  if dataOutputType not in textCols else val
+                elif dataOutputType not in ("Return", "Ownership"):
+                    lvl_out[month_str] += float(val)
                 else:
-                    lvl_co["ITD"] = lvl_month["ITD"]
-            except Exception:
-                pass
-
-        return co
-    def applyBenchmarks(self, output):
-        if self.showBenchmarkLinksBtn.isChecked(): #activate the benchmark links so they are all used if relevant
+                    # same row needs special handling later
+                    multiData.setdefault(level, {})
+            if "dataType" not in lvl_out:
+                lvl_out["dataType"] = Dtype
+            # complex table accumulation only at end month
+            if complexMode_local and month_str == end_month_str:
+                lvl_c_out = c_out_ref.get(level)
+                if lvl_c_out is None:
+                    lvl_c_out = {}
+                    c_out_ref[level] = lvl_c_out
+                if "dataType" not in lvl_c_out:
+                    lvl_c_out["dataType"] = Dtype
+                level_flags = flag_ref.setdefault(level, {})
+                nav_flag = level_flags.setdefault("NAV", False)
+                level_flags["NAV"] = (e_get("ownershipAdjust", False)) or nav_flag
+                consolidated = (cFunds_checked and e_get("Target name") in consolidatedFunds_local)
+                if headerOptions_local and headerOptions_local[0] not in lvl_c_out:
+                    for option in headerOptions_local:
+                        if (option in ('IRR ITD',*textCols) and (consolidated or e_get("Calculation Type") != "Total Target name")):
+                            continue #skip IRR for consolidated or aggregate levels  OR ownership for consolidated funds #TODO: build lowestAggregates to handle consolidated ownership
+                        ov = e_get(option)
+                        lvl_c_out[option] = float(ov if ov not in (None, "None", "") else 0) if option not in textCols else ov
+                else:
+                    print(f'WARNING: multiple per rowkey. entry: {entry}')
+                    for option in headerOptions_local:
+                        if option not in ("Ownership", "IRR ITD"):
+                            ov = e_get(option)
+                            lvl_c_out[option] += float(ov if ov not in (None, "None", "") else 0)
+                if e_get("Ownership") not in (None, "None") and (investor_checked or fam_checked):
+                    own = float(entry["Ownership"]) if entry.get("Ownership") not in (None, "None") else 0.0
+                    if "Ownership" not in lvl_c_out:
+                        lvl_c_out["Ownership"] = own
+                    else:
+                        lvl_c_out["Ownership"] += own
+                    # else:
+                    #     complexOutput[level]["Ownership"] += float(entry["Ownership"])
+        for tableStruc in (output,complexOutput): 
+            #remove bad table entries with no dataType (means data was somehow irrelevant. (ex: fund starts after the selected range))
+            keys = tableStruc.keys()
+            pops = [key for key in keys if "dataType" not in tableStruc[key]]
+            for pop in pops:
+                tableStruc.pop(pop)
+        if multiData and dataOutputType == "Return": #must iterate through data again to correct for returns of multi pool funds
+            for entry in (entry for entry in data if entry.get("rowKey") in multiData):
+                #only occurs for the multifunds
+                #sums all gains and MDden for a row for a month
+                dateTime = entry.get("dateTime")
+                if dateTime not in multiData[entry.get("rowKey")]:
+                    multiData[entry.get("rowKey")][entry.get("dateTime")] = {"MDdenominator" : float(entry.get("MDdenominator")), "Monthly Gain" : float(entry.get("Monthly Gain"))}
+                else:
+                    multiData[entry.get("rowKey")][entry.get("dateTime")]["MDdenominator"] += float(entry.get("MDdenominator"))
+                    multiData[entry.get("rowKey")][entry.get("dateTime")]["Monthly Gain"] += float(entry.get("Monthly Gain"))
+            for rowKey in multiData: #set proper return values
+                for date in multiData.get(rowKey):
+                    strDate = datetime.strftime(calcDateTime(date), "%B %Y")
+                    MDden = multiData.get(rowKey).get(date).get("MDdenominator")
+                    returnVal = multiData.get(rowKey).get(date).get("Monthly Gain") / MDden * 100 if MDden != 0 else 0
+                    output[rowKey][strDate] = returnVal
+                    if complexMode and strDate == end_month_str:
+                        complexOutput[rowKey]["Return"] = returnVal
+        if hideMonths:
+            monthThresh = datetime.strptime(end_month_str, '%B %Y') - relativedelta(months=hideMonthsNum)
+            deleteKeys = {key for key in set(output.keys()) | set(complexOutput.keys()) if exitedCheck.get(key,dtS) <= monthThresh and output[key]['dataType'] != 'benchmark'}
+            for table in (output,complexOutput): #delete the keys from both tables of funds that are empty
+                for dKey in (key for key in deleteKeys if key in table):
+                    table.pop(dKey)
+        if complexMode:
+            for rowKey in (key for key in complexOutput if complexOutput[key].get("NAV",0.0) != 0):
+                complexOutput[rowKey]["%"] = complexOutput[rowKey].get("NAV",0.0) / complexOutput["Total##()##"].get("NAV",0.0) * 100 if complexOutput["Total##()##"]["NAV"] != 0 else 0
+        elif view['outputType'] == "%":
+            for rowKey in reversed(output): #iterate through backwards so total is affected last
+                for date in [header for header in output[rowKey].keys() if header != "dataType"]:
+                    output[rowKey][date] = float(output[rowKey][date]) / float(output["Total##()##"][date]) * 100 if  float(output["Total##()##"][date]) != 0 else 0                
+        progress(85,  text = 'Calculating time based data')
+        if cancelEvent.is_set(): #exit if new table build request is made
+            return
+        if  complexMode:
+            output = self.calculateComplexTable(output,complexOutput, end_month_str)
+        if investorMode:
+            progress(87, text = 'Clearing non-investor data')
+            sortHier = view['sortHierarchy']
+            badAboves = ('assetClass','subAssetClass','sleeve')
+            viableDataTypes = ('Total Node','Total')
+            nodeIn = 'Node' in sortHier
+            if nodeIn and any(bad_above in sortHier and sortHier.index(bad_above) < sortHier.index('Node') for bad_above in badAboves):
+                viableDataTypes = ('Total') #don't keep node values if they may be split (no longer makes sense)
+            for rowKey in output:
+                if output[rowKey]['dataType'] not in viableDataTypes:
+                    for h in (he for he in output[rowKey] if he in invNodeOnlyHeaders):
+                        output[rowKey][h] = None
+        progress(90, text = 'Populating table')
+        if cancelEvent.is_set(): #exit if new table build request is made
+            return
+        for key in (key for key in output.keys() if len(output[key].keys()) == 0):
+            output.pop(key) #remove empty entries
+        return output, flagOutput
+    def calculateComplexTable(self,monthOutput,complexOutput, endMonth : str):
+        endTime = datetime.strptime(endMonth, "%B %Y")
+        end_month = endTime.month
+        q_len = (end_month % 3) if (end_month % 3) != 0 else 3
+        y_len = (end_month % 12) if (end_month % 12) != 0 else 12
+        timeSections = {"MTD": 1, "QTD": q_len, "YTD": y_len}
+        yearSections = {f"{yr}YR" : yr for yr in yearOptions}
+
+        # Skip filtered rows and benchmarks (imported separately)
+        rows = {level : lvl_month for level, lvl_month in monthOutput.items()
+                    if complexOutput.get(level) and complexOutput[level].get('dataType') != "benchmark"}
+        navZero = [complexOutput[level].get("NAV", 1) == 0 for level in rows]
+        #every trailing window for every row is compounded at once from prefix sums of the monthly series
+        windowResults = trailingWindowReturns(rows, endTime, timeSections, yearSections, navZero)
+        for level, windowVals in zip(rows, windowResults):
+            lvl_co = calc_DPI_TVPI(complexOutput[level]) #TVPI and DPI
+            lvl_co.update(windowVals)
+        return complexOutput
+    def applyBenchmarks(self, output, view : dict):
+        #adds the view's benchmark rows. Returns (output, benchmarks loaded only for the benchmark links)
+        pendingBenchmarks = set()
+        if view['benchmarkLinks']: #activate the benchmark links so they are all used if relevant
             benchmarkLinks = self.db.fetchBenchmarkLinks()
-            self.pendingBenchmarks = set(link.get("benchmark") for link in benchmarkLinks)
-        self.benchmarkChoices = self.benchmarkSelection.checkedItems()
-        allBenchmarkChoices = set(set(self.benchmarkChoices) | set(self.pendingBenchmarks))
+            pendingBenchmarks = set(link.get("benchmark") for link in benchmarkLinks)
+        benchmarkChoices = view['benchmarks']
+        allBenchmarkChoices = set(set(benchmarkChoices) | pendingBenchmarks)
         code = self.buildCode([])
         placeholders = ','.join('?' for _ in allBenchmarkChoices)
         if allBenchmarkChoices:
@@ -1528,17 +1503,17 @@ class returnsApp(QWidget):
             benchmarks = []
         for bench in benchmarks:
             name = bench["Index"] + code
-            if (datetime.strptime(bench["Asofdate"], "%Y-%m-%dT%H:%M:%S") < datetime.strptime(self.dataStartSelect.currentText(), "%B %Y") or
-                datetime.strptime(bench["Asofdate"], "%Y-%m-%dT%H:%M:%S") > datetime.strptime(self.dataEndSelect.currentText(), "%B %Y") + relativedelta(months=1) ) :
+            if (datetime.strptime(bench["Asofdate"], "%Y-%m-%dT%H:%M:%S") < datetime.strptime(view['start'], "%B %Y") or
+                datetime.strptime(bench["Asofdate"], "%Y-%m-%dT%H:%M:%S") > datetime.strptime(view['end'], "%B %Y") + relativedelta(months=1) ) :
                 continue #skip if outside selected range
             date = datetime.strftime(datetime.strptime(bench["Asofdate"], "%Y-%m-%dT%H:%M:%S"), "%B %Y")
             if output.get(name) is None:
                 output[name] =  {}
-            if self.tableBtnGroup.checkedButton().text() != "Complex Table" and self.returnOutputType.currentText() == "Return": #show monthly return benchmarks
+            if view['mode'] != "Complex Table" and view['outputType'] == "Return": #show monthly return benchmarks
                 output[name][date] = float(bench.get("MTDnet",0) if bench.get("MTDnet",0) !=  "None" else 0) * 100
                 if output[name].get("dataType") is None:
                     output[name]["dataType"] = "benchmark"
-            elif self.tableBtnGroup.checkedButton().text() == "Complex Table" and date == self.dataEndSelect.currentText():
+            elif view['mode'] == "Complex Table" and date == view['end']:
                 #populate the complex fields
                 if output[name].get("dataType") is None:
                     output[name]["dataType"] = "benchmark"
@@ -1550,27 +1525,29 @@ class returnsApp(QWidget):
                 for year in yearOptions:
                     if bench.get(f"Last{year}yrnet","None") not in ("None",None):
                         output[name][f"{year}YR"] = float(bench.get(f"Last{year}yrnet")) * 100
-        return output
+        return output, pendingBenchmarks - set(benchmarkChoices)
     def buildCode(self, path):
             code = f"##({"::".join(path)})##"
             return code
-    def calculateUpperLevels(self, tableStructure,data):
-        
+    def calculateUpperLevels(self, tableStructure,data, hierarchy = None, navSort = None, benchLinks = None, consolidate = None, cancelEvent = None,
+                             targets = None, endMonth = None):
+        #hierarchy/navSort/benchLinks/consolidate/targets/endMonth override the current selections (used by the aggregate cube and the view prefetcher)
+        #cancelEvent stops a superseded table build between options by raising tableBuildCancelled
         # Hot-path caches and precomputations for performance on large inputs
         headerOptions_local = headerOptions
         AC1order = self.db.fetchACorder(1)
         AC2order = self.db.fetchACorder(2)
         fund2traitGet = self.db.fetchFund2Trait().get
         id2Node = self.db.pullId2Node()
-        filteredTargets = self.filterDict["Target name"].checkedItems()
+        filteredTargets = self.filterDict["Target name"].checkedItems() if targets is None else targets
         dataOptions_local = dataOptions
-        sortHierarchy = self.sortHierarchy.checkedItems()
+        sortHierarchy = self.sortHierarchy.checkedItems() if hierarchy is None else hierarchy
         buildCode = self.buildCode
-        showBenchLinks = self.showBenchmarkLinksBtn.isChecked()
-        consolidateFunds = self.consolidateFundsBtn.isChecked()
+        showBenchLinks = self.showBenchmarkLinksBtn.isChecked() if benchLinks is None else benchLinks
+        consolidateFunds = self.consolidateFundsBtn.isChecked() if consolidate is None else consolidate
         consolidatedFunds_map = self.consolidatedFunds if consolidateFunds else {}
-        # Precompute end-of-period datetime once for NAV sorting comparisons
-        end_period_dt = datetime.strptime(self.dataEndSelect.currentText(), "%B %Y")
+        # Precompute end-of-period datetime once for NAV sorting comparisons. Not needed when NAV sorting is turned off
+        end_period_dt = datetime.strptime(self.dataEndSelect.currentText() if endMonth is None else endMonth, "%B %Y") if navSort is not False else None
         def applyLinkedBenchmarks(struc,code, levelName, option):
             for entry in benchmarkLinks:
                 if levelName == assetLevelLinks[entry.get("assetLevel")].get("Link") and option == entry.get("asset"):
@@ -1632,6 +1609,8 @@ class returnsApp(QWidget):
             
             if len(hier) > levelIdx: #more hierarchy levels to parse
                 for option in options:
+                    if cancelEvent is not None and cancelEvent.is_set():
+                        raise tableBuildCancelled()
                     if levelName == 'Node' and len(nodePathOptDict[option]) > 1: #Break apart to lower node levels and remove from processing in this loop
                         struc, upperEntriesExtend, allEntriesExtend = nodeRecursion(hier, levelName,levelIdx, struc,grouped_by_level[option],path, insertedOption,option)
                         upperEntries.extend(upperEntriesExtend)
@@ -1706,9 +1685,11 @@ class returnsApp(QWidget):
             else: #occurs at level of fund parent
                 if levelName == "subAssetSleeve" and sortHierarchy[levelIdx - 2] == "subAssetClass" and insertedOption in self.db.fetchOptions("asset3Visibility").keys():
                     options = ["hiddenLayer"]
-                NAVsort = "NAV" in self.sortStyle.text()
+                NAVsort = "NAV" in self.sortStyle.text() if navSort is None else navSort
                 
                 for option in options:
+                    if cancelEvent is not None and cancelEvent.is_set():
+                        raise tableBuildCancelled()
                     if levelName == 'Node' and len(nodePathOptDict[option]) > 1: #Break apart to lower node levels and remove from processing in this loop
                         struc, upperEntriesExtend, allEntriesExtend = nodeRecursion(hier, levelName,levelIdx, struc,grouped_by_level[option],path, insertedOption,option)
                         upperEntries.extend(upperEntriesExtend)
@@ -1739,7 +1720,6 @@ class returnsApp(QWidget):
                     excluded_levels = {"Source name", "Family Branch"}
                     has_node_in_hierarchy = "Node" in sortHierarchy
                     ownership_levels = {"Source name", "Family Branch", "Node"}
-                    parsed_dates_cache = {}
                     target_trait_cache = {}
                     investorsAccessed = defaultdict(set)  # Use defaultdict for efficiency
                     
@@ -1762,9 +1742,7 @@ class returnsApp(QWidget):
                         # Handle NAV sorting with cached datetime parsing
                         nameList[name_key] += 0 #assures the key is present
                         if NAVsort:
-                            if dt not in parsed_dates_cache:
-                                parsed_dates_cache[dt] = datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
-                            if parsed_dates_cache[dt] == end_period_dt:
+                            if calcDateTime(dt) == end_period_dt:
                                 nav_val = entry_get("NAV", 0.0)
                                 if nav_val not in excluded_values:
                                     nameList[name_key] += float(nav_val)
@@ -1948,7 +1926,7 @@ class returnsApp(QWidget):
             
             return struc, nodeUpperEntries, [*baseAllData, *recursAllData]
 
-        if self.showBenchmarkLinksBtn.isChecked():
+        if showBenchLinks:
             benchmarkLinks = self.db.fetchBenchmarkLinks()
             tableStructure = applyLinkedBenchmarks(tableStructure,buildCode(["Total",]), "Total", "Total") #apply benchmark links to total
         else:
@@ -1985,7 +1963,88 @@ class returnsApp(QWidget):
         current_time = time.time()
         
         return tableStructure,newEntries
-                    
+    def aggregateCubeKey(self, hierarchy : list[str], consolidate : bool, hideNonInvestables : bool):
+        return f"{'>'.join(hierarchy)}|consolidate:{int(consolidate)}|hideNonInvestables:{int(hideNonInvestables)}"
+    def aggregateCubeSignature(self, hierarchy : list[str]):
+        #everything outside of the calculations that changes how calculateUpperLevels groups or orders rows
+        if not self.cFundsCalculated:
+            self.processFunds()
+        sigParts = {'fund2trait' : self.db.fetchFund2Trait(), 'AC1' : self.db.fetchACorder(1), 'AC2' : self.db.fetchACorder(2),
+                    'asset3Visibility' : self.db.fetchOptions("asset3Visibility"), 'consolidatedFunds' : self.consolidatedFunds,
+                    'nonInvestables' : sorted(self.db.pullNonInvestableFunds())}
+        if nameHier["Family Branch"]["local"] in hierarchy:
+            self.db.fetchInvestors()
+            sigParts['investor2family'] = self.db.investor2family
+        return hashlib.sha1(json.dumps(sigParts, sort_keys=True, default=str).encode()).hexdigest()
+    def materializeAggregateCubes(self, consolidate : bool, hideNonInvestables : bool):
+        #Pre-aggregates the calculations for the common sort hierarchies so unfiltered table builds can skip calculateUpperLevels
+        #Runs in the executor, so the consolidate and non-investable options are read on the GUI thread by queueAggregateCubes
+        cubeSpan = span('aggregateCubes')
+        try:
+            startTime = time.time()
+            if not self.cFundsCalculated:
+                self.processFunds()
+            self.db.fetchInvestors()
+            nonInvFunds = list(self.db.pullNonInvestableFunds()) if hideNonInvestables else []
+            dataSets = {}
+            for hierarchy in aggregateCubeHierarchies:
+                invSort = any(invStr in hierarchy for invStr in ('Source name', 'Family Branch'))
+                if invSort not in dataSets: #investor level hierarchies need the individual investor rows, others use the full portfolio rows
+                    condStatement = f' WHERE [Source name] {"!=" if invSort else "="} {sqlPlaceholder}'
+                    parameters = [fullPortStr]
+                    if nonInvFunds:
+                        condStatement += f" AND [Target name] NOT IN ({','.join(sqlPlaceholder for _ in nonInvFunds)})"
+                        parameters.extend(nonInvFunds)
+                    data = load_from_db(self.db,"calculations",condStatement, tuple(parameters))
+                    for entry in data:
+                        entry['ownershipAdjust'] = entry['ownershipAdjust'] == 'True'
+                    dataSets[invSort] = data
+                structure, entries = self.calculateUpperLevels({"Total##()##" : {}}, dataSets[invSort], hierarchy = hierarchy,
+                                                                navSort = False, benchLinks = False, consolidate = consolidate, targets = [])
+                cubeKey = self.aggregateCubeKey(hierarchy, consolidate, hideNonInvestables)
+                self.db.saveAggregateCube(cubeKey, hierarchy, self.aggregateCubeSignature(hierarchy), list(structure.keys()), entries)
+            print(f"Aggregate cube built for {len(aggregateCubeHierarchies)} hierarchies in {round(time.time() - startTime,2)} seconds")
+        except Exception as e:
+            print(f"WARNING: Failed to build the aggregate cube. Tables will aggregate live. {e} {e.args}")
+            print(traceback.format_exc())
+        finally:
+            cubeSpan.end()
+    def queueAggregateCubes(self):
+        #builds the aggregate cube in the background for the current options, read on the GUI thread
+        gui_queue.put(lambda: executor.submit(self.materializeAggregateCubes, self.consolidateFundsBtn.isChecked(), self.hideNonInvestablesBtn.isChecked()))
+    def cubeAggregation(self, startDate : datetime, endDate : datetime):
+        """
+        Returns (row structure, aggregated entries) from the aggregate cube if the current hierarchy and filters are covered by it.
+        Returns None if the table needs live aggregation instead.
+        """
+        sortHier = self.sortHierarchy.checkedItems()
+        if sortHier not in aggregateCubeHierarchies or self.showBenchmarkLinksBtn.isChecked():
+            return None
+        if any(box.checkedItems() != [] for box in self.filterDict.values()):
+            return None
+        cubeKey = self.aggregateCubeKey(sortHier, self.consolidateFundsBtn.isChecked(), self.hideNonInvestablesBtn.isChecked())
+        endStr = endDate.strftime("%Y-%m-%d %H:%M:%S")
+        meta, entries = self.db.loadAggregateCube(cubeKey, startDate.strftime("%Y-%m-%d %H:%M:%S"), endStr)
+        if meta is None or meta['signature'] != self.aggregateCubeSignature(sortHier):
+            return None
+        presentKeys = {entry['rowKey'] for entry in entries}
+        structure = [rowKey for rowKey in meta['structure'] if rowKey in presentKeys] #only rows with data in the date range
+        if "NAV" in self.sortStyle.text(): #cube funds are stored alphabetically. Reorder each block of funds by NAV at the end date
+            fundKeys = {entry['rowKey'] for entry in entries if entry.get('Calculation Type') == 'Total Target name'}
+            endNAV = {entry['rowKey'] : float(entry.get('NAV') or 0.0) for entry in entries if entry['dateTime'] == endStr and entry['rowKey'] in fundKeys}
+            ordered = []
+            block = []
+            for rowKey in (*structure, None):
+                if rowKey in fundKeys:
+                    block.append(rowKey)
+                    continue
+                if block:
+                    ordered.extend(descendingNavSort({key : endNAV.get(key, 0.0) for key in block}))
+                    block = []
+                if rowKey is not None:
+                    ordered.append(rowKey)
+            structure = ordered
+        return structure, entries
     def filterUpdate(self):
         self.buildReturnTable()
         return
@@ -2340,6 +2399,8 @@ class returnsApp(QWidget):
         if not self.testAPIconnection():
             gui_queue.put(lambda: QMessageBox.warning(self,"API Failure", "API connection has failed. Server is down or API key is bad. \n Previous calculations are left in place for viewing."))
             return
+        startRun() #event counters and stage timings cover this import and its calculations
+        startRunMetrics()
         def checkNewestData(table, rows, nodes : list[str], sources, targets):
             #iterate through the freshly imported rows, check if they match with the previous data. 
             #inputs: table name, rows of newly imported data
@@ -2351,8 +2412,8 @@ class returnsApp(QWidget):
                     if not rowNodes and rec.get('Target name') in targets and rec.get('Source name') in sources:
                         rowNodes = ['noNodeData',]
                     elif not rowNodes:
-                        print(f"Warning: no nodes or direct investment found attached to a datapoint: {rec}")
-                    dt = datetime.strptime(rec['Date'], "%Y-%m-%dT%H:%M:%S")
+                        logEvent('unmatchedRow', "No nodes or direct investment found attached to a datapoint", subject = table, row = rec)
+                    dt = partsDateTime(isoDateParts(rec['Date']))
                     if earliest is None or dt < earliest: #sets overall values to earliest
                         earliest = dt.replace(day=1)
                     with earlyChangeDateLock:
@@ -2363,18 +2424,17 @@ class returnsApp(QWidget):
                 return {'old' : [], 'new' : rows}
             def buildKey(record): #TODO: check for transactions of the same value in the same source to target. Could ignore new ones
                 value = record[nameHier["Value"]["dynHigh"] if table == "positions" else nameHier["CashFlow"]["dynLow"]]
-                value = 0 if value is None or value == "None" else value
                 key = (
                         record['Source name'] if record['Source name'] is not None else "None",
                         record['Target name'] if record['Target name'] is not None else "None",
-                        round(float(value)) if table != "positions" else 0,               # normalize to float
-                        record['Date'].replace(' ', 'T')      # normalize format if needed
+                        round(value or 0) if table != "positions" else 0,
+                        record['Date']
                     )
                 return key
             try:
                 diffCount = 0
                 differences = []
-                previous = load_from_db(self.db,table) or []
+                previous = normalizeRows(table, load_from_db(self.db,table) or [])
 
                 # Build a set of tuple‐keys for the old data
                 oldRecords = set()
@@ -2388,21 +2448,18 @@ class returnsApp(QWidget):
                     if not rowNodes and rec.get('Target name') in targets and rec.get('Source name') in sources:
                         rowNodes = ['noNodeData',]
                     elif not rowNodes:
-                        print(f"Warning: no nodes or direct investment found attached to a datapoint: {rec}")
-                    value = rec[nameHier["Value"]["dynHigh"] if "positions" in table else nameHier["CashFlow"]["dynLow"]]
-                    value = 0 if value is None or value == "None" else value
+                        logEvent('unmatchedRow', "No nodes or direct investment found attached to a datapoint", subject = table, row = rec)
                     key = buildKey(rec)
                     newRecords.add(key)
                     if table == "positions": #updates new data to have required fields
-                        rec[nameHier["Unfunded"]["local"]] = 0
-                        rec[nameHier["Commitment"]["local"]] = 0
+                        rec[nameHier["Unfunded"]["local"]] = 0.0
+                        rec[nameHier["Commitment"]["local"]] = 0.0
                     if key in oldRecords:
                         continue
                     diffCount += 1
                     differences.append(rec)
                     differences.append({"Source name" : key[0],"Target name" : key[1],nameHier["Value"]["dynLow"] : key[2],"Date" : key[3]})
-                    # parse the date for comparison
-                    dt = datetime.strptime(rec['Date'], "%Y-%m-%dT%H:%M:%S")
+                    dt = partsDateTime(isoDateParts(rec['Date']))
                     if earliest is None or dt < earliest: #sets overall values to earliest
                         earliest = dt.replace(day=1)
                     with earlyChangeDateLock:
@@ -2412,7 +2469,7 @@ class returnsApp(QWidget):
                 for oldRec in oldRecords:
                     #find if a new record no longer exists in the old. Means old data is altered and must be redone from that timeframe
                     if oldRec not in newRecords: 
-                        dt = datetime.strptime(oldRec[3], "%Y-%m-%dT%H:%M:%S")
+                        dt = partsDateTime(isoDateParts(oldRec[3]))
                         if earliest is None or dt < earliest:
                             earliest = dt.replace(day=1)
 
@@ -2612,6 +2669,7 @@ class returnsApp(QWidget):
                                     "mode": "compact"
                                 }
             def bgPullData(tableName, payload, headers):
+                pullSpan = span('pullData', tableName)
                 try:
                     rows = []
                     idx = 0
@@ -2641,16 +2699,21 @@ class returnsApp(QWidget):
                                 print(f"Error: {response.json()}")
                             except:
                                 pass
+                    pullSpan.end(rows = len(rows))
                     if len(rows) == 0: #prevents bad calculations from missing data. Appears if partial re-calculation but new data is corrupted
                         raise RuntimeError("API import did not function properly. Try again.")
+                    with span('normalizeRows', tableName, rows = len(rows)):
+                        rows = normalizeRows(tableName, rows)
                     targets, sources, nodes = nodeLibrary.findNodes(None,rows)
-                    tables = checkNewestData(tableName,rows, nodes, sources, targets)
+                    with span('checkNewestData', tableName, rows = len(rows)):
+                        tables = checkNewestData(tableName,rows, nodes, sources, targets)
                     with completeLock:
                         self.complete += 1
                     frac = self.complete/totalCalls
-                    gui_queue.put(lambda val = frac: self.apiLoadingBar.setValue(int(val * 100)))
+                    gui_queue.put(lambda val = frac: self.apiLoadingBar.setValue(int(val * 100)), key = 'apiLoadingBar')
                     return tableName,tables
                 except:
+                    pullSpan.end()
                     with self.apiFailureLock:
                         self.apiFailure = True
                     print('WARNING: Dynamo api call failed.')
@@ -2713,6 +2776,7 @@ class returnsApp(QWidget):
                             "mode": "compact"
                         }
             def bgFundSecPull(sec: bool = False):
+                pullSpan = span('pullData', "funds" if not sec else "securities")
                 try:
                     if not sec:
                         response = requests.post(f"{mainURL}/Search", headers=apiHeader(apiData["fundCols"]), data=json.dumps(fundPayload))
@@ -2732,6 +2796,7 @@ class returnsApp(QWidget):
                             rows = []
                         keys_to_remove = {'_id', '_es'}
                         rows = [{k: v for k, v in row.items() if k not in keys_to_remove} for row in rows]
+                        pullSpan.end(rows = len(rows))
                         for idx, row in enumerate(rows): #find sleeve values and consolidated funds
                             assetCat = row["ExposureAssetClassCategory"]
                             if assetCat is not None and assetCat.count(" > ") == 3:
@@ -2768,10 +2833,11 @@ class returnsApp(QWidget):
                     with self.apiFailureLock:
                         self.apiFailure = True
                     print(f"Error in API call for {tableName}. Code: {response.status_code}. {response}. {traceback.format_exc()}")
+                pullSpan.end()
                 with completeLock:
                     self.complete += 1
                 frac = self.complete/totalCalls
-                gui_queue.put(lambda val = frac: self.apiLoadingBar.setValue(int(val * 100)))
+                gui_queue.put(lambda val = frac: self.apiLoadingBar.setValue(int(val * 100)), key = 'apiLoadingBar')
             submitAPIcall(self,bgFundSecPull)
             submitAPIcall(self,bgFundSecPull,True)
             totalCalls -= 1
@@ -2836,6 +2902,7 @@ class returnsApp(QWidget):
                                     "mode": "compact"
                                 }
             def basicAPIpull(name,payload,cols,sort = None):
+                pullSpan = span('pullData', name)
                 try:
                     response = requests.post(f"{mainURL}/Search", headers=apiHeader(cols, sort = sort), data=json.dumps(payload))
                     if response.status_code == 200:
@@ -2849,6 +2916,7 @@ class returnsApp(QWidget):
                                 rows = []
                             keys_to_remove = {'_id', '_es'}
                             rows = [{k: v for k, v in row.items() if k not in keys_to_remove} for row in rows]
+                            pullSpan.end(rows = len(rows))
                             save_to_db(self.db,name,rows)
                         except Exception as e:
                             print(f"Error proccessing {name} API data : {e} {e.args}.  {traceback.format_exc()}")
@@ -2858,11 +2926,12 @@ class returnsApp(QWidget):
                     with completeLock:
                         self.complete += 1
                     frac = self.complete/totalCalls
-                    gui_queue.put(lambda val = frac: self.apiLoadingBar.setValue(int(val * 100)))
+                    gui_queue.put(lambda val = frac: self.apiLoadingBar.setValue(int(val * 100)), key = 'apiLoadingBar')
                 except:
                     with self.apiFailureLock:
                         self.apiFailure = True
                     print('WARNING: API call failed.')
+                pullSpan.end()
             submitAPIcall(self,basicAPIpull,'benchmarks',benchmarkPayload,apiData['benchCols'])
             submitAPIcall(self,basicAPIpull,'investors',investorPayload,apiData['investorCols'])
             submitAPIcall(self,basicAPIpull,'tranDefs',tranDefsPayload,apiData['tranDefCols'])
@@ -2882,13 +2951,13 @@ class returnsApp(QWidget):
                         pool = rec[poolTag]
                         if self.nodeChangeDates.get("active",False): #if active, specifiy date by pool
                             changeDate = self.nodeChangeDates.get(pool,datetime.now())
-                        if changeDate < datetime.strptime(rec["Date"], "%Y-%m-%dT%H:%M:%S"): #new data past the editing date
+                        if changeDate < partsDateTime(isoDateParts(rec["Date"])): #new data past the editing date
                             mergedTable.append(rec)
                     for rec in tableData["old"]:
                         pool = rec[poolTag]
                         if self.nodeChangeDates.get("active",False): #if active, specifiy date by pool
                             changeDate = self.nodeChangeDates.get(pool,datetime.now())
-                        if changeDate >= datetime.strptime(rec["Date"], "%Y-%m-%dT%H:%M:%S"): #old data before the editing date to be kept
+                        if changeDate >= partsDateTime(isoDateParts(rec["Date"])): #old data before the editing date to be kept
                             mergedTable.append(rec)
                     importedTables[table] = mergedTable
                 if importedTables[table] == []:
@@ -2911,9 +2980,11 @@ class returnsApp(QWidget):
                 raise RuntimeError('WARNING: A dynamo API call has failed. Data import and calculations will be halted.')
             gui_queue.put(lambda: self.calculateReturn(importedTables))
         except RuntimeError as e:
+            self.finishRun('Failed import', 'failed')
             gui_queue.put(lambda error = e: QMessageBox.warning(self,"Error Importing Data", f"Error pulling data from dynamo: {error} , {error.args}"))
         except Exception as e:
             print(traceback.format_exc())
+            self.finishRun('Failed import', 'failed')
             trace = traceback.format_exc() if traceback.format_exc() and not demoMode else ""
             gui_queue.put(lambda error = e: QMessageBox.warning(self,"Error Importing Data", f"Error pulling data from dynamo: {error} , {error.args} \n \n {trace}"))
         gui_queue.put(lambda: self.importButton.setEnabled(True))
@@ -2934,6 +3005,7 @@ class returnsApp(QWidget):
                 for fund in fundListDB:
                     fundList[fund["Name"]] = fund[nameHier["sleeve"]["sleeve"]]
                 months = load_from_db(self.db,"Months", f"ORDER BY [dateTime] ASC")
+                monthsByIdx = monthOrdinals(months) #day ordinal bounds for the engine
                 calculations = []
                 if load_from_db(self.db,"calculations") == []:
                     noCalculations = True
@@ -2951,32 +3023,38 @@ class returnsApp(QWidget):
                     save_to_db(self.db,None,None,query="UPDATE history SET [lastImport] = ?", inputs=(self.apiCallTime,), action="replace")
                     self.lastImportLabel.setText(f"Last Data Import: {self.apiCallTime}")
                     self.lastImportDB[0]['lastImport'] = self.apiCallTime
+                    self.queueAggregateCubes() #fund data may have changed the groupings
                     print("Calculations skipped.")
+                    self.finishRun('Import', 'noCalculations')
                     return
                 
                 # proces pool section----------------------------------------------------------------
                 self.workerProgress = {}
 
-                nodeLib = nodeLibrary([*dynImportData['transactions'],*dynImportData['positions']])
+                with span('nodeLibrary', rows = len(dynImportData['transactions']) + len(dynImportData['positions'])):
+                    nodeLib = nodeLibrary([*dynImportData['transactions'],*dynImportData['positions']])
                 if nodeLib.badNodes:
                     gui_queue.put(lambda: QMessageBox.warning(self,'Failed Nodes',f'WARNING: The following nodes will not be calculated due to illogical investment pattern. (Likely the investment was marked as owning the investing entity) \n \n {list(nodeLib.badNodes)}'))
                 # INSERT_YOUR_CODE
                 nodeClumps = get_connected_node_groups(nodeLib.nodePaths)
                 clumpIdxs = {node : idx for idx, clump in enumerate(nodeClumps) for node in clump}
                 # ------------------- build data cache ----------------------
+                cacheSpan = span('cacheBuild')
                 tables = mainTableNames
-                table_rows = {t: dynImportData[t] for t in tables}
+                table_rows = {t: toEngineRecords(t, dynImportData[t]) for t in tables} #compact rows for the workers. The writer maps them back to dynImportData
+                with span('balanceResolution', rows = len(table_rows['positions'])):
+                    #one effective balance per date, source, target, fund class and sub-account. Only the winners are calculated
+                    positionRecords = table_rows['positions']
+                    table_rows['positions'], _, balanceIndex = resolveBalances(positionRecords) #the losers stay in effectiveBalances.overrides only
+                    self.db.saveEffectiveBalances(effectiveBalanceRows(balanceIndex, positionRecords))
                 cache = {}
                 for table, rows in table_rows.items(): 
                     #split the data by nodes for calculations
                     for row in rows:
+                        rowMonthList = rowMonths(row.dateParts, monthsByIdx, positions = table == "positions") #the months the account balance or transaction belongs in
                         if row['Target name'] in nodeLib.targets and row['Source name'] in nodeLib.sources:
                             #investments directly from investor to fund
-                            for m in months: #find the month the account balance or transaction belongs in
-                                start = m["accountStart"] if table == "positions" else m["tranStart"]
-                                date = row.get("Date")
-                                if not (start <= date <= m["endDay"]):
-                                    continue
+                            for m in rowMonthList:
                                 cache.setdefault(-1, {}).setdefault('noNodeData', {}).setdefault(table, {}).setdefault(m["dateTime"], []).append(row)
                         else:
                             for direction in ["Target name" , "Source name", 'node']:
@@ -2988,20 +3066,15 @@ class returnsApp(QWidget):
                                         tableName = 'positions_below' if 'Source' in direction else 'positions_above'
                                     elif table == 'transactions':
                                         tableName = 'transactions_below' if 'Source' in direction else 'transactions_above'
-                                    for m in months: #find the month the account balance or transaction belongs in
-                                        start = m["accountStart"] if table == "positions" else m["tranStart"]
-                                        date = row.get("Date")
-                                        if not (start <= date <= m["endDay"]):
-                                            continue
+                                    for m in rowMonthList:
                                         cache.setdefault(clumpIdxs[potNode], {}).setdefault(potNode, {}).setdefault(tableName, {}).setdefault(m["dateTime"], []).append(row)
                 pTransfers = self.db.pullPtransfers()
                 for pT in pTransfers:
-                    for m in months: #find the month the pT belongs in
-                        start = m["tranStart"]
-                        date = pT.get("Date")
-                        if not (start <= date <= m["endDay"]):
-                            continue
-                        #only reaches here once for appropriate month
+                    try:
+                        pTmonths = rowMonths(isoDateParts(pT["Date"]), monthsByIdx, positions = False) #the month the pT belongs in
+                    except (TypeError, ValueError):
+                        continue #no usable date, so it falls in no month
+                    for m in pTmonths:
                         if pT['Fund'] not in nodeLib.nodes:
                                 cache.setdefault(-1, {}).setdefault('noNodeData', {}).setdefault('pTransfers', {}).setdefault(m["dateTime"], []).append(pT)
                         else:
@@ -3010,8 +3083,9 @@ class returnsApp(QWidget):
                                 continue #Note: this also ignored deleted recursive nodes
                             else:
                                 cache.setdefault(clumpIdxs[potNode], {}).setdefault(potNode, {}).setdefault('pTransfers', {}).setdefault(m["dateTime"], []).append(pT)
-                self.cachedDynTables = {table : [] for table in mainTableNames}
+                cacheSpan.end(rows = sum(len(rows) for rows in table_rows.values()) + len(pTransfers))
                 self.cachedLinkedCalculations = []
+                keptNodes = [] #nodes not recalculated. Their positions and transactions stay in the tables as stored
                 if fullRecalculations:
                     self.nodeChangeDates['active'] = False #no more using cached data. Full calculations every time
                     self.earliestChangeDate = self.dataTimeStart
@@ -3023,12 +3097,7 @@ class returnsApp(QWidget):
                         else:
                             for node in cNodes:
                                 self.cachedLinkedCalculations.extend([calcRow for _, rows in  cache[idx].get(node,{}).get("calculations", {}).items() for calcRow in rows])
-                                for table in mainTableNames: #add the dynTable data to maintain the pool data and add it again after calculations
-                                    if "positions" == table: #remove the duplicate account balances (EOM = next BOM)
-                                        uniqueBalances = {accountBalanceKey(dynRow): dynRow for month in  cache[idx].get(node,{}).get(table, {}) for dynRow in cache[idx].get(node,{}).get(table, {}).get(month)}
-                                        self.cachedDynTables[table].extend([entry for _,entry in uniqueBalances.items()])
-                                    else:
-                                        self.cachedDynTables[table].extend([dynRow for month in  cache[idx].get(node,{}).get(table, {}) for dynRow in cache[idx].get(node,{}).get(table, {}).get(month)])
+                                keptNodes.append(node)
                 else:
                     runClumps = [[{'name' : node} for node in cNodes] for cNodes in nodeClumps]
                 nodeCount = 0
@@ -3047,7 +3116,7 @@ class returnsApp(QWidget):
                     if not noCalculations: #if there are calculations, find all months before the data pull, and then pull those calculations
                         for month in months:
                             #if the calculations for the month have already been complete, pull the old data
-                            if clumpEarliestChangeDate > datetime.strptime(month["endDay"], "%Y-%m-%dT%H:%M:%S"):
+                            if clumpEarliestChangeDate > month['endDate']:
                                 pass
                             else:
                                 newMonths.append(month)
@@ -3065,9 +3134,11 @@ class returnsApp(QWidget):
                     self.workerStatusQueue = self.manager.Queue()
                     self.workerDBqueue = self.manager.Queue()
                     self.calcFailedFlag = self.manager.Value('b', False)
+                    self.workerLogQueue = self.manager.Queue() #worker log events and counters for the run summary
+                    startWorkerListener(self.workerLogQueue)
                     self.cancelCalcBtn.setEnabled(True) #only allows cancelling once the lock for the db exists
 
-                    self.pool = Pool()
+                    self.pool = Pool(initializer = initWorkerLogging, initargs = (self.workerLogQueue,))
                     self.futures = []
                     self.noNodeFuture = None
                     executor.submit(self.watch_db,nodeCount)
@@ -3079,11 +3150,16 @@ class returnsApp(QWidget):
                     
                     self.calcStartTime = datetime.now()
                     print("Building worker pool...")
+                    #results are written to staging tables as each clump lands instead of all at once after the pool finishes
+                    self.resultWriter = calcResultWriter(self.db, expected = len(runClumps) + 1, sourceRows = {t : dynImportData[t] for t in mainTableNames},
+                                                         keepNames = keptNodes)
+                    self.resultWriter.addRows(self.cachedLinkedCalculations)
+                    writerCallbacks = {'callback' : self.resultWriter.submit, 'error_callback' : self.resultWriter.submitError}
                     noNodeDataDict = {'name' : 'noNodeData', 'cache' : cache[-1].get('noNodeData',{})}
-                    res = self.pool.apply_async(processInvestments, args=(noNodeDataDict, commonData,self.workerStatusQueue, self.workerDBqueue, self.calcFailedFlag))
+                    res = self.pool.apply_async(processInvestments, args=(noNodeDataDict, commonData,self.workerStatusQueue, self.workerDBqueue, self.calcFailedFlag), **writerCallbacks)
                     self.futures.append(res)
                     for clumpData in runClumps:
-                        res = self.pool.apply_async(processClump, args=(clumpData,nodeLib, commonData,self.workerStatusQueue, self.workerDBqueue, self.calcFailedFlag))
+                        res = self.pool.apply_async(processClump, args=(clumpData,nodeLib, commonData,self.workerStatusQueue, self.workerDBqueue, self.calcFailedFlag), **writerCallbacks)
                         self.futures.append(res)
                     print("Workers all built. Processing...")
                     self.pool.close()
@@ -3176,37 +3252,37 @@ class returnsApp(QWidget):
                     QMessageBox.warning(self,"Calculation Failure", "A worker thread has failed. Calculations will not be properly completed.")
                 self.pool.terminate()
                 self.pool.join()
+                executor.submit(self.resultWriter.abort) #discard the partially staged results
+                executor.submit(self.finishRun, 'Failed calculation run', 'failed')
                 gui_queue.put(lambda: self.calculationLoadingBox.setVisible(False))
                 gui_queue.put(lambda: self.importButton.setEnabled(True))
                 
+    def finishRun(self, title : str = 'Calculation run', status : str = 'completed'):
+        #end of an import. Prints the event summary, then saves the stage timings next to the history row
+        endRun(title)
+        comparison = finishRunMetrics(self.db, getattr(self, 'apiCallTime', None), status)
+        if comparison:
+            print(comparison)
     def calcCompletion(self):
         try:
             print("Checking worker completion...")
-            self.pool.join()
+            with span('workerWait'):
+                self.pool.join()
             print("All workers finished")
-            
-            nodeCalculations = []
-            allDynTables = {table: [] for table in mainTableNames}
-            for fut in self.futures:
-                try:
-                    nCalcs, dynTables = fut.get()
-                    nodeCalculations.extend(nCalcs)
-                    for table in dynTables:
-                        allDynTables[table].extend(dynTables[table])
-                except Exception as e:
-                    print(traceback.format_exc())
-                    print(f"Error appending calculations: {e}")
-            nodeCalculations.extend(self.cachedLinkedCalculations)
-            for table in dynTables: #add dynamo table data in for pools that were not calculated again
-                allDynTables[table].extend(self.cachedDynTables[table])
-            keys = list({key for row in nodeCalculations for key in row.keys()})
+            with span('stagedWrites'):
+                self.resultWriter.finish() #every clump has landed once the pool joins. Waits for the last staged writes
             print("Updating database...")
-            save_to_db(self.db,"calculations",nodeCalculations, keys=keys)
+            with span('stagingSwap'):
+                self.resultWriter.swap()
             save_to_db(self.db, "nodes", [node for _, node in self.cachedNodePaths.items()])
             executor.submit(self.db.postCalcUpdate) #make sure the cached node data is up to date
-            for table in mainTableNames:
-                save_to_db(self.db,table, allDynTables[table])
             print("Database updated.")
+            self.queueAggregateCubes() #the import finishes without waiting for the cube
+            executor.submit(self.db.buildSnapshotTotals) #report snapshots read these instead of the full calculation history
+            with span('dashData'):
+                positionsChanged = any(self.resultWriter.writeCounts['positions'][change] for change in ('inserted','updated','deleted'))
+                if positionsChanged or not self.db.stampDashData(self.apiCallTime):
+                    self.db.writeDashData(self.apiCallTime) #new generation of the Dash handoff file, only when positions changed
             try:
                 save_to_db(self.db,None,None,query="UPDATE history SET [lastImport] = ?", inputs=(self.apiCallTime,), action="replace")
                 gui_queue.put(lambda: self.lastImportLabel.setText(f"Last Data Import: {self.apiCallTime}"))
@@ -3215,17 +3291,23 @@ class returnsApp(QWidget):
                 gui_queue.put( lambda: QMessageBox.warning(self,"Warning",f"Failed to update internal data for last import time. Data will likely reimport soon: {e} {e.args}"))
                 print(f"failed to update last import time {e} {e.args}")
             gui_queue.put(lambda: self.instantiateFilters(keepChoices=True))
+            nodeCalculations = load_from_db(self.db,"calculations")
+            keys = self.resultWriter.columns['calculations'] or list({key for row in nodeCalculations for key in row.keys()})
             gui_queue.put( lambda: self.populate(self.calculationTable,nodeCalculations,keys = keys))
             gui_queue.put( lambda: self.buildReturnTable())
+            gui_queue.put(self.prefetcher.start) #queued after the table request so prefetching waits for that build
             gui_queue.put(lambda: self.calculationLoadingBox.setVisible(False))
             gui_queue.put(lambda: self.importButton.setEnabled(True))
             print("Calculations complete.")
+            print(f"Database lock waits so far - {self.db.lockMetricsSummary()}")
             self.workerProgress = {}
+            self.finishRun()
         except:
             gui_queue.put(lambda: self.calculationLoadingBox.setVisible(False))
             gui_queue.put(lambda: self.importButton.setEnabled(True))
             print(f"Error occured processing calculation results. Resetting... ")
             print(traceback.format_exc())
+            self.finishRun('Failed calculation run', 'failed')
     def checkVersion(self):
         self.currentVersionAccess = False
         self.globalVersion = None
@@ -3262,7 +3344,26 @@ class returnsApp(QWidget):
             ordered += [h for h in keys if h not in newOrder and h not in exceptions]
             keys = ordered
         return keys
-    def populateReturnsTable(self, origRows: dict, flagStruc : dict = {}):
+    def visibleRows(self, origRows : dict, visible : dict[bool]):
+        #copy of the rows the table shows for the visibility buttons ({filter key : checked}). Hidden layers are always dropped
+        rows = copy.deepcopy(origRows) #prevents alteration of self.returnsTableData
+        for f in self.filterOptions: #remove dataTypes the user has chosen not to see
+            if f["key"] not in self.filterBtnExclusions and not visible[f["key"]]:
+                for k,v in rows.items():
+                    if "dataType" not in v:
+                        print(f"Bad row. Key: {k} \n       row: {v}")
+                to_delete = [k for k,v in rows.items() if v["dataType"] == "Total " + f["key"]]
+                for k in to_delete:
+                    rows.pop(k)
+        to_delete = []
+        for row in rows.keys():
+            row_label, _ = separateRowCode(row)
+            if row_label == "hiddenLayer":
+                to_delete.append(row)
+        for row in to_delete:
+            rows.pop(row)
+        return rows
+    def populateReturnsTable(self, origRows: dict, flagStruc : dict = {}, snapshotKey : tuple = None):
         try:
             self.updateTableLoading(95, text='Populating table')
             mode = self.tableBtnGroup.checkedButton().text()
@@ -3275,23 +3376,7 @@ class returnsApp(QWidget):
                 self.buildTableLoadingBox.setVisible(False)
                 return
 
-            rows = copy.deepcopy(origRows) #prevents alteration of self.returnsTableData
-            for f in self.filterOptions: #remove dataTypes the user has chosen not to see
-                if f["key"] not in self.filterBtnExclusions and not self.filterRadioBtnDict[f["key"]].isChecked():
-                    for k,v in rows.items():
-                        if "dataType" not in v:
-                            print(f"Bad row. Key: {k} \n       row: {v}")
-                    to_delete = [k for k,v in rows.items() if v["dataType"] == "Total " + f["key"]]
-                    for k in to_delete:
-                        rows.pop(k)
-            to_delete = []
-            for row in rows.keys():
-                row_label, _ = separateRowCode(row)
-                if row_label == "hiddenLayer":
-                    to_delete.append(row)
-            for row in to_delete:
-                rows.pop(row)
-            
+            rows = self.visibleRows(origRows, {key : btn.isChecked() for key, btn in self.filterRadioBtnDict.items()})
             self.filteredReturnsTableData = copy.deepcopy(rows) #prevents removal of dataType key for data lookup
 
             # 1) Build a flat list of row-entries:
@@ -3340,24 +3425,7 @@ class returnsApp(QWidget):
 
             bg = None
             # 4) Populate each row
-            colorDepths = [code.count("::") for _, code, _,_ in row_entries]
-            maxDepth = max(colorDepths)
-            fundsPresent = any(row_dict['dataType'] == 'Total Target name' for _, _, row_dict,_ in row_entries)
-            trackIdx = 0
-            trackDepth = 0
-            for i in range(len(colorDepths)):
-                d = colorDepths[i]
-                if trackDepth < d: #further depth
-                    trackIdx = i
-                    trackDepth = d
-                if fundsPresent and (trackDepth > d or i == len(colorDepths) - 1) and d != maxDepth: #back up  from depth or the end, but did not go full depth
-                    if i == len(colorDepths) - 1:
-                        i += 1
-                    colorDepths[trackIdx:i] = [maxDepth] * (i-trackIdx) #set the depth for low section all the way down
-                trackDepth = d
-            if not fundsPresent:
-                maxDepth += 1 #if funds are off, don't allow upper sorts to be white
-            colorDepths = [c/maxDepth for c in colorDepths] if maxDepth != 0 else colorDepths
+            colorDepths = rowColorDepths(rows)
             self.tableColorDepths = colorDepths
             for r, (fund_label, code, row_dict, rowKey) in enumerate(row_entries):
                 # pull & remove dataType for coloring
@@ -3422,6 +3490,8 @@ class returnsApp(QWidget):
                     self.returnsTable.setItem(r, c, item)
             self.updateTableLoading(100)
             self.buildTableLoadingBox.setVisible(False)
+            if snapshotKey: #(config key, data generation) from a finished build. Saved for the next launch
+                executor.submit(saveTableSnapshot, *snapshotKey, origRows, flagStruc, list(col_keys), list(colorDepths))
         except Exception as e:
             QMessageBox.warning(self,'Build Table Failed',f'Error occured attempting to format the table. Please try again. \n {e.args} {traceback.format_exc()}')
     def populate(self, table, rows, keys = None):
@@ -0,0 +1,65 @@
+import threading
+from PyQt5.QtCore import QTimer
+
+from scripts.instantiate_basics import executor
+
+class tableBuildCancelled(Exception):
+    #raised inside a build once a newer request has superseded it
+    pass
+
+class tableBuildScheduler:
+    """
+    Collects table build requests from the returns page and runs only the latest one.
+    Requests inside the debounce window restart it, so ticking several filters in a row starts a single build. When that
+    build starts, the one still running is cancelled and stops at its next check. A window that only changed presentation
+    options (output type, table mode, hidden months) reuses the last aggregation instead of reloading from the database.
+    idle is clear from a request until its build finishes, which is when the view prefetcher may use the database.
+    """
+    def __init__(self, app, debounceMs : int = 150):
+        self.app = app
+        self.reuseData = True
+        self.cancelEvent = None
+        self.future = None
+        self.requests = 0
+        self.started = 0
+        self.idle = threading.Event()
+        self.idle.set()
+        self._queued = False
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounceMs)
+        self._timer.timeout.connect(self._start)
+
+    def request(self, reuseData : bool = False):
+        #GUI thread. A full request anywhere in the window wins over presentation-only ones
+        self.requests += 1
+        self.idle.clear()
+        self._queued = True
+        if not reuseData:
+            self.app.aggregationCache = None #the inputs changed, so no later presentation-only build may reuse the old aggregation
+        if not self._timer.isActive():
+            self.reuseData = reuseData
+        else:
+            self.reuseData = self.reuseData and reuseData
+        if self.cancelEvent is not None:
+            self.cancelEvent.set() #the running build is stale as soon as anything changes
+        self._timer.start()
+
+    def _start(self):
+        self.started += 1
+        self._queued = False
+        previous = self.future
+        cancelEvent = threading.Event()
+        self.cancelEvent = cancelEvent
+        self.app.buildTableCancel = cancelEvent
+        self.future = executor.submit(self.app.buildTable, cancelEvent, reuseAggregation = self.reuseData)
+        self.future.add_done_callback(self._finished)
+        self.app.buildTableFuture = self.future
+        if previous is not None and not previous.done():
+            previous.cancel() #after the new future is current, so its callback does not mark the scheduler idle
+        if not self.reuseData:
+            self.app.prefetcher.recordUse(self.app.tableView())
+
+    def _finished(self, future):
+        if future is self.future and not self._queued: #only the latest build finishing, with nothing waiting, frees the database
+            self.idle.set()
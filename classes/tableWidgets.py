@@ -1,16 +1,30 @@
+import logging
 from PyQt5.QtCore import Qt, QModelIndex, QTimer, QAbstractTableModel
 from PyQt5.QtGui import QBrush, QColor
 from PyQt5.QtWidgets import  QTableWidget, QTableWidgetItem, QHeaderView
 from scripts.loggingFuncs import attach_logging_to_class
-@attach_logging_to_class
+
+alignRight = Qt.AlignVCenter | Qt.AlignRight
+alignLeft = Qt.AlignVCenter | Qt.AlignLeft
+rowBrushes = {"Total Portfolio" : QBrush(Qt.darkGray), "Total Asset" : QBrush(QColor(181, 135, 235)),
+              "Total subAsset" : QBrush(QColor(213, 193, 236)), "Total Pool" : QBrush(Qt.lightGray),
+              "Total Fund" : QBrush(QColor(181, 235, 135)), "Fund" : QBrush(QColor(213, 236, 193))}
+
+#data, rowCount, columnCount and headerData are called per cell on every repaint so they are left unwrapped
+@attach_logging_to_class(include = {'__init__', '_buildColumn', '_rowBrush', '_reportRepaintCalls'})
 class DictListModel(QAbstractTableModel):
     """
     Simple table model over a list of dicts.
+    Display text and alignment are computed once per column on first paint rather than per data() call.
     """
     def __init__(self, rows, headers, parent=None):
         super().__init__(parent)
         self._rows = rows
         self._headers = headers
+        self._columns = [None] * len(headers) #(display strings, alignments) per column, built on first access
+        self._brushes = {} #row index to background brush
+        self.repaintCalls = 0 #data() calls since the last repaint finished
+        self.lastRepaintCalls = 0
 
     def rowCount(self, parent=QModelIndex()):
         return len(self._rows)
@@ -18,43 +32,62 @@ class DictListModel(QAbstractTableModel):
     def columnCount(self, parent=QModelIndex()):
         return len(self._headers)
 
+    def _buildColumn(self, col):
+        key = self._headers[col]
+        display = []
+        alignment = []
+        for row in self._rows:
+            val = row.get(key, '')
+            display.append(str(val))
+            try:
+                float(row.get(key))
+                alignment.append(alignRight)
+            except (ValueError, TypeError):
+                alignment.append(alignLeft)
+        self._columns[col] = (display, alignment)
+        return self._columns[col]
+
+    def _rowBrush(self, rowIdx):
+        row = self._rows[rowIdx]
+        Investor = str(row.get('Investor', ''))
+        Fund = row.get('Fund', '')
+        if Investor in ("Total Portfolio", "Total Asset", "Total subAsset", "Total Pool"):
+            brush = rowBrushes[Investor]
+        elif Fund is not None and Fund != "None" and Investor == "Total Fund":
+            brush = rowBrushes["Total Fund"]
+        elif Fund is not None and Fund != "None": #Fund
+            brush = rowBrushes["Fund"]
+        else:
+            brush = None
+        self._brushes[rowIdx] = brush
+        return brush
+
+    def _reportRepaintCalls(self):
+        self.lastRepaintCalls = self.repaintCalls
+        self.repaintCalls = 0
+        logging.debug(f"DictListModel served {self.lastRepaintCalls} data calls for {len(self._rows)} rows x {len(self._headers)} columns")
+
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
-        row = self._rows[index.row()]
-        key = self._headers[index.column()]
-        # Display the cell text
+        if not self.repaintCalls:
+            QTimer.singleShot(0, self._reportRepaintCalls) #fires once the current repaint returns to the event loop
+        self.repaintCalls += 1
         if role == Qt.DisplayRole:
-            return str(row.get(key, ''))
+            column = self._columns[index.column()] or self._buildColumn(index.column())
+            return column[0][index.row()]
 
         # Conditional background coloring
         if role == Qt.BackgroundRole:
-            # Example: color 'Value' column green if above threshold
-            try:
-                Investor = str(row.get('Investor', ''))
-                Fund = row.get('Fund', '')
-                if Investor == "Total Portfolio":
-                    return QBrush(Qt.darkGray)  
-                elif Investor == "Total Asset":
-                    return QBrush(QColor(181, 135, 235)) 
-                elif Investor == "Total subAsset":
-                    return QBrush(QColor(213, 193, 236)) 
-                elif Investor == "Total Pool":
-                    return QBrush(Qt.lightGray) 
-                elif Fund is not None and Fund != "None" and Investor == "Total Fund":
-                    return QBrush(QColor(181, 235, 135))  
-                elif Fund is not None and Fund != "None": #Fund
-                    return QBrush(QColor(213, 236, 193)) 
-            except (ValueError, TypeError):
-                pass
+            rowIdx = index.row()
+            if rowIdx in self._brushes:
+                return self._brushes[rowIdx]
+            return self._rowBrush(rowIdx)
 
         # Alignment for numbers
         if role == Qt.TextAlignmentRole:
-            try:
-                float(row.get(key))
-                return Qt.AlignVCenter | Qt.AlignRight
-            except (ValueError, TypeError):
-                return Qt.AlignVCenter | Qt.AlignLeft
+            column = self._columns[index.column()] or self._buildColumn(index.column())
+            return column[1][index.row()]
 
         return None
 
@@ -8,7 +8,6 @@ from classes.widgetClasses import SortButtonWidget, MultiSelectBox, simpleMonthS
 from scripts.commonValues import currentVersion, tranAppDataOptions, tranAppHeaderOptions, percent_headers, calculationPingTime, nameHier, yearOptions, dynamoAPIenvName, mainURL
 from scripts.basicFunctions import updateStatus
 from scripts.processNode import processNode
-from openpyxl.styles import PatternFill, Alignment, Font
 from multiprocessing import Pool, Manager
 import requests
 import time
@@ -18,8 +17,6 @@ import threading
 import traceback
 import calendar
 import copy
-from openpyxl import Workbook, load_workbook
-from openpyxl.utils import get_column_letter
 from classes.windowClasses import tableWindow, underlyingDataWindow
 from classes.tableWidgets import DictListModel, SmartStretchTable
 from PyQt5.QtWidgets import (
@@ -407,16 +404,6 @@ class transactionApp(QWidget):
         except Exception as e:
             print(f"Error in data viewing window: {e} {traceback.format_exc()}")
     def exportCurrentTable(self,*_):
-        # helper to darken a 6-digit hex color by a given factor
-        def darken_color(hex_color, factor=0.01):
-            h = hex_color.strip("#")
-            r = int(h[0:2], 16)
-            g = int(h[2:4], 16)
-            b = int(h[4:6], 16)
-            dr = max(0, int(r * factor))
-            dg = max(0, int(g * factor))
-            db = max(0, int(b * factor))
-            return f"{dr:02X}{dg:02X}{db:02X}"
         # 1) prompt user
         path, _ = QFileDialog.getSaveFileName(
             self, "Save as…", "", "Excel Files (*.xlsx)"
@@ -427,11 +414,10 @@ class transactionApp(QWidget):
             path += ".xlsx"
 
         def processExport():
+            from scripts.excelExport import excelExportEngine, get_column_letter #openpyxl loads on the first export, not at startup
             try:
                 data = self.currentTableData  # dict of dicts
 
-                # 2) determine hierarchy levels present
-
                 # 3) dynamic data columns minus "dataType"
                 all_cols = {
                     k for row in data.values() for k in row.keys()
@@ -440,138 +426,99 @@ class transactionApp(QWidget):
 
                 sorted_cols = self.orderColumns(all_cols)
 
-                # 4) create workbook or add sheet if already exists
-                if os.path.exists(path):
-                    wb = load_workbook(path)
-                    # Create a unique sheet name for export
-                    import datetime
-                    base_name = "Export"
-                    i = 1
-                    while True:
-                        sheet_name = f"{base_name}{i}"
-                        if sheet_name not in wb.sheetnames:
-                            break
-                        i += 1
-                    ws = wb.create_sheet(sheet_name)
-                else:
-                    wb = Workbook()
-                    ws = wb.active
-
+                # 4) streaming workbook, or a new sheet if the file already exists
+                engine = excelExportEngine(path)
                 rowStart = 4
-                # 5) header row
-                for idx, colname in enumerate(sorted_cols, start=2):
-                    ws.cell(row=rowStart, column=idx, value=colname)
-
-                split_cell = f"{get_column_letter(1)}4"
-                ws.freeze_panes = split_cell
+                engine.freeze(f"{get_column_letter(1)}4")
 
-                # 7) populate rows
-                for r, (row_name, row_dict) in enumerate(data.items(), start=rowStart + 1):
-                    row_name, code = self.separateRowCode(row_name)
-                    dtype = row_dict.get("dataType")
-
-                    # fills
-                    # Default: light gray
-                    data_color = "A0A0A0"
-                    header_color = data_color
+                appliedFilters = {}
+                for filter in self.filterOptions:
+                    if self.filterDict[filter["key"]].checkedItems() != []:
+                        appliedFilters[filter["key"]] = self.filterDict[filter["key"]].checkedItems()
 
-                    # Reproduce the main table cell & header coloring logic from lines 2567-2586
-                    if dtype == "Total":
-                        # "Total" rows: shade startColor darker (0.8)
-                        data_color = "CDCDCD"  # A0A0A0 at 80% gray
-                        header_color = "B7B7B7"  # slightly darker for headers
-                    elif dtype == "benchmark":
-                        # "benchmark" rows: a blue as in GUI
-                        data_color = "B6CDF5"
-                        header_color = "A3B8DB"  # a harder blue for headers
+                def tableRows():
+                    #rows 1-2 hold the applied filters. Write-only sheets are filled top down so they come first
+                    if appliedFilters: #only write if there are filters applied
+                        bold = engine.style(bold=True)
+                        wrap = engine.style(wrap=True)
+                        yield [engine.cell("Filter:", bold), *(engine.cell(key, wrap) for key in appliedFilters)]
+                        yield [engine.cell("Selections:", bold), *(engine.cell(", ".join(appliedFilters[key]), wrap) for key in appliedFilters)]
                     else:
-                        # hierarchy coloring as in the GUI
-                        base_rgb = (160,160,160)
-                        # In gui: 'depth = code.count("::") if dataType != "Total Fund" else code.count("::") + 1'
-                        # But "Total Fund" doesn't exist here; treat as "else"
-                        if dtype != "Total Fund":
-                            depth = code.count("::")
-                        else:
-                            depth = code.count("::") + 1
-                        maxDepth = max(len(self.sortHierarchy.checkedItems()),1)
-                        cRange = 255 - base_rgb[0]
-                        ratio = (depth / maxDepth) if maxDepth != 0 else 1
-                        def clamp(x): return max(0,min(255,int(x)))
-                        def rgb_to_hex(rgb):
-                            return "".join(f"{clamp(x):02X}" for x in rgb)
-                        # Table: color = int(startColor[i] + cRange * ratio)
-                        color_rgb = tuple(
-                            clamp(base_rgb[i] + cRange * ratio)
-                            for i in range(3)
-                        )
-                        data_color = rgb_to_hex(color_rgb)
-                        # Header: make it "harder" (darker) by multiplying ratio by 1.08 (max 1.0)
-                        header_ratio = min(ratio * 1.08, 1.0)
-                        header_rgb = tuple(
-                            clamp(base_rgb[i] + cRange * header_ratio)
-                            for i in range(3)
-                        )
-                        header_color = rgb_to_hex(header_rgb)
+                        yield []
+                        yield []
+                    yield []
+                    # 5) header row
+                    yield [None, *sorted_cols]
 
-                    # Even/odd row striping: darken data color a bit for odd rows
-                    if r % 2 == 1:
-                        def hex_to_rgb(h): return tuple(int(h[i:i+2],16) for i in (0,2,4))
-                        cur_rgb = hex_to_rgb(data_color)
-                        data_color = rgb_to_hex(tuple(
-                            int(x*0.93) for x in cur_rgb
-                        ))
-                        # Make header match "hardness": use the same darkening factor, but even slightly darker
-                        header_rgb = hex_to_rgb(header_color)
-                        header_color = rgb_to_hex(tuple(
-                            int(x*0.91) for x in header_rgb
-                        ))
+                    # 7) populate rows
+                    for r, (row_name, row_dict) in enumerate(data.items(), start=rowStart + 1):
+                        row_name, code = self.separateRowCode(row_name)
+                        dtype = row_dict.get("dataType")
 
-                    data_fill   = PatternFill("solid", data_color, data_color)
-                    header_fill = PatternFill("solid", header_color, header_color)
+                        # fills
+                        # Default: light gray
+                        data_color = "A0A0A0"
+                        header_color = data_color
 
-                    cell = ws.cell(row=r, column=1, value=row_name)
-                    cell.fill = header_fill
-                    # data cells with proper formatting
-                    for c, colname in enumerate(sorted_cols, start=2):
-                        val = row_dict.get(colname, None)
-                        cell = ws.cell(row=r, column=c, value=val)
-                        cell.fill = data_fill
-                        if isinstance(val, (int, float)):
-                            if colname not in percent_headers:
-                                # show with commas, two decimals
-                                cell.number_format = "#,##0.00"
+                        # Reproduce the main table cell & header coloring logic from lines 2567-2586
+                        if dtype == "Total":
+                            # "Total" rows: shade startColor darker (0.8)
+                            data_color = "CDCDCD"  # A0A0A0 at 80% gray
+                            header_color = "B7B7B7"  # slightly darker for headers
+                        elif dtype == "benchmark":
+                            # "benchmark" rows: a blue as in GUI
+                            data_color = "B6CDF5"
+                            header_color = "A3B8DB"  # a harder blue for headers
+                        else:
+                            # hierarchy coloring as in the GUI
+                            base_rgb = (160,160,160)
+                            # In gui: 'depth = code.count("::") if dataType != "Total Fund" else code.count("::") + 1'
+                            # But "Total Fund" doesn't exist here; treat as "else"
+                            if dtype != "Total Fund":
+                                depth = code.count("::")
                             else:
-                                # interpret val as percentage (e.g. 10.5 → 10.5%)
-                                cell.value = val / 100.0
-                                cell.number_format = "0.00%"
+                                depth = code.count("::") + 1
+                            maxDepth = max(len(self.sortHierarchy.checkedItems()),1)
+                            cRange = 255 - base_rgb[0]
+                            ratio = (depth / maxDepth) if maxDepth != 0 else 1
+                            def clamp(x): return max(0,min(255,int(x)))
+                            def rgb_to_hex(rgb):
+                                return "".join(f"{clamp(x):02X}" for x in rgb)
+                            # Table: color = int(startColor[i] + cRange * ratio)
+                            color_rgb = tuple(
+                                clamp(base_rgb[i] + cRange * ratio)
+                                for i in range(3)
+                            )
+                            data_color = rgb_to_hex(color_rgb)
+                            # Header: make it "harder" (darker) by multiplying ratio by 1.08 (max 1.0)
+                            header_ratio = min(ratio * 1.08, 1.0)
+                            header_rgb = tuple(
+                                clamp(base_rgb[i] + cRange * header_ratio)
+                                for i in range(3)
+                            )
+                            header_color = rgb_to_hex(header_rgb)
 
-                # 8) autofit column widths
-                for idx, col_cells in enumerate(ws.columns, start=1):
-                    max_len = 0
-                    for cell in col_cells:
-                        if cell.value is not None:
-                            text = str(cell.value)
-                            max_len = max(max_len, len(text))
-                    ws.column_dimensions[get_column_letter(idx)].width = max_len + 2
+                        # Even/odd row striping: darken data color a bit for odd rows
+                        if r % 2 == 1:
+                            def hex_to_rgb(h): return tuple(int(h[i:i+2],16) for i in (0,2,4))
+                            cur_rgb = hex_to_rgb(data_color)
+                            data_color = rgb_to_hex(tuple(
+                                int(x*0.93) for x in cur_rgb
+                            ))
+                            # Make header match "hardness": use the same darkening factor, but even slightly darker
+                            header_rgb = hex_to_rgb(header_color)
+                            header_color = rgb_to_hex(tuple(
+                                int(x*0.91) for x in header_rgb
+                            ))
 
-                appliedFilters = {}
-                for filter in self.filterOptions:
-                    if self.filterDict[filter["key"]].checkedItems() != []:
-                        appliedFilters[filter["key"]] = self.filterDict[filter["key"]].checkedItems()
-                filterStart = 0
-                if self.filterDict[filter["key"]].checkedItems() != []: #only write if there are filters applied
-                    cell= ws.cell(row=1, column=filterStart, value="Filter:")
-                    cell.font = Font(bold=True)
-                    cell = ws.cell(row=2, column=filterStart, value="Selections:")
-                    cell.font = Font(bold=True)
-                    for idx, key in enumerate(appliedFilters, start=filterStart + 1):
-                        cell = ws.cell(row=1, column=idx, value=key)
-                        cell.alignment = Alignment(wrap_text=True)
-                        cell = ws.cell(row=2, column=idx, value=", ".join(appliedFilters[key]))
-                        cell.alignment = Alignment(wrap_text=True)
+                        cells = [engine.cell(row_name, engine.style(header_color))]
+                        # data cells with proper formatting
+                        for colname in sorted_cols:
+                            cells.append(engine.valueCell(colname, row_dict.get(colname, None), fill = data_color))
+                        yield cells
 
-            
-                wb.save(path)
+                engine.writeRows(tableRows(), total = len(data) + rowStart)
+                engine.save()
             except Exception as e:
                 gui_queue.put(lambda error=e, trace = traceback.format_exc(): QMessageBox.critical(self, "Save error", trace))
             else:
@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from classes.DatabaseManager import load_from_db
+from classes.tableBuildScheduler import tableBuildCancelled
+from scripts.commonValues import aggregateCubeHierarchies, prefetchCpuShare, prefetchMaxRows, prefetchMaxSeconds, prefetchTopViews, prefetchUsageKept
+from scripts.instantiate_basics import ASSETS_DIR
+from scripts.pyqtFunctions import filt2Query
+
+usageFields = ('filters', 'sortHierarchy', 'benchmarkLinks', 'consolidate', 'hideNonInvestables', 'sortStyle') #what an aggregation depends on besides the dates
+
+class yieldFlag:
+    #stands in for a build's cancel event. Set once an interactive build is requested or the prefetcher is stopped
+    def __init__(self, idle : threading.Event, stop : threading.Event):
+        self.idle = idle
+        self.stop = stop
+    def is_set(self):
+        return self.stop.is_set() or not self.idle.is_set()
+
+class viewPrefetcher:
+    """
+    Loads and aggregates popular table views in the background after an import, so the first build of each one skips that work.
+    The views are the saved configurations and then the prefetchTopViews most used filter combinations. Usage is counted in
+    assets/viewUsage.json. Both use the date range selected when the import finished.
+    Prefetching runs on its own thread and only while no interactive build is queued or running. A request interrupts the view
+    in progress, and that view is retried after the build. Sleeps between views keep it to prefetchCpuShare of a core.
+    Work stops after prefetchMaxSeconds or once prefetchMaxRows aggregated rows are cached.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.usagePath = os.path.join(ASSETS_DIR, 'viewUsage.json')
+        self.usage = self._loadUsage()
+        self.generation = None
+        self.built = 0
+        self.hits = 0
+        self.interrupted = 0
+        self._cache = OrderedDict() #aggregation key : (row structure, aggregated data)
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = ThreadPoolExecutor(max_workers=1)
+
+    def _loadUsage(self):
+        try:
+            with open(self.usagePath, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Ignoring unreadable view usage file: {e}")
+            return {}
+
+    def recordUse(self, view : dict):
+        #GUI thread, once per interactive build that reloads data
+        usageView = {field : view[field] for field in usageFields}
+        key = json.dumps(usageView, sort_keys=True, default=str)
+        entry = self.usage.setdefault(key, {'view' : usageView, 'count' : 0})
+        entry['count'] += 1
+        entry['lastUsed'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if len(self.usage) > prefetchUsageKept:
+            for dropKey in sorted(self.usage, key = lambda k: (self.usage[k]['count'], self.usage[k]['lastUsed']))[:len(self.usage) - prefetchUsageKept]:
+                self.usage.pop(dropKey)
+        try:
+            with open(self.usagePath, 'w') as file:
+                json.dump(self.usage, file)
+        except Exception as e:
+            print(f"Failed to save view usage: {e}")
+
+    def configView(self, base : dict, params : dict):
+        #the aggregation side of a saved configuration, read the way loadConfiguration applies it
+        asList = lambda val: val if isinstance(val, list) else [val]
+        view = dict(base)
+        view['filters'] = {key : asList(params[key]) if key in params else [] for key in base['filters']}
+        view['sortHierarchy'] = asList(params.get('sortHierarchy', []))
+        view['consolidate'] = params.get('consolidate') == '1'
+        view['benchmarkLinks'] = params.get('benchmarkLinks') == '1'
+        view['sortStyle'] = 'Sort Style: NAV' if params.get('sortStyle') == 'NAV' else 'Sort Style: Alphabetical'
+        return view
+
+    def candidateViews(self):
+        base = self.app.tableView()
+        views = [self.configView(base, self.app.db.fetchOptions(name)) for name in self.app.db.fetchOptions('configNames')]
+        ranked = sorted(self.usage.values(), key = lambda entry: (entry['count'], entry['lastUsed']), reverse = True)
+        views.extend({**base, **entry['view']} for entry in ranked[:prefetchTopViews])
+        return views
+
+    def start(self):
+        """GUI thread. Queue this after the import's own table request so prefetching waits for that build"""
+        self.stop()
+        self._stop = threading.Event()
+        try:
+            views = self.candidateViews()
+        except Exception as e:
+            print(f"View prefetch skipped: {e} {e.args}")
+            return
+        self._thread.submit(self._run, views, self._stop)
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._cache.clear()
+            self._rows = 0
+
+    def shutdown(self):
+        self.stop()
+        self._thread.shutdown(wait = False, cancel_futures = True)
+
+    def lookup(self, aggKey : tuple, generation : str):
+        #the prefetched (row structure, aggregated data) for this key if it was built from the same data, otherwise None
+        with self._lock:
+            if generation != self.generation:
+                self._cache.clear()
+                self._rows = 0
+                return None
+            entry = self._cache.get(aggKey)
+            if entry is not None:
+                self._cache.move_to_end(aggKey)
+                self.hits += 1
+            return entry
+
+    def _run(self, views : list[dict], stop : threading.Event):
+        idle = self.app.tableBuilds.idle
+        flag = yieldFlag(idle, stop)
+        workTime = 0.0
+        built = self.built
+        try:
+            self.generation = self.app.db.dataGeneration()
+            self.app.db.fetchInvestors()
+            for view in views:
+                while not stop.is_set():
+                    idle.wait()
+                    if stop.is_set():
+                        break
+                    if workTime >= prefetchMaxSeconds or self._rows >= prefetchMaxRows:
+                        print("View prefetch stopped at its budget")
+                        return
+                    start = time.perf_counter()
+                    try:
+                        self._prefetch(view, flag, stop)
+                    except tableBuildCancelled:
+                        self.interrupted += 1 #retried once the interactive build finishes
+                        continue
+                    finally:
+                        workTime += time.perf_counter() - start
+                    stop.wait((time.perf_counter() - start) * (1 / prefetchCpuShare - 1))
+                    break
+        except Exception as e:
+            print(f"View prefetch failed: {e} {e.args}")
+            print(traceback.format_exc())
+        finally:
+            print(f"View prefetch: {self.built - built} views aggregated in {workTime:.1f}s, {self.interrupted} interruptions so far, {self._rows} rows cached")
+
+    def _prefetch(self, view : dict, flag : yieldFlag, stop : threading.Event):
+        app = self.app
+        if view['sortHierarchy'] in aggregateCubeHierarchies and not view['benchmarkLinks'] and not any(view['filters'].values()):
+            return #the aggregate cube already covers it
+        startDate = datetime.strptime(view['start'], "%B %Y")
+        endDate = datetime.strptime(view['end'], "%B %Y")
+        invSort = any(invStr in view['sortHierarchy'] for invStr in ('Source name', 'Family Branch'))
+        condStatement, parameters = filt2Query(app.db, view['filters'], startDate, endDate, invSort = invSort, hideNonInvestables = view['hideNonInvestables'])
+        aggKey = app.aggregationKey(view, condStatement, parameters)
+        if aggKey in self._cache:
+            return
+        data = load_from_db(app.db, "calculations", condStatement, tuple(parameters))
+        for entry in data:
+            entry['ownershipAdjust'] = entry['ownershipAdjust'] == 'True'
+        if flag.is_set():
+            raise tableBuildCancelled()
+        structure, data = app.calculateUpperLevels({"Total##()##" : {}}, data, hierarchy = view['sortHierarchy'], navSort = "NAV" in view['sortStyle'],
+                                                   benchLinks = view['benchmarkLinks'], consolidate = view['consolidate'], cancelEvent = flag,
+                                                   targets = view['filters']["Target name"], endMonth = view['end'])
+        with self._lock:
+            if stop.is_set(): #stopped while aggregating. The data may be from before the next import
+                return
+            self._cache[aggKey] = (list(structure), data)
+            self._rows += len(data)
+            while self._rows > prefetchMaxRows and len(self._cache) > 1: #oldest view goes first
+                _, (_, oldData) = self._cache.popitem(last = False)
+                self._rows -= len(oldData)
+        self.built += 1
+
+    def summary(self):
+        return f"View prefetch: {self.built} views aggregated, {self.hits} used by table builds, {self.interrupted} interrupted by interactive builds"
@@ -154,6 +154,8 @@ class MultiSelectBox(QWidget):
             if text == item:
                 cb.setChecked(True)
         self._updateLine()
+    def items(self):
+        return [self.disp2id(t,t) for t in self._checkboxes]
     def checkedItems(self):
         if self.hierarchy:
             return [self.disp2id(item,item) for item in self.currentItems]
@@ -1,38 +1,29 @@
 from collections import defaultdict
 
-from numpy.char import count
 from classes import DatabaseManager
 from classes.DatabaseManager import load_from_db
-from scripts.basicFunctions import rebuildParagraph, separateRowCode, findSourceName
+from scripts.basicFunctions import rebuildParagraph, separateRowCode
 from scripts.loggingFuncs import attach_logging_to_class
 from classes.widgetClasses import EditableDBTableWidget, SortButtonWidget, MultiSelectBox, simpleMonthSelector
-from scripts.exportTableToExcel import exportTableToExcel
-from scripts.pyqtFunctions import basicHoldingsReportExport, comboInvestorOpts, controlTable, filt2Query
-from scripts.render_report import render_report
-from scripts.reportWorkbooks import portfolioSnapshot
-from openpyxl.utils import get_column_letter
+from scripts.pyqtFunctions import comboInvestorOpts, filt2Query
 from dateutil.relativedelta import relativedelta
-from openpyxl import Workbook
 from scripts.instantiate_basics import gui_queue, executor
-from scripts.commonValues import aggTransFields, defaultSports, fullPortStr, sqlPlaceholder, timeOptions, percent_headers, demoMode, nonFundCols
-import sqlite3
+from scripts.commonValues import aggTransFields, defaultSports, fullPortStr, sqlPlaceholder, timeOptions, demoMode, nonFundCols
 import logging
 import traceback
 import os
-import pandas as pd
 from datetime import datetime
-from openpyxl import load_workbook
 from PyQt5.QtWidgets import (
     QGridLayout, QTabWidget, QTextEdit, QWidget, QVBoxLayout,
     QLabel,  QPushButton, QFormLayout,
     QRadioButton, QButtonGroup, QComboBox, QHBoxLayout,
     QTableWidget, QTableWidgetItem,  QMessageBox,
     QScrollArea, QFileDialog, 
-     QHeaderView, QDateEdit, QSplitter
+     QHeaderView, QDateEdit, QSplitter, QCheckBox, QProgressBar
 )
 from PyQt5.QtGui import QBrush, QColor, QDesktopServices, QTextBlock
 from PyQt5.QtCore import Qt,  QUrl, QDate
-from scripts.instantiate_basics import DATABASE_PATH
+from scripts.instantiate_basics import ASSETS_DIR
 
 class linkBenchmarksWindow(QWidget):
     def __init__(self, parent=None, flags=Qt.WindowFlags(), parentSource=None):
@@ -291,7 +282,7 @@ class linkBenchmarksWindow(QWidget):
             return
         link = self._links[row]
         try:
-            with self.parent.lock:
+            with self.parent.db._lock:
                 cursor = self.parent.db._conn.cursor()
                 cursor.execute(
                     "DELETE FROM benchmarkLinks WHERE benchmark = ? AND asset = ? AND assetLevel = ?",
@@ -331,7 +322,7 @@ class linkBenchmarksWindow(QWidget):
         
     def updateLink(self, level,asset,benchmark, reload = True):
         try:
-            with self.parent.lock:
+            with self.parent.db._lock:
                 cursor = self.parent.db._conn.cursor()
                 cursor.execute(
                     "INSERT OR REPLACE INTO benchmarkLinks (benchmark, asset, assetLevel) VALUES (?, ?, ?)",
@@ -385,9 +376,7 @@ class exportWindow(QWidget):
             for field, val in ([f,v] for f,v in fund.items() if dyn2key.get(f,"") in filOptDict):
                 filOptDict[dyn2key[field]].add(val)
         nodes = [str(n) for n in list(self.parent.db.pullId2Node().keys())]
-        with self.parent.lock:
-            dbPath = getattr(self.parent, "dbPath", DATABASE_PATH)
-            conn = sqlite3.connect(dbPath)
+        with self.parent.db.reader() as conn:
             cur = conn.cursor()
             for f in self.filterOptions:
                 key = f["key"]
@@ -412,7 +401,7 @@ class exportWindow(QWidget):
                 self.filter_boxes[key] = combo
                 self.filter_labels[key] = name
                 form_layout.addRow(name + ":", combo)
-            conn.close()
+            cur.close()
 
         # --- Date selectors ---
         date_layout = QHBoxLayout()
@@ -454,68 +443,52 @@ class exportWindow(QWidget):
         start_date = self.start_date_edit.date()
         end_date = self.end_date_edit.date()
         where_clause, values = filt2Query(self.parent.db, self.filter_boxes, start_date.toPyDate(), end_date.toPyDate())
-        # Query the database
-        with self.parent.lock:
-            dbPath = getattr(self.parent, "dbPath", DATABASE_PATH)
-            conn = sqlite3.connect(dbPath)
-            cur = conn.cursor()
-            try:
+        try:
+            # Query the database. Rows are streamed from the cursor into the workbook rather than fetched all at once
+            with self.parent.db.reader() as conn:
+                cur = conn.cursor()
                 cur.execute("PRAGMA table_info(calculations)")
                 columns = [row[1] for row in cur.fetchall()]
-                sql = f"SELECT * FROM calculations {where_clause}"
-                print(sql)
-                print(tuple(values))
-                cur.execute(sql, tuple(values))
-                rows = cur.fetchall()
-            except Exception as e:
-                QMessageBox.warning(self, "Error", f"Failed to query database: {e}")
-                conn.close()
-                return
+                cur.execute(f"SELECT COUNT(*) FROM calculations {where_clause}", tuple(values))
+                total = cur.fetchone()[0]
+                cur.close()
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"Failed to query database: {e}")
+            return
 
-        if not rows:
+        if not total:
             QMessageBox.information(self, "No Data", "No data found for the selected filters.")
-            conn.close()
             return
 
         # Prompt user for file path
         path, _ = QFileDialog.getSaveFileName(self, "Save as…", "", "Excel Files (*.xlsx)")
         if not path:
-            conn.close()
             return
         if not path.lower().endswith(".xlsx"):
             path += ".xlsx"
 
-        # Write to Excel
-        try:
-            df = pd.DataFrame(rows, columns=columns)
-
-            if os.path.exists(path):
-                wb = load_workbook(path)
-                # Generate a unique sheet name
-                base_name = "Export"
-                i = 1
-                while True:
-                    sheet_name = f"{base_name}{i}"
-                    if sheet_name not in wb.sheetnames:
-                        break
-                    i += 1
-                # Write DataFrame to the new sheet
-                ws = wb.create_sheet(sheet_name)
-                for col_idx, col_name in enumerate(df.columns, 1):
-                    ws.cell(row=1, column=col_idx, value=col_name)
-                for row_idx, row in enumerate(df.itertuples(index=False), 2):
-                    for col_idx, value in enumerate(row, 1):
-                        ws.cell(row=row_idx, column=col_idx, value=value)
-                wb.save(path)
+        def progress(done, total):
+            gui_queue.put(lambda: self.confirm_btn.setText(f"Exporting... {int(done / max(total or 1, 1) * 100)}%"), key = 'calcExportProgress')
+        def processExport():
+            from scripts.excelExport import exportRows #openpyxl loads on the first export, not at startup
+            try:
+                sql = f"SELECT * FROM calculations {where_clause}"
+                print(sql)
+                print(tuple(values))
+                with self.parent.db.reader() as conn: #a pooled reader, so imports can keep writing while the export streams
+                    cur = conn.execute(sql, tuple(values))
+                    exportRows(path, columns, cur, formatNumbers = False, total = total, progress = progress)
+                    cur.close()
+            except Exception as e:
+                gui_queue.put(lambda error = e: QMessageBox.warning(self, "Error", f"Failed to export to Excel: {error}"))
             else:
-                df.to_excel(path, index=False)
-
-            QMessageBox.information(self, "Success", f"Data exported to {path}")
-            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(path)))
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Failed to export to Excel: {e}")
-        finally:
-            conn.close()
+                gui_queue.put(lambda: QMessageBox.information(self, "Success", f"Data exported to {path}"))
+                gui_queue.put(lambda: QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(path))))
+            finally:
+                gui_queue.put(lambda: self.confirm_btn.setText("Export to Excel"))
+                gui_queue.put(lambda: self.confirm_btn.setEnabled(True))
+        self.confirm_btn.setEnabled(False)
+        executor.submit(processExport)
 
 class displayWindow(QWidget):
     def __init__(self, parent=None, flags=Qt.WindowFlags(), parentSource = None, text = "", title=""):
@@ -581,61 +554,14 @@ class underlyingDataWindow(QWidget):
             path += ".xlsx"
 
         def processExport():
+            from scripts.excelExport import exportRows
             try:
                 data = self.allData  # list of dicts
-
                 all_cols = self.allCols
-
-
-                if os.path.exists(path):
-                    wb = load_workbook(path)
-                    # Create a unique sheet name for export
-                    base_name = "Export"
-                    i = 1
-                    while True:
-                        sheet_name = f"{base_name}{i}"
-                        if sheet_name not in wb.sheetnames:
-                            break
-                        i += 1
-                    ws = wb.create_sheet(sheet_name)
-                else:
-                    wb = Workbook()
-                    ws = wb.active
-                rowStart = 1
-                for idx, colname in enumerate(all_cols, start=1):
-                    ws.cell(row=rowStart, column=idx, value=colname)
-                # 7) populate rows
-                for r, row_dict in enumerate(data, start=rowStart + 1):        
-                    # data cells with proper formatting
-                    for c, colname in enumerate(all_cols, start=1):
-                        val = row_dict.get(colname, None)
-                        try: #make numerical format if possible
-                            val = float(val)
-                        except:
-                            pass
-                        cell = ws.cell(row=r, column=c, value=val)
-                        if isinstance(val, (int, float)):
-                            if colname not in percent_headers:
-                                # show with commas, two decimals
-                                cell.number_format = "#,##0.00"
-                            else:
-                                # interpret val as percentage (e.g. 10.5 → 10.5%)
-                                cell.value = val / 100.0
-                                cell.number_format = "0.00%"
-                # 8) autofit column widths
-                for idx, col_cells in enumerate(ws.columns, start=1):
-                    max_len = 0
-                    for cell in col_cells:
-                        if cell.value is not None:
-                            text = str(cell.value)
-                            max_len = max(max_len, len(text))
-                    ws.column_dimensions[get_column_letter(idx)].width = max_len + 2
-            except Exception as e:
-                gui_queue.put(lambda error = e, trace = traceback.format_exc(): QMessageBox.critical(self, "Processing error", f"{error} \n {trace}"))
-            try:
-                wb.save(path)
+                exportRows(path, all_cols, (tuple(row_dict.get(colname, None) for colname in all_cols) for row_dict in data),
+                           coerceNumbers = True, total = len(data))
             except Exception as e:
-                gui_queue.put(lambda error = e: QMessageBox.critical(self, "Save error", str(error)))
+                gui_queue.put(lambda error = e, trace = traceback.format_exc(): QMessageBox.critical(self, "Save error", f"{error} \n {trace}"))
             else:
                 gui_queue.put(lambda: QMessageBox.information(self, "Saved", f"Excel saved to:\n{path}"))
                 gui_queue.put(lambda: QDesktopServices.openUrl(QUrl.fromLocalFile(path)))
@@ -900,6 +826,7 @@ class tableWindow(QWidget):
                     item = QTableWidgetItem(str(raw))
                 self.table.setItem(r, c, item)
     def export(self,*_):
+        from scripts.exportTableToExcel import exportTableToExcel
         exportTableToExcel(self,self.rows,self.headers)
 class investablesMenu(QWidget):
     def __init__(self, parent = None, parentSource = None) -> None:
@@ -1007,10 +934,27 @@ class reportExportWindow(QWidget):
         self.classChoice.setCurrentText('HFC')
         classBoxLayout.addWidget(self.classChoice)
 
+        self.separateBtn = QCheckBox('Separate report for each selected family branch or investor')
+        self.separateBtn.setChecked(False)
+        layout.addWidget(self.separateBtn)
+
         self.confirmBtn = QPushButton('Generate Report')
         layout.addWidget(self.confirmBtn)
         self.confirmBtn.clicked.connect(self.beginExport)
 
+        #batch progress. Reports render in worker processes so this window stays usable for cancelling
+        self.progressBox = QWidget()
+        progressLayout = QHBoxLayout(self.progressBox)
+        self.progressLabel = QLabel('')
+        self.progressBar = QProgressBar()
+        self.cancelBtn = QPushButton('Cancel')
+        self.cancelBtn.clicked.connect(self.cancelExport)
+        for w in (self.progressLabel, self.progressBar, self.cancelBtn):
+            progressLayout.addWidget(w)
+        self.progressBox.setVisible(False)
+        layout.addWidget(self.progressBox)
+        self.engine = None
+
         investors = db.fetchInvestors()
         for cb, invKey in ([invSelect, 'Name'],[famSelect,'Parentinvestor']):
             cb.addItems(sorted(set((inv[invKey] for inv in investors))))
@@ -1046,52 +990,56 @@ class reportExportWindow(QWidget):
         except Exception as e:
             QMessageBox.warning(self,'Error', f"{e}")
     def beginExport(self,*_):
+        #the report modules pull in reportlab and matplotlib, so they load on the first report export
+        from scripts.batchReports import reportJobs
+        from classes.batchReportEngine import batchReportEngine
         try:
-            self.enabled = False
             self.confirmBtn.setEnabled(False)
             source = self.rGroup.checkedButton().text()
             print(f"Exporting for : {source}")
             classification = self.classChoice.currentText()
             if source == 'Full Portfolio':
                 self.invSelect.selectAll()
-                investors = self.invSelect.checkedItems()
-                sourceName = findSourceName([],[])
+                selections = self.invSelect.checkedItems()
             elif source == 'Select by Family Branch':
-                fams = self.famSelect.checkedItems()
-                investors = self.fam2inv(fams)
-                sourceName = findSourceName(fams,[])
+                selections = self.famSelect.checkedItems()
             elif source == 'Select by Investor':
-                investors = self.invSelect.checkedItems()
-                sourceName = findSourceName([],investors)
+                selections = self.invSelect.checkedItems()
             else:
                 raise ValueError('Error: Button Selection could not be connected to options')
-            if not investors:
+            jobs = [job for job in reportJobs(self.db, source, selections, separate = self.separateBtn.isChecked()) if job['investors']]
+            if not jobs:
                 raise ValueError('No investors found')
-            endDate = self.dateSelect.currentText()
-            endDate = datetime.strptime(endDate,'%B %Y')
-            if 'Full Report' in self.exportType:
-                placeholders = ','.join('?' for _ in investors)
-                date = self.dateSelect.currentText()
-                dateDt = datetime.strptime(date,'%B %Y')
-                date = datetime.strftime(dateDt,'%Y-%m-%d 00:00:00')
-                inputs = (*investors,)
-                condStatement = f' WHERE [Source name] in ({placeholders})'
-                calcs = self.parent.db.loadCalcs(condStatement,inputs)
-                snapshotWorkbook = portfolioSnapshot(calcs, self.parent,investors,dateDt)
-                render_report(self.parent,snapshotWorkbook)
-            else:
-                filters = {'Source name' : investors}
-                if classification != '':
-                    filters['Classification'] = [classification,]
-                controlTable(self.parent,reset = True, filterChoices=filters, endDate = endDate)
-                basicHoldingsReportExport(self.parent, sourceName = sourceName, classification = classification)
-            self.confirmBtn.setEnabled(True)
-            self.enabled = True
+            endDate = datetime.strptime(self.dateSelect.currentText(),'%B %Y')
+            outDir = QFileDialog.getExistingDirectory(self, 'Choose folder for the reports', os.path.join(ASSETS_DIR,'temp'))
+            if not outDir:
+                self.confirmBtn.setEnabled(True)
+                return
+            self.engine = batchReportEngine(self.parent, jobs, endDate, outDir, fullReport = 'Full Report' in self.exportType,
+                                            classification = classification, onProgress = self.exportProgress, onFinished = self.exportFinished)
+            self.progressBar.setRange(0, len(jobs))
+            self.progressBar.setValue(0)
+            self.cancelBtn.setEnabled(True)
+            self.progressBox.setVisible(True)
+            self.engine.start()
         except Exception as e:
             print("Error occured in report export initialization")
             QMessageBox.warning(self,'Error in report export', f"An error occured initializing the report export \n {e.args}")
             print(traceback.format_exc())
+            self.progressBox.setVisible(False)
             self.confirmBtn.setEnabled(True)
+    def exportProgress(self, done, total, text):
+        self.progressBar.setValue(done)
+        self.progressLabel.setText(f'{text} ({done}/{total})')
+    def cancelExport(self,*_):
+        if self.engine:
+            self.cancelBtn.setEnabled(False)
+            self.engine.cancel()
+    def exportFinished(self, results, summary):
+        self.engine = None
+        self.progressBox.setVisible(False)
+        self.confirmBtn.setEnabled(True)
+        QMessageBox.information(self, 'Report export complete', summary)
 class reportDataWindow(QWidget):
     def __init__(self, parent = None, parentSource = None) -> None:
         super().__init__(parent)
@@ -5,10 +5,15 @@ instantiate_basics(BASE_DIR= os.path.dirname(sys.executable) if getattr(sys, 'fr
 from unitTests.nodeRecursion import nodeRecursion
 from unitTests.reportGeneration import pSnap
 from unitTests.basicFuncs import dNavSort
+from unitTests.returnSeries import complexWindows
+from unitTests.excelExport import streamingExport, streamingExportBenchmark
+from unitTests.normalizeRows import monthFiling
+from unitTests.balanceResolver import effectiveBalances
+from unitTests.reachability import cyclicReachability
 
-allTests = [nodeRecursion,dNavSort, pSnap]
+allTests = [nodeRecursion,dNavSort, pSnap, complexWindows, streamingExport, streamingExportBenchmark, monthFiling, effectiveBalances, cyclicReachability]
 runTests = [pSnap]
-ignoreTests = []
+ignoreTests = [streamingExportBenchmark] #timing only, remove from here or list in runTests to run it
 
 #either run everything except for ignored, unless runTests is given, then run only those
 if runTests:
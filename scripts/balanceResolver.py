@@ -0,0 +1,58 @@
+from scripts.basicFunctions import accountBalanceKey
+from scripts.commonValues import balanceTypePriority, nameHier
+
+#Effective account balances. calculateReturn resolves the imported positions once, before they are filed into the calculation
+#cache: every (date, source, target, fund class, sub-account) keeps one winning balance and the workers only see the winners.
+#A winner's overrides are the rowIds of the candidates it beat. The winners are saved to the effectiveBalances table with the
+#balance keys of those candidates, which is the only place they are kept: positions holds effective balances alone.
+
+def balanceSlot(row):
+    return (row['Date'], row['Source name'], row['Target name'], row.get(nameHier["FundClass"]["dynLow"]), row.get('InvestsThrough'))
+
+def balanceRank(row):
+    #lower wins. A valued balance of the most preferred type, then any other valued balance, then a balance with no value
+    if row.get(nameHier["Value"]["dynLow"]) is None:
+        return (2, 0)
+    balanceType = row.get('Balancetype')
+    if balanceType in balanceTypePriority:
+        return (0, balanceTypePriority.index(balanceType))
+    return (1, 0)
+
+def resolveBalances(records : list):
+    """
+    Picks the effective balance of each slot. Equal ranks go to the first imported.
+    Returns (winners, losers, index) with winners and losers in import order and index as {slot : winner}
+    """
+    slots = [balanceSlot(rec) for rec in records]
+    candidates = {}
+    for slot, rec in zip(slots, records):
+        candidates.setdefault(slot, []).append(rec)
+    index = {}
+    for slot, recs in candidates.items():
+        winner = min(recs, key = balanceRank)
+        winner.overrides = tuple(rec.rowId for rec in recs if rec is not winner)
+        index[slot] = winner
+    winners = []
+    losers = []
+    for slot, rec in zip(slots, records):
+        (winners if index[slot] is rec else losers).append(rec)
+    return winners, losers, index
+
+def effectiveBalanceRows(index : dict, records : list):
+    #rows for the effectiveBalances table. records are indexed by rowId, as toEngineRecords builds them
+    rows = []
+    for (date, source, target, fundClass, subAccount), winner in index.items():
+        rows.append({'Date' : date, 'Source name' : source, 'Target name' : target, nameHier["FundClass"]["dynLow"] : fundClass,
+                     'InvestsThrough' : subAccount, 'Balancetype' : winner.get('Balancetype'),
+                     nameHier["Value"]["dynLow"] : winner.get(nameHier["Value"]["dynLow"]), 'positionKey' : accountBalanceKey(winner),
+                     'overrides' : ';'.join(accountBalanceKey(records[rowId]) for rowId in winner.overrides)})
+    return rows
+
+def uniqueBalances(*caches : dict):
+    #each balance is one record filed under every month it belongs to, so the month lists are merged by identity
+    unique = {}
+    for byMonth in caches:
+        for rows in byMonth.values():
+            for row in rows:
+                unique[id(row)] = row
+    return list(unique.values())
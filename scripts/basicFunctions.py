@@ -1,11 +1,9 @@
 from classes import nodeLibrary
-import traceback
-import queue
-from datetime import datetime
 import pyxirr
 from collections import deque, defaultdict
-from scripts.commonValues import fullPortAggCols, fullPortStr, maxRecursion, nameHier, nodePathSplitter, balanceTypePriority, smallHeaders, textCols
+from scripts.commonValues import fullPortAggCols, fullPortStr, maxRecursion, nameHier, nodePathSplitter, smallHeaders, textCols
 from scripts.instantiate_basics import gui_queue, APIexecutor
+from scripts.calcLog import logEvent
 import re
 
 defaults = {'nodePath' : 'TEXT'}
@@ -52,50 +50,12 @@ def nodalToLinkedCalculations(calcs, nodePath : list[int] = None):
     return calcs
 
 def handleFundClasses(entryList):
-    split = {}
-    foundDuplicate = False
-    for entry in entryList: #split the entries by fundclass to check for duplicates
-        fundSubKey = ""
-        fundClass = entry.get(nameHier["FundClass"]["dynLow"])
-        subAccount = entry.get('InvestsThrough')
-        for key in (fundClass, subAccount):
-            if key is not None:
-                fundSubKey += key
-        if fundSubKey not in split:
-            split[fundSubKey] = [entry,]
-        else:
-            split[fundSubKey].append(entry)
-            foundDuplicate = True
-    singleEntries = []
-    if foundDuplicate: #if duplicates, loop through to find the best balance type
-        for fundSubKey in split: #loop by fund
-            if len(split.get(fundSubKey)) > 1: #check if duplicates
-                foundType = False
-                for balanceType in balanceTypePriority: #loop through balance types by priority
-                    for entry in split.get(fundSubKey): #loop through the duplicate entries
-                        if entry.get("Balancetype") == balanceType and entry.get(nameHier["Value"]["dynLow"]) not in (None,"None"): #if the balance type is preferred, add the entry and break
-                            singleEntries.append(entry)
-                            foundType = True
-                            break
-                    if foundType: #stop balance type checking if found
-                        break
-                if not foundType: #reaches if nothing was found
-                    for entry in split.get(fundSubKey): #loop through to find the first with a value
-                        if entry.get(nameHier["Value"]["dynLow"]) not in (None,"None"): #if the balance type is preferred, add the entry and break
-                            singleEntries.append(entry)
-                            foundType = True
-                            break
-                    if not foundType: #final attempt take first entry
-                        singleEntries.append(split.get(fundSubKey)[0])
-            else: #no duplicates for this fund
-                singleEntries.append(split.get(fundSubKey)[0])
-    else:
-        singleEntries.extend(entryList)
-    tempNAV = 0
-    for entry in singleEntries:
-        if entry.get(nameHier["Value"]["dynLow"]) not in (None,0,"None"):
-            tempNAV += float(entry.get(nameHier["Value"]["dynLow"])) #adds values to the first index
-    entryList[0][nameHier["Value"]["dynLow"]] = str(tempNAV)
+    #sums the fund class and sub-account balances of one investment into the first entry. The entries are the effective balances (scripts.balanceResolver)
+    tempNAV = 0.0
+    for entry in entryList:
+        if entry.get(nameHier["Value"]["dynLow"]) not in (None,0):
+            tempNAV += entry.get(nameHier["Value"]["dynLow"]) #adds values to the first index
+    entryList[0][nameHier["Value"]["dynLow"]] = tempNAV
     return entryList
 
 def get_connected_node_groups(nodePaths):
@@ -185,7 +145,8 @@ def recursLinkCalcs(baseCalcs, monthDT, nodeLvl : int, node :str, currPath: list
                 
 
 
-def calculate_xirr(cash_flows, dates, guess : float = None):
+def calculate_xirr(cash_flows, dates, guess : float = None, label : str = None):
+    #label names the fund in failure events and their counters
     try:
         if cash_flows[-1] == 0:
             #indicates closed fund. Remove the NAV as the cashflows should show the fund emptying
@@ -202,13 +163,13 @@ def calculate_xirr(cash_flows, dates, guess : float = None):
         else:
             return None
     except pyxirr.InvalidPaymentsError as e:
-        print(f"Skipping XIRR calculation due to InvalidPaymentsError: {e} \n Cash flows: {cash_flows} \n Dates: {dates}")
+        logEvent('xirrInvalidPayments', f"Skipping XIRR calculation: {e}", subject = label, cashFlows = cash_flows, dates = dates)
         return None
     except RuntimeWarning as e:
         #print(f"Skipping XIRR calculation due to RuntimeWarning: {e}")
         return None
     except Exception as e:
-        print(f"Skipping XIRR calculation due to Exception: {e} \n Cash flows: {cash_flows} \n Dates: {dates}")
+        logEvent('xirrError', f"Skipping XIRR calculation: {e}", subject = label, cashFlows = cash_flows, dates = dates)
         return None
 def descendingNavSort(input : dict):
     return sorted(input.keys(), key=lambda x: float(input.get(x,0.0)) * -1)
@@ -221,6 +182,29 @@ def separateRowCode(label):
         header = re.sub(r'##\(.*\)##', '', label, flags=re.DOTALL)
         code = re.findall(r'##\(.*\)##', label, flags=re.DOTALL)[0]
         return header, code
+def setViewFilter(view : dict, key : str, choices : list):
+    #same as checking the choices in the filter box: choices that are not options of the box are left out
+    view['filters'][key] = [choice for choice in choices if choice in view['options'][key]]
+def rowColorDepths(rows : dict):
+    #shading of each table row from 0 to 1 by how deep its code nests. Sections above the funds are shaded all the way down
+    colorDepths = [separateRowCode(rowKey)[1].count("::") for rowKey in rows]
+    maxDepth = max(colorDepths, default = 0)
+    fundsPresent = any(row['dataType'] == 'Total Target name' for row in rows.values())
+    trackIdx = 0
+    trackDepth = 0
+    for i in range(len(colorDepths)):
+        d = colorDepths[i]
+        if trackDepth < d: #further depth
+            trackIdx = i
+            trackDepth = d
+        if fundsPresent and (trackDepth > d or i == len(colorDepths) - 1) and d != maxDepth: #back up  from depth or the end, but did not go full depth
+            if i == len(colorDepths) - 1:
+                i += 1
+            colorDepths[trackIdx:i] = [maxDepth] * (i-trackIdx) #set the depth for low section all the way down
+        trackDepth = d
+    if not fundsPresent:
+        maxDepth += 1 #if funds are off, don't allow upper sorts to be white
+    return [c/maxDepth for c in colorDepths] if maxDepth != 0 else colorDepths
 
 def accountBalanceKey(accEntry : dict):
     try:
@@ -231,6 +215,17 @@ def accountBalanceKey(accEntry : dict):
         print(f"Failed for entry: {accEntry}")
         raise
     return key
+def transactionKey(tranEntry : dict):
+    #transactions have no id after import, so the identity is the transaction's imported content. The commitment and unfunded
+    #values the calculations fill in are left out so a recalculation keeps the key. Exact duplicates are numbered by the caller
+    try:
+        key = tranEntry["Date"] + "_" + str(tranEntry["Source name"]) + "_" + str(tranEntry["Target name"])
+        for tranField in ("TransactionType", nameHier["Transaction Time"]["dynLow"], nameHier["CashFlow"]["dynLow"]):
+            key += "_" + (str(tranEntry.get(tranField)) if tranEntry.get(tranField) is not None else "")
+    except:
+        print(f"Failed for entry: {tranEntry}")
+        raise
+    return key
 def annualizeITD(cumITD, monthCount):
     if monthCount < 12: #ITD for less than a year is essentially YTD style
         return (cumITD - 1) * 100
@@ -241,13 +236,13 @@ def annualizeITD(cumITD, monthCount):
 
 def calculateBackdate(transaction,noStartValue = False):
     time = transaction.get(nameHier["Transaction Time"]["dynLow"])
-    monthDay = datetime.strptime(transaction.get("Date"), "%Y-%m-%dT%H:%M:%S").day
+    monthDay = transaction.dateParts.day
     if noStartValue:
-        if time not in (None,"None") and time.lower() == "end of day":
+        if time is not None and time.lower() == "end of day":
             backDate = 0 #"no start value and end of day"
         else:
             backDate = 1 #"no start value and not end of day"
-    elif time in (None,"None"):
+    elif time is None:
         if monthDay == 1:
             backDate = 1 #"First day of month"
         else:
@@ -284,17 +279,8 @@ def updateStatus(self, pool,totalLoops, status = "Working"):
     return failure
 
 def poll_queue():
-    try:
-        while True:
-            callback = gui_queue.get_nowait()
-            if callback:
-                try:
-                    callback()  # Run the GUI update in the main thread
-                except Exception as e:
-                    trace = traceback.format_exc()
-                    print(f"Error occured while attempting to run background gui update: {e}. \n traceback: \n {trace}")
-    except queue.Empty:
-        pass
+    #runs every pending background gui update. The app is woken by the dispatcher itself, this is for callers without an attached dispatcher
+    gui_queue.drain()
 
 def handleDuplicateFields(rows, fields):
     #adds spaces to any fields with duplicate values so the values will not point back to the same field
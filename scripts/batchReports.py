@@ -0,0 +1,68 @@
+import os
+import re
+import time
+from datetime import datetime
+
+from scripts.basicFunctions import findSourceName
+from scripts import pdf_generator
+from scripts.render_report import render_report
+from scripts.reportWorkbooks import benchmarksFrame, snapshotFlows
+
+def reportJobs(db, source : str, selections : list[str], separate : bool = True):
+    """
+    Splits a report export selection into jobs of {'name', 'investors'}.
+    With separate each selected family branch or investor gets its own report, otherwise the selection is one combined report.
+    """
+    if source == 'Full Portfolio':
+        return [{'name' : findSourceName([],[]), 'investors' : list(selections)}]
+    elif source == 'Select by Family Branch':
+        if not separate:
+            return [{'name' : findSourceName(selections,[]), 'investors' : db.pullInvestorsFromFamilies(selections)}]
+        return [{'name' : fam, 'investors' : db.pullInvestorsFromFamilies([fam])} for fam in selections]
+    elif source == 'Select by Investor':
+        if not separate:
+            return [{'name' : findSourceName([],selections), 'investors' : list(selections)}]
+        return [{'name' : inv, 'investors' : [inv]} for inv in selections]
+    raise ValueError('Error: Button Selection could not be connected to options')
+
+def prefetchReportData(db, jobs : list[dict], asOfDate : datetime):
+    """
+    Pulls the snapshot inputs for every job up front: assets and flows from the monthly totals for each job's investors,
+    and the sports, summary and world markets benchmark rows with one query each instead of one set per report.
+    """
+    investors = sorted(set(inv for job in jobs for inv in job['investors']))
+    month = datetime.strftime(asOfDate,'%B %Y')
+    flows = {job['name'] : snapshotFlows(db, job['investors'], asOfDate) for job in jobs}
+    investorSportsData = []
+    if investors:
+        placeholders = ','.join('?' for _ in investors)
+        investorSportsData = db.loadFromDB('investorSportsData', f' WHERE month = ? AND investor IN ({placeholders})', inputs = (month,*investors))
+    sportsData = db.loadFromDB('sportsData',condStatement = ' WHERE month = ?', inputs = (month,))
+    summary = db.loadFromDB('paragraphInputs',condStatement = ' WHERE month = ? AND section = ? ORDER BY lineNum',inputs = (month,'reportSummary'))
+    return {'flows' : flows, 'sports' : (sportsData, investorSportsData), 'summary' : summary, 'benchmarks' : benchmarksFrame(db, asOfDate)}
+
+def reportFileName(name : str, asOfDate : datetime):
+    return re.sub(r'[\\/:*?"<>|]', '_', name) + f" {datetime.strftime(asOfDate,'%B %Y')}.pdf"
+
+def initReportWorker(assetsDir : str):
+    #runs once per pool process. Fonts register when pdf_generator is imported, the logos are read into memory here for every report the worker renders
+    pdf_generator.preloadAssets(assetsDir)
+
+def renderReportJob(name : str, outPath : str, renderArgs : dict):
+    #pool task: renders one report and times it inside the worker
+    start = time.perf_counter()
+    try:
+        path = render_report(outPath, openAfter = False, **renderArgs)
+        error = None if path else 'PDF build failed'
+    except Exception as e:
+        path, error = None, str(e)
+    return {'name' : name, 'path' : str(path) if path else None, 'renderSeconds' : time.perf_counter() - start, 'error' : error}
+
+def timingSummary(results : list[dict], wallSeconds : float):
+    lines = []
+    for r in results:
+        status = os.path.basename(r['path']) if r.get('path') else f"FAILED ({r.get('error')})"
+        lines.append(f"{r['name']}: prep {r.get('prepSeconds',0.0):.1f}s, render {r.get('renderSeconds',0.0):.1f}s - {status}")
+    done = sum(1 for r in results if r.get('path'))
+    lines.append(f"{done}/{len(results)} reports in {wallSeconds:.1f}s")
+    return '\n'.join(lines)
@@ -0,0 +1,168 @@
+import logging
+import logging.handlers
+import threading
+import time
+from collections import Counter
+
+from scripts.commonValues import logBurst, logFieldChars, logSummaryTop, logWindowSecs
+
+#Structured events for the calculation hot loops. Every event is counted by (kind, subject), but only the first logBurst of
+#a kind in each logWindowSecs are printed, so a bad fund repeated over hundreds of months costs one line plus a counter.
+#Worker processes send their printed events, their counters and their run metric spans to the parent through a queue.
+#The parent prints one summary of all counters at the end of each run.
+calcLogger = logging.getLogger('calc')
+calcLogger.propagate = False
+calcLogger.setLevel(logging.INFO)
+
+_lock = threading.Lock()
+_counts = Counter() #(kind, subject) : events, printed or not
+_suppressed = Counter() #kind : events only counted
+_windows = {} #kind : [windowStart, printed in window]
+_listener = None
+_runStart = None
+
+def _short(value):
+    text = repr(value)
+    if len(text) > logFieldChars:
+        size = f" ({len(value)} items)" if isinstance(value, (list, tuple)) else ''
+        text = text[:logFieldChars] + '...' + size
+    return text
+
+class eventFormatter(logging.Formatter):
+    #[kind subject] message | field=value, ... with long fields cut to logFieldChars
+    def formatMessage(self, record):
+        text = record.message
+        kind = getattr(record, 'kind', None)
+        if kind:
+            subject = getattr(record, 'subject', None)
+            text = f"[{kind}{f' {subject}' if subject is not None else ''}] {text}"
+            if record.processName != 'MainProcess':
+                text = f"({record.processName}) {text}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += ' | ' + ', '.join(f"{key}={_short(val)}" for key, val in fields.items())
+        return text
+
+class eventCollector(logging.Handler):
+    #parent side. Prints events from this process and from workers and merges worker counters into the run totals
+    def emit(self, record):
+        span = getattr(record, 'span', None)
+        if span is not None: #worker stage timing, see scripts.runMetrics
+            from scripts.runMetrics import addSpan
+            addSpan(span)
+            return
+        counts = getattr(record, 'counts', None)
+        if counts is not None:
+            with _lock:
+                _counts.update(counts)
+                _suppressed.update(record.suppressed)
+            return
+        try:
+            print(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+class workerQueueHandler(logging.handlers.QueueHandler):
+    #the record crosses the process boundary already formatted, so the fields are not pickled
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.kind = None
+        record.fields = None
+        return record
+
+_collector = eventCollector()
+_collector.setFormatter(eventFormatter())
+calcLogger.addHandler(_collector)
+
+def logEvent(kind : str, message : str, subject = None, level : int = logging.WARNING, exc_info : bool = False, **fields):
+    """
+    Counts one event under (kind, subject) and prints it unless logBurst events of this kind were already printed in the
+    current window. fields are formatted only when the event is printed, so pass raw values rather than building strings.
+    exc_info attaches the current traceback to printed events only.
+    """
+    now = time.monotonic()
+    with _lock:
+        _counts[(kind, subject)] += 1
+        window = _windows.get(kind)
+        if window is None or now - window[0] >= logWindowSecs:
+            window = _windows[kind] = [now, 0]
+        if window[1] >= logBurst:
+            _suppressed[kind] += 1
+            return
+        window[1] += 1
+    calcLogger.log(level, message, exc_info = exc_info, extra = {'kind' : kind, 'subject' : subject, 'fields' : fields})
+
+def _reset():
+    with _lock:
+        _counts.clear()
+        _suppressed.clear()
+        _windows.clear()
+
+def initWorkerLogging(logQueue):
+    """Pool initializer. Worker events go to the parent through logQueue instead of each process printing on its own"""
+    _reset() #forked workers start with a copy of the parent's counters
+    calcLogger.handlers = [workerQueueHandler(logQueue)]
+    calcLogger.handlers[0].setFormatter(eventFormatter())
+
+def flushWorkerCounts():
+    #worker side, at the end of each task. Sends the counters gathered since the last flush as one record
+    with _lock:
+        if not _counts and not _suppressed:
+            return
+        counts, suppressed = dict(_counts), dict(_suppressed)
+        _counts.clear()
+        _suppressed.clear()
+    calcLogger.info('counts', extra = {'counts' : counts, 'suppressed' : suppressed})
+
+def startRun():
+    """Parent side, when an import starts. Clears the counters of the previous run"""
+    global _runStart
+    stopWorkerListener()
+    _reset()
+    _runStart = time.perf_counter()
+
+def startWorkerListener(logQueue):
+    #parent side, once the worker pool's manager queue exists
+    global _listener
+    stopWorkerListener()
+    _listener = logging.handlers.QueueListener(logQueue, _collector)
+    _listener.start()
+
+def stopWorkerListener():
+    #handles everything already queued before returning
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception as e:
+            print(f"Failed to stop the worker log listener: {e}")
+        _listener = None
+
+def runSummary(title : str = 'Run'):
+    with _lock:
+        counts = Counter(_counts)
+        suppressed = Counter(_suppressed)
+    byKind = {}
+    for (kind, subject), count in counts.items():
+        byKind.setdefault(kind, []).append((subject, count))
+    elapsed = f" after {time.perf_counter() - _runStart:.1f}s" if _runStart is not None else ''
+    if not byKind:
+        return f"{title} log summary{elapsed}: no events"
+    lines = [f"{title} log summary{elapsed}:"]
+    for kind, subjects in sorted(byKind.items(), key = lambda item: -sum(count for _, count in item[1])):
+        total = sum(count for _, count in subjects)
+        lines.append(f"  {kind}: {total} events, {suppressed[kind]} not printed")
+        named = sorted((item for item in subjects if item[0] is not None), key = lambda item: -item[1])
+        for subject, count in named[:logSummaryTop]:
+            lines.append(f"    {count} for {subject}")
+        if len(named) > logSummaryTop:
+            lines.append(f"    ...and {len(named) - logSummaryTop} more")
+    return '\n'.join(lines)
+
+def endRun(title : str = 'Calculation run'):
+    """Parent side, when a run finishes or fails. Drains the worker queue, then prints and logs the summary"""
+    stopWorkerListener()
+    summary = runSummary(title)
+    print(summary)
+    logging.info(summary)
+    return summary
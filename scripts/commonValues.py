@@ -48,7 +48,12 @@ textCols = ('Last Actual Date', 'Inception')
 nonDefaultHeaders = ["Return", "Ownership", "MDdenominator", "Monthly Gain", 'DPI', 'TVPI', 'Inception', 'Last Actual Date', 'Redemptions','Distributions','Contributions']
 headerSortExclusions = ['Return']
 mainTableNames = ["positions", "transactions"]
+#unique key column of the main tables so calculation results are upserted by diff instead of rewritten
+dynRowKeyCol = "rowKey"
 nodePathSplitter = " > "
+#Sort hierarchies pre-aggregated after each calculation so unfiltered table builds skip live aggregation
+aggregateCubeHierarchies = [["assetClass","subAssetClass"], ["assetClass","subAssetClass","subAssetSleeve"],
+                            [nameHier["Family Branch"]["local"],"assetClass","subAssetClass"], [nameHier["Family Branch"]["local"],"assetClass","subAssetClass","subAssetSleeve"]]
 #Default asset class sort orders
 assetClass1Order = ["Illiquid", "Liquid","Cash"]
 assetClass2Order = ["Direct Private Equity", "Private Equity", "Direct Real Assets", "Real Assets", "Public Equity", "Long/Short", "Absolute Return", "Fixed Income", "Cash"] 
@@ -98,6 +103,8 @@ for header in ("Return","Ownership"):
     percent_headers.add(header)
 
 batch_size = 50000
+dbReaderConnections = 4 #read-only sqlite connections next to the single writer
+startupDeferredModules = ('pandas','matplotlib','reportlab','openpyxl','pyarrow','dash','plotly','pyodbc') #load on first use, never before the first window paints
 #PDF Generation values ----------
 shrinkPDFthreshold = 13
 maxPDFheaderUnits = 22
@@ -106,6 +113,20 @@ minimumFontSize = 6
 maxRowsPerPage = 30
 maxRowPadding = 1.5
 minRowPadding = 0.5
+chartCacheMaxMB = 64 #on disk cache of rendered report charts
+chartCacheMinAgeSecs = 600 #charts used more recently than this are never evicted so a running batch keeps its files
+tableSnapshotsKept = 8 #returns table snapshots kept for warm starts, one per control configuration
+prefetchTopViews = 5 #most used filter combinations aggregated after each import, after the saved configurations
+prefetchUsageKept = 50 #distinct filter combinations counted in assets/viewUsage.json
+prefetchCpuShare = 0.5 #the prefetcher sleeps between views so it keeps to this share of one core
+prefetchMaxSeconds = 300 #prefetch work per import before it stops
+prefetchMaxRows = 500000 #aggregated rows held across prefetched views
+logBurst = 5 #events of one kind printed per logWindowSecs. The rest are only counted for the run summary
+logWindowSecs = 60
+logFieldChars = 200 #longest printed value of an event field, such as a list of cash flows
+logSummaryTop = 5 #subjects listed per event kind in the run summary
+runMetricsKept = 60 #import runs whose stage timings stay in the runMetrics table
+runTracesKept = 10 #Chrome trace files of recent runs in assets/runTraces
 
 if remoteDBmode:
     sqlPlaceholder = "%s"
@@ -113,6 +134,6 @@ else:
     sqlPlaceholder = "?"
 
 #Report Data
-from reportlab.lib.units import inch
+inch = 72.0 #reportlab's inch in points, kept here so startup does not import reportlab
 snapshotColWidths = [2.5 * inch, 4.2 * inch,  3.3 * inch]
 defaultSports = ['Browns','Bucks','Bucks Loan','Crew','Predators','Other']
\ No newline at end of file
@@ -0,0 +1,143 @@
+import os
+from copy import copy
+from itertools import chain, islice
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, PatternFill, Font, Alignment
+from openpyxl.utils import get_column_letter
+from scripts.commonValues import percent_headers
+
+numberFormat = "#,##0.00"
+percentFormat = "0.00%"
+
+def uniqueSheetName(wb, base_name = "Export"):
+    i = 1
+    while f"{base_name}{i}" in wb.sheetnames:
+        i += 1
+    return f"{base_name}{i}"
+
+def darken_color(hex_color, factor=0.01):
+    #darkens a 6-digit hex color by a given factor
+    h = hex_color.strip("#")
+    r = int(h[0:2], 16)
+    g = int(h[2:4], 16)
+    b = int(h[4:6], 16)
+    dr = max(0, int(r * factor))
+    dg = max(0, int(g * factor))
+    db = max(0, int(b * factor))
+    return f"{dr:02X}{dg:02X}{db:02X}"
+
+class excelExportEngine:
+    """
+    Streams rows into one xlsx sheet.
+    A new file is written with a write-only workbook so rows go straight out instead of every cell being held in memory.
+    An existing file gets a new ExportN sheet in the normal workbook since write-only workbooks cannot be reopened.
+    Formats are named styles registered once per distinct fill/font/format/alignment and shared by every cell using them.
+    progress(rowsWritten, total) is called every progressEvery rows and once at the end.
+    """
+    def __init__(self, path : str, progress = None, progressEvery : int = 2000):
+        self.path = path
+        self.progress = progress
+        self.progressEvery = progressEvery
+        self.rowsWritten = 0
+        self._styles = {}
+        self._styleArrays = {}
+        if os.path.exists(path):
+            self.wb = load_workbook(path)
+            self.ws = self.wb.create_sheet(uniqueSheetName(self.wb))
+        else:
+            self.wb = Workbook(write_only = True)
+            self.ws = self.wb.create_sheet()
+        self._styleNames = set(self.wb.named_styles)
+
+    def style(self, fill : str = None, bold : bool = False, color : str = None, numFormat : str = None, indent : int = 0, wrap : bool = False):
+        """Returns the named style for this combination, registering it with the workbook the first time it is used."""
+        key = (fill, bold, color, numFormat, indent, wrap)
+        name = self._styles.get(key)
+        if name is None:
+            #deterministic name so a sheet added to an earlier export reuses its styles
+            name = f"export {fill or '-'} {int(bold)} {color or '-'} {numFormat or '-'} {indent} {int(wrap)}"
+            if name not in self._styleNames:
+                namedStyle = NamedStyle(name = name)
+                if fill:
+                    namedStyle.fill = PatternFill("solid", fill, fill)
+                if bold or color:
+                    namedStyle.font = Font(bold = bold, color = color)
+                if numFormat:
+                    namedStyle.number_format = numFormat
+                if indent or wrap:
+                    namedStyle.alignment = Alignment(indent = indent, wrap_text = wrap)
+                self.wb.add_named_style(namedStyle)
+                self._styleNames.add(name)
+            self._styles[key] = name
+        return name
+
+    def cell(self, value, style : str = None):
+        cell = WriteOnlyCell(self.ws, value)
+        if style:
+            proto = self._styleArrays.get(style)
+            if proto is None: #resolve the named style once, later cells copy the resulting style ids
+                cell.style = style
+                self._styleArrays[style] = copy(cell._style)
+            else:
+                cell._style = copy(proto)
+        return cell
+
+    def valueCell(self, colname, val, fill : str = None, color : str = None):
+        #numbers get the comma format, percent headers are stored as fractions (10.5 -> 10.5%)
+        if isinstance(val, (int, float)):
+            if colname not in percent_headers:
+                return self.cell(val, self.style(fill, color = color, numFormat = numberFormat))
+            return self.cell(val / 100.0, self.style(fill, color = color, numFormat = percentFormat))
+        return self.cell(val, self.style(fill, color = color) if fill or color else None)
+
+    def freeze(self, cellRef : str):
+        #write-only sheets need this before the first row
+        self.ws.freeze_panes = cellRef
+
+    def writeRows(self, rows, total : int = None, widthSample : int = 1000):
+        """
+        Writes rows (lists of cells or plain values, None for an empty cell) from any iterable.
+        The first widthSample rows are held back to size the columns, as write-only sheets need widths before any row is written.
+        """
+        rows = iter(rows)
+        head = list(islice(rows, widthSample))
+        widths = {}
+        for row in head:
+            for idx, item in enumerate(row, start = 1):
+                val = item.value if hasattr(item, 'value') else item
+                widths[idx] = max(widths.get(idx, 0), len(str(val)) if val is not None else 0)
+        for idx, width in widths.items():
+            self.ws.column_dimensions[get_column_letter(idx)].width = width + 2
+        for row in chain(head, rows):
+            self.ws.append(row)
+            self.rowsWritten += 1
+            if self.progress and self.rowsWritten % self.progressEvery == 0:
+                self.progress(self.rowsWritten, total)
+        if self.progress:
+            self.progress(self.rowsWritten, total)
+
+    def save(self):
+        self.wb.save(self.path)
+        return self.path
+
+def exportRows(path : str, columns : list[str], rows, coerceNumbers : bool = False, formatNumbers : bool = True, total : int = None, progress = None):
+    """
+    Writes a header row and one row per value sequence (ordered as columns) to path.
+    coerceNumbers turns numeric strings into floats first, as the table window exports always have.
+    """
+    engine = excelExportEngine(path, progress = progress)
+    def cells():
+        yield list(columns)
+        for row in rows:
+            out = []
+            for colname, val in zip(columns, row):
+                if coerceNumbers:
+                    try: #make numerical format if possible
+                        val = float(val)
+                    except:
+                        pass
+                out.append(engine.valueCell(colname, val) if formatNumbers else val)
+            yield out
+    engine.writeRows(cells(), total = total + 1 if total is not None else None)
+    return engine.save()
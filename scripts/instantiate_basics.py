@@ -2,9 +2,9 @@ import sys
 import os
 import logging
 import warnings
-import queue
 from concurrent.futures import ThreadPoolExecutor
 from scripts.commonValues import databaseName
+from classes.guiDispatcher import guiDispatcher
 
 # Initialize module-level globals (will be set by instantiate_basics function)
 ASSETS_DIR = None
@@ -37,7 +37,7 @@ def instantiate_basics(BASE_DIR):
 
     executor = ThreadPoolExecutor()
     APIexecutor = ThreadPoolExecutor(max_workers=4) #limits overcalling
-    gui_queue = queue.Queue()
+    gui_queue = guiDispatcher() #attached to the Qt event loop in calculateReturns
 
     logging.basicConfig(
         level=logging.INFO,
@@ -8,8 +8,21 @@ def log_exceptions(method):
             logging.exception(f"Error in {method.__qualname__}: {e}")
             raise  # Re-raise the exception after logging
     return wrapper
-def attach_logging_to_class(cls):
-    for attr_name, attr_value in cls.__dict__.items():
-        if callable(attr_value):  # Only wrap methods
-            setattr(cls, attr_name, log_exceptions(attr_value))
-    return cls
\ No newline at end of file
+def attach_logging_to_class(cls = None, *, include : set[str] = None, exclude : set[str] = ()):
+    """
+    Wraps the methods of a class with log_exceptions.
+    Usable bare (@attach_logging_to_class wraps every method) or with an explicit opt-in set
+    (@attach_logging_to_class(include = {...})) so hot paths like Qt model data() calls stay unwrapped.
+    """
+    def attach(cls):
+        for attr_name, attr_value in list(cls.__dict__.items()):
+            if include is not None and attr_name not in include:
+                continue
+            if attr_name in exclude:
+                continue
+            if callable(attr_value):  # Only wrap methods
+                setattr(cls, attr_name, log_exceptions(attr_value))
+        return cls
+    if cls is None: #called with options
+        return attach
+    return attach(cls)
@@ -0,0 +1,93 @@
+import calendar
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+
+from scripts.calcLog import logEvent
+from scripts.commonValues import nameHier
+
+#Ingestion normalization. pullData normalizes the imported positions and transactions once, before they are compared with the
+#database: "None" strings become None, numeric columns become floats and dates use the "%Y-%m-%dT%H:%M:%S" form.
+#Each distinct date string is parsed once into dateParts. Engine records carry those parts and months carry their bounds as
+#day ordinals, so the calculations compare integers and file rows by month index instead of parsing strings in their loops.
+dateParts = namedtuple('dateParts', ('ordinal', 'monthIdx', 'day', 'monthEnd'))
+
+numericColumns = {'positions' : (nameHier["Value"]["dynLow"], nameHier["Commitment"]["local"], nameHier["Unfunded"]["local"],
+                                  'Contributions', 'Distributions', 'Redemptions'),
+                  'transactions' : (nameHier["CashFlow"]["dynLow"], nameHier["Unfunded"]["dynLow"], nameHier["Commitment"]["dynLow"])}
+
+@lru_cache(maxsize = 16384)
+def isoDateParts(text : str):
+    #'2024-03-31T00:00:00' -> day ordinal, month index (year * 12 + month - 1), day of month and whether it is the month's last day
+    year, month, day = int(text[:4]), int(text[5:7]), int(text[8:10])
+    return dateParts(datetime(year, month, day).toordinal(), year * 12 + month - 1, day, day == calendar.monthrange(year, month)[1])
+
+def partsDateTime(parts : dateParts):
+    return datetime.fromordinal(parts.ordinal)
+
+@lru_cache(maxsize = 4096)
+def calcDateTime(text : str):
+    #calculation rows store their month as '%Y-%m-%d %H:%M:%S'. Table builds parse each distinct month once
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S")
+
+def normalizeRows(table : str, rows : list[dict]):
+    """
+    Normalizes imported positions or transactions in place. Returns the rows with a readable date. The others are counted
+    under badDate and dropped, as neither the comparison with the database nor the calculations can place them in a month.
+    """
+    numeric = numericColumns.get(table, ())
+    kept = []
+    for row in rows:
+        for key, val in row.items():
+            if val == 'None':
+                row[key] = None
+        for column in numeric:
+            val = row.get(column)
+            if val is None or type(val) is float:
+                continue
+            if val == '':
+                row[column] = None
+                continue
+            try:
+                row[column] = float(val)
+            except (TypeError, ValueError):
+                logEvent('badNumber', f"Non-numeric {column} left as imported", subject = table, value = val)
+        date = row.get('Date')
+        if not isinstance(date, str):
+            logEvent('badDate', "Row has no date", subject = table, row = row)
+            continue
+        if ' ' in date:
+            date = row['Date'] = date.replace(' ', 'T')
+        try:
+            isoDateParts(date)
+        except ValueError:
+            logEvent('badDate', f"Unreadable date {date}", subject = table, row = row)
+            continue
+        kept.append(row)
+    return kept
+
+def monthOrdinals(months : list[dict]):
+    """Adds each month's bounds as day ordinals, its month index, day count and end datetime. Returns {month index : month}"""
+    monthsByIdx = {}
+    for month in months:
+        tranStart, endDay = isoDateParts(month["tranStart"]), isoDateParts(month["endDay"])
+        month['tranStartOrdinal'] = tranStart.ordinal
+        month['accountStartOrdinal'] = isoDateParts(month["accountStart"]).ordinal
+        month['endOrdinal'] = endDay.ordinal
+        month['monthIdx'] = endDay.monthIdx
+        month['days'] = endDay.day - tranStart.day + 1
+        month['endDate'] = partsDateTime(endDay)
+        monthsByIdx[endDay.monthIdx] = month
+    return monthsByIdx
+
+def rowMonths(parts : dateParts, monthsByIdx : dict, positions : bool):
+    #months a row belongs in. Transactions fall in their own month. A position at a month end is also the next month's start balance
+    found = []
+    month = monthsByIdx.get(parts.monthIdx)
+    if month is not None:
+        found.append(month)
+    if positions and parts.monthEnd:
+        month = monthsByIdx.get(parts.monthIdx + 1)
+        if month is not None:
+            found.append(month)
+    return found
@@ -19,6 +19,7 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.colors import HexColor, blue
 import pandas as pd
 from pathlib import Path
+import io
 import os
 from typing import List, Dict, Optional, Tuple
 
@@ -36,6 +37,24 @@ pdfmetrics.registerFont(TTFont('Tahoma', 'Tahoma.ttf'))
 pdfmetrics.registerFont(TTFont('Tahoma-Bold', 'TahomaBd.ttf'))
 pdfmetrics.registerFont(TTFont('Tahoma-bold', 'TahomaBd.ttf'))
 
+_assetBytes = {} #image bytes read once per process so batch report workers do not reread logos for every report
+def preloadAssets(assets_dir):
+    for rel in (('images', 'HFlogo.png'), ('jpm logo.png',), ('logo.png',)):
+        assetImageBytes(Path(assets_dir).joinpath(*rel))
+def assetImageBytes(path):
+    path = str(path)
+    if path not in _assetBytes:
+        if not os.path.exists(path):
+            return None
+        _assetBytes[path] = Path(path).read_bytes()
+    return _assetBytes[path]
+def assetImage(path, width, height):
+    #platypus Image from the cached bytes. None if the asset does not exist
+    data = assetImageBytes(path)
+    if data is None:
+        return None
+    return Image(io.BytesIO(data), width=width, height=height)
+
 
 
 
@@ -381,9 +400,8 @@ class PDFReportGenerator:
     def add_cover_page(self, title: str, subtitle: str, date: str):
         """Add cover page matching HTML template."""
         # Logo
-        logo_path = self.assets_dir/'images' / "HFlogo.png"
-        if logo_path.exists():
-            logo = Image(str(logo_path), width=1.5*inch, height=0.59*inch)
+        logo = assetImage(self.assets_dir/'images' / "HFlogo.png", width=1.5*inch, height=0.59*inch)
+        if logo is not None:
             logo.hAlign = 'RIGHT'
             self.story.append(logo)
         
@@ -776,7 +794,7 @@ class PDFReportGenerator:
                         val = -1 *  val
                 except:
                     pass
-                if (val and ((isinstance(val,float) and val < 0)) or ('bm' in header and val in (None,''))):
+                if (val and ((isinstance(val,float) and val < 0)) or (isinstance(row,dict) and 'bm' in header and val in (None,''))): #list rows have no column name to check
                     
                     table_style.add('TEXTCOLOR', (i,j + headerRows), (i,j + headerRows), colors.red)
         return table_style
@@ -1128,15 +1146,9 @@ class PDFReportGenerator:
     
     def add_benchmark_charts(self, chart_mtd_path: str = None, chart_1y_path: str = None):
         """Add benchmark charts side by side."""
-        if chart_mtd_path and Path(chart_mtd_path).exists():
-            img_mtd = Image(chart_mtd_path, width=CONTENT_WIDTH * 0.48, height=CONTENT_WIDTH * 0.4)
-        else:
-            img_mtd = None
-        
-        if chart_1y_path and Path(chart_1y_path).exists():
-            img_1y = Image(chart_1y_path, width=CONTENT_WIDTH * 0.48, height=CONTENT_WIDTH * 0.4)
-        else:
-            img_1y = None
+        #charts come from the content addressed chart cache so the bytes can be kept for later reports in the same process
+        img_mtd = assetImage(chart_mtd_path, width=CONTENT_WIDTH * 0.48, height=CONTENT_WIDTH * 0.4) if chart_mtd_path else None
+        img_1y = assetImage(chart_1y_path, width=CONTENT_WIDTH * 0.48, height=CONTENT_WIDTH * 0.4) if chart_1y_path else None
         
         if img_mtd or img_1y:
             chart_data = []
@@ -1161,18 +1173,16 @@ class PDFReportGenerator:
                       letters_of_credit: float = None, commentary_html: str = '', report_date: str = ''):
         """Add JPM LOC tables."""
         # Header with logos
-        jpm_logo_path = self.assets_dir / "jpm logo.png"
-        hf_logo_path = self.assets_dir / "logo.png"
+        jpm_logo = assetImage(self.assets_dir / "jpm logo.png", width=1.5*inch, height=1.0*inch)
+        hf_logo = assetImage(self.assets_dir / "logo.png", width=1.5*inch, height=1.2*inch)
         
         logo_cells = []
-        if jpm_logo_path.exists():
-            jpm_logo = Image(str(jpm_logo_path), width=1.5*inch, height=1.0*inch)
+        if jpm_logo is not None:
             logo_cells.append(jpm_logo)
         else:
             logo_cells.append(Spacer(1, 1.0*inch))
         
-        if hf_logo_path.exists():
-            hf_logo = Image(str(hf_logo_path), width=1.5*inch, height=1.2*inch)
+        if hf_logo is not None:
             logo_cells.append(hf_logo)
         else:
             logo_cells.append(Spacer(1, 1.2*inch))
@@ -1,8 +1,11 @@
 
 from collections import defaultdict
 from classes.nodeLibrary import nodeLibrary
-from scripts.basicFunctions import accountBalanceKey, fullPortfolioCalcs, nodalToLinkedCalculations, recursLinkCalcs
+from scripts.basicFunctions import fullPortfolioCalcs, nodalToLinkedCalculations, recursLinkCalcs
+from scripts.calcLog import flushWorkerCounts
+from scripts.runMetrics import span
 from scripts.commonValues import fullPortAggCols, fullPortStr
+from scripts.normalizeRows import rowMonths
 from scripts.processNode import processNode
 import traceback, logging
 
@@ -10,11 +13,12 @@ import traceback, logging
 def processClump(clumpData : list[dict],nodeLib : nodeLibrary, selfData : dict, statusQueue, _, failed, transactionCalc: bool = False):
     #function to take in the data for a full clump (group of nodes that are connected) and split the data for node processing
     # must run the nodes from the deepest level upwards, and port the updated account balances into the upper level nodes to properly adjust calculations
+    taskSpan = span('clump', clumpData[0]['name'] if clumpData else None, nodes = len(clumpData))
     try:
         deepestNode = max((nodeLib.nodePaths[nodeDict['name']]['lowestLevel'] for nodeDict in clumpData))
         clumpDataIdxs = {nodeDict['name'] : idx for idx, nodeDict in enumerate(clumpData)}
         nodeList = list(clumpDataIdxs.keys())
-        months = selfData['months']
+        monthsByIdx = {m['monthIdx'] : m for m in selfData['months']}
         linkedClumpCalculations = []
         clumpCalculations = []
         clumpCalculationsDict = {}
@@ -32,17 +36,13 @@ def processClump(clumpData : list[dict],nodeLib : nodeLibrary, selfData : dict,
                     linkedPosByMonth = {}
                     #all positions from the completed node that tie to the above node as the above node was the source
                     for row in (pos for pos in nodeDynTables.get('positions',[]) if pos['Source name'] == aboveName):
-                        for m in months: #find the month the account balance or transaction belongs in
-                            start = m["accountStart"]
-                            date = row.get("Date")
-                            if not (start <= date <= m["endDay"]):
-                                continue
+                        for m in rowMonths(row.dateParts, monthsByIdx, positions = True): #the months the account balance belongs in
                             linkedPosByMonth.setdefault(m["dateTime"], []).append(row)
                     aboveNodePosBelow  : dict[list[dict]] = clumpData[clumpDataIdxs[aboveName]]['cache']['positions_below'] #pull the below positions of the above node
                     for month in (aboveNodePosBelow or linkedPosByMonth):
-                        newPosBelowDict = {accountBalanceKey(entry) : entry for entry in linkedPosByMonth.get(month,[])} #set a dict to the edited entries of the below node
+                        newPosBelowDict = {id(entry) : entry for entry in linkedPosByMonth.get(month,[])} #the edited entries of the below node. Shared balances are the same record in both caches
                         for pos in aboveNodePosBelow.get(month,[]): #add in the below positions of the above node if they do not already exist from the below node
-                            newPosBelowDict.setdefault(accountBalanceKey(pos),pos) #TODO: check if this is safe w fund classes and multiple account balances. Don't want data deleted. Should likely be okay w balanceTypePriority as well since I overwrite them on above anyways
+                            newPosBelowDict.setdefault(id(pos),pos) #balances were resolved at import, so each slot has one record
                         clumpData[clumpDataIdxs[aboveName]]['cache']['positions_below'][month] = [entry for entry in newPosBelowDict.values()] #set their below positions to the proper 
                 if nodeLevel == 0: #if highest level, add above and below
                     clumpPositions.extend(nodeDynTables.get('positions',[]))
@@ -57,7 +57,7 @@ def processClump(clumpData : list[dict],nodeLib : nodeLibrary, selfData : dict,
                     #recursively link each nodes targets (targets don't include other nodes) up to the highest above for a full link 
                     linkedClumpCalculations.extend(recursLinkCalcs(baseCalcs, monthDT, nodeLevel ,node,[nodeLib.node2id[node],], nodeLib,clumpCalculationsDict))
         linkedClumpCalculations = fullPortfolioCalcs(linkedClumpCalculations)
-                
+        taskSpan.rows = len(linkedClumpCalculations)
         return linkedClumpCalculations, {'positions' : clumpPositions, 'transactions' : clumpTransactions}
     except Exception as e: #halt operations for failure or force close/cancel
         statusQueue.put(('DummyFail',99,"Failed"))
@@ -72,3 +72,6 @@ def processClump(clumpData : list[dict],nodeLib : nodeLibrary, selfData : dict,
         logging.error(e)
         print("\n")
         return [], {}
+    finally:
+        taskSpan.end()
+        flushWorkerCounts() #this clump's event counters go to the parent for the run summary
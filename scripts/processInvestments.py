@@ -1,10 +1,13 @@
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 import traceback
 import logging
 import copy
 from scripts.commonValues import contributionPhrases, distributionPhrases, nameHier, commitmentChangeTransactionTypes, mainTableNames
-from scripts.basicFunctions import fullPortfolioCalcs, handleFundClasses, calculateBackdate, calculate_xirr, nodalToLinkedCalculations, findSign, accountBalanceKey
+from scripts.calcLog import flushWorkerCounts, logEvent
+from scripts.runMetrics import span
+from classes.engineRecords import positionRecord
+from scripts.basicFunctions import fullPortfolioCalcs, handleFundClasses, calculateBackdate, calculate_xirr, nodalToLinkedCalculations, findSign
+from scripts.balanceResolver import uniqueBalances
 
 def processAboveBelow(newMonths,cache,node,failed,statusQueue):
     calculations = []
@@ -44,15 +47,15 @@ def processOneLevelInvestments(month, node, invSourceName, newMonths, cache, pos
     commitChangeTtypes = tranEffects.get('Commitment',[])
     posTableName = 'positions_below' if node == invSourceName else 'positions' #node vs non-nodal data
     tranTableName = 'transactions_below' if node == invSourceName else 'transactions' #node vs non-nodal data
-    totalDays = int(datetime.strptime(month["endDay"], "%Y-%m-%dT%H:%M:%S").day  - datetime.strptime(month["tranStart"], "%Y-%m-%dT%H:%M:%S").day) + 1 #total days in month for MD den
+    totalDays = month['days'] #total days in month for MD den
     for account in positions: #finds all fund starting and ending balances for the month
         investments.add(account["Target name"])
-        if account["Date"] == month["accountStart"]:
+        if account.dateParts.ordinal == month["accountStartOrdinal"]:
             if account["Target name"] not in startEntries:
                 startEntries[account["Target name"]] = [account,]
             else:
                 startEntries[account["Target name"]].append(account)
-        elif account["Date"] == month["endDay"]:
+        elif account.dateParts.ordinal == month["endOrdinal"]:
             if account["Target name"] not in endEntries:
                 endEntries[account["Target name"]] = [account,]
             else:
@@ -87,11 +90,12 @@ def processOneLevelInvestments(month, node, invSourceName, newMonths, cache, pos
             distributions = 0.0
             contributions = 0.0
         else: #instantiate starting data
-            commitment = float(startEntry[0].get(nameHier["Commitment"]["local"],0.0))
-            unfunded = float(startEntry[0].get(nameHier["Unfunded"]["local"],0.0))
-            distributions = float(startEntry[0].get('Distributions',0.0))
-            contributions = float(startEntry[0].get('Contributions',0.0))
-        if len(startEntry) > 1: #combines the values for fund sub classes for calculations
+            commitment = startEntry[0].get(nameHier["Commitment"]["local"],0.0)
+            unfunded = startEntry[0].get(nameHier["Unfunded"]["local"],0.0)
+            distributions = startEntry[0].get('Distributions',0.0)
+            contributions = startEntry[0].get('Contributions',0.0)
+        combinedStart = len(startEntry) > 1
+        if combinedStart: #combines the values for fund sub classes for calculations
             startEntry = handleFundClasses(startEntry)
         if len(endEntry) < 1: #no end account balance yet, so create it.  
             createFinalValue = True
@@ -99,7 +103,7 @@ def processOneLevelInvestments(month, node, invSourceName, newMonths, cache, pos
         if len(endEntry) > 1: #combine sub funds for calculations
             endEntry = handleFundClasses(endEntry)
         startEntry = startEntry[0]
-        if startEntry.get(nameHier["Value"]["dynLow"]) == 0:
+        if startEntry.get(nameHier["Value"]["dynLow"]) == 0 and not combinedStart: #a combined fund class balance always counts as a start value
             noStartValue = True
         endEntry = endEntry[0]
         targetTransactions = targetTransactionsDict.get(investment,[]) 
@@ -107,79 +111,77 @@ def processOneLevelInvestments(month, node, invSourceName, newMonths, cache, pos
         invWeightedCashFlow = 0
         if noStartValue: #if the fund was not activate at BOM, find the active days
             activeDays = 0
-            for transaction in (tran for tran in targetTransactions if tran[nameHier["CashFlow"]["dynLow"]] not in (None, "None",0.0)):
+            for transaction in (tran for tran in targetTransactions if tran[nameHier["CashFlow"]["dynLow"]] not in (None,0.0)):
                 backDate = calculateBackdate(transaction, noStartValue)
-                activeDays = max(activeDays,totalDays - int(datetime.strptime(transaction["Date"], "%Y-%m-%dT%H:%M:%S").day) + backDate)
+                activeDays = max(activeDays,totalDays - transaction.dateParts.day + backDate)
             dayCalcDenominator = activeDays
         else:
             dayCalcDenominator = totalDays
         for transaction in targetTransactions: #get fund data, cash flows, and commitment alterations
             tType = transaction["TransactionType"]
-            if tType not in commitChangeTtypes and transaction[nameHier["CashFlow"]["dynLow"]] not in (None, "None"):
-                cashflow = float(transaction[nameHier["CashFlow"]["dynLow"]])
+            if tType not in commitChangeTtypes and transaction[nameHier["CashFlow"]["dynLow"]] is not None:
+                cashflow = transaction[nameHier["CashFlow"]["dynLow"]]
                 invCashFlowSum -= cashflow
                 backDate = calculateBackdate(transaction, noStartValue) #Uses dynamo transaction time logic to decide to subtract one day or not
-                invWeightedCashFlow -= cashflow  *  (totalDays -int(datetime.strptime(transaction["Date"], "%Y-%m-%dT%H:%M:%S").day) + backDate)/dayCalcDenominator if dayCalcDenominator != 0 else 0.0
-                if transaction.get(nameHier["Unfunded"]["dynLow"]) not in (None,"None"):
-                    unfunded += float(transaction[nameHier["Unfunded"]["value"]])
+                invWeightedCashFlow -= cashflow  *  (totalDays - transaction.dateParts.day + backDate)/dayCalcDenominator if dayCalcDenominator != 0 else 0.0
+                if transaction.get(nameHier["Unfunded"]["dynLow"]) is not None:
+                    unfunded += transaction[nameHier["Unfunded"]["value"]]
                 if investment not in IRRtrack:
                     IRRtrack[investment] = {"cashFlows" : [], "dates" : []}
                 if tType in tranEffects.get('Contributions',[]):
                     contributions -= cashflow
                 elif tType in tranEffects.get('Distributions',[]):
                     distributions += cashflow
+                flowDate = datetime.fromordinal(transaction.dateParts.ordinal - backDate)
                 IRRtrack[investment]["cashFlows"].append(cashflow)
-                IRRtrack[investment]["dates"].append(datetime.strptime(transaction["Date"], "%Y-%m-%dT%H:%M:%S") - relativedelta(days=backDate))
+                IRRtrack[investment]["dates"].append(flowDate)
                 if investment not in monthFundIRRtrack:
                     monthFundIRRtrack[investment] = {"cashFlows" : [], "dates" : []}
                 monthFundIRRtrack[investment]["cashFlows"].append(cashflow)
-                monthFundIRRtrack[investment]["dates"].append(datetime.strptime(transaction["Date"], "%Y-%m-%dT%H:%M:%S") - relativedelta(days=backDate))
+                monthFundIRRtrack[investment]["dates"].append(flowDate)
                 if backDate:
                     for m in newMonths:
-                        if m["tranStart"] <= month["endDay"] <= m["endDay"]:
+                        if m["tranStartOrdinal"] <= month["endOrdinal"] <= m["endOrdinal"]:
                             for lst in cache.get(tranTableName, {}).get(m["dateTime"], []):
                                 if all(lst[header] == transaction[header] for header in list(lst.keys())): #if all values match
-                                    date = datetime.strptime(transaction["Date"], "%Y-%m-%dT%H:%M:%S") - relativedelta(days=backDate) #datetime and subtract a day
-                                    date = datetime.strftime(date, "%Y-%m-%dT%H:%M:%S")  #revert to string
-                                    lst['Calculation Date'] = date #add calculation date to transaction in cache
+                                    lst['Calculation Date'] = datetime.strftime(flowDate, "%Y-%m-%dT%H:%M:%S") #add calculation date to transaction in cache
             elif transaction["TransactionType"] in commitChangeTtypes:
                 com = transaction.get(nameHier["Commitment"]["dynLow"],0.0)
-                com = float(com)
                 commitment += com
                 unfunded += com
         try:
-            if startEntry[nameHier["Value"]["dynLow"]] in (None, "None"):
-                startEntry[nameHier["Value"]["dynLow"]] = 0
-            if endEntry[nameHier["Value"]["dynLow"]] in (None, "None"):
-                endEntry[nameHier["Value"]["dynLow"]] = 0
+            if startEntry[nameHier["Value"]["dynLow"]] is None:
+                startEntry[nameHier["Value"]["dynLow"]] = 0.0
+            if endEntry[nameHier["Value"]["dynLow"]] is None:
+                endEntry[nameHier["Value"]["dynLow"]] = 0.0
             if createFinalValue:
                 #implies there is no gain (Cash account with no interest?)
-                endEntry[nameHier["Value"]["dynLow"]] = float(startEntry[nameHier["Value"]["dynLow"]]) + invCashFlowSum    
-            invGain = (float(endEntry[nameHier["Value"]["dynLow"]]) - float(startEntry[nameHier["Value"]["dynLow"]]) - invCashFlowSum)
-            invMDdenominator = float(startEntry[nameHier["Value"]["dynLow"]]) + invWeightedCashFlow
-            invNAV = float(endEntry[nameHier["Value"]["dynLow"]])
+                endEntry[nameHier["Value"]["dynLow"]] = startEntry[nameHier["Value"]["dynLow"]] + invCashFlowSum    
+            invGain = (endEntry[nameHier["Value"]["dynLow"]] - startEntry[nameHier["Value"]["dynLow"]] - invCashFlowSum)
+            invMDdenominator = startEntry[nameHier["Value"]["dynLow"]] + invWeightedCashFlow
+            invNAV = endEntry[nameHier["Value"]["dynLow"]]
             invReturn = abs(invGain/invMDdenominator) * 100 * findSign(invGain) if invMDdenominator != 0 else 0
             if investment in IRRtrack:
-                IRRitd = calculate_xirr([*IRRtrack[investment]["cashFlows"], invNAV], [*IRRtrack[investment]["dates"], datetime.strptime(month["endDay"], "%Y-%m-%dT%H:%M:%S")])
+                IRRitd = calculate_xirr([*IRRtrack[investment]["cashFlows"], invNAV], [*IRRtrack[investment]["dates"], month['endDate']], label = investment)
             else:
                 IRRitd = None
             if unfunded < 0:
                 unfunded = 0 #corrects for if original commitment was not logged properly
             if createFinalValue: #builds an entry to put into the database and cache if it is missing
-                fundEOMentry = {"Date" : month["endDay"], "Source name" : invSourceName, "Target name" : investment , nameHier["Value"]["dynLow"] : endEntry[nameHier["Value"]["dynLow"]],
+                fundEOMentry = positionRecord.fromDict({"Date" : month["endDay"], "Source name" : invSourceName, "Target name" : investment , nameHier["Value"]["dynLow"] : endEntry[nameHier["Value"]["dynLow"]],
                                     "Balancetype" : "Calculated_R", nameHier["Commitment"]["local"] : commitment, nameHier["Unfunded"]["local"] : unfunded, 'Contributions' : contributions,
                                     'Distributions' : distributions
-                                    }
+                                    }, None)
                 # update cache for subsequent months
                 for m in newMonths:
-                    if m["accountStart"] <= month["endDay"] <= m["endDay"]:
+                    if m["accountStartOrdinal"] <= month["endOrdinal"] <= m["endOrdinal"]:
                         cache.setdefault(posTableName, {}).setdefault(m["dateTime"], []).append(fundEOMentry)
             else: #update database and cache with the calculated commitment, unfunded, and sleeve (asset lvl 3)
                 # update cache for all months referencing this date
                 for m in newMonths:
-                    if m["accountStart"] <= month["endDay"] <= m["endDay"]:
+                    if m["accountStartOrdinal"] <= month["endOrdinal"] <= m["endOrdinal"]:
                         for lst in cache.get(posTableName, {}).get(m["dateTime"], []):
-                            if lst["Target name"] == investment and lst["Date"] == month["endDay"]:
+                            if lst["Target name"] == investment and lst.dateParts.ordinal == month["endOrdinal"]:
                                 lst[nameHier["Commitment"]["local"]] = commitment
                                 lst[nameHier["Unfunded"]["local"]] = unfunded
                                 lst['Contributions'] = contributions
@@ -203,7 +205,7 @@ def processOneLevelInvestments(month, node, invSourceName, newMonths, cache, pos
             fundEntryList.append(monthInvCalc) #fund data stored on its own for investor calculations
 
         except Exception as e:
-            print(f"Skipped fund {investment} for {invSourceName} in {month["Month"]} because: {traceback.format_exc()}")
+            logEvent('skippedFundMonth', f"Skipped fund {investment} for {invSourceName} in {month["Month"]} because: {e}", subject = investment, exc_info = True)
             #Testing flag. skips fund if the values are zero and cause an error
     skipUpper = nodeNAV == 0 and nodeCashFlow == 0#skips the pool if there is no cash flow or value in the pool
     poolReturn = abs(nodeGain/nodeMDdenominator) * 100 * findSign(nodeGain) if nodeMDdenominator != 0 else 0
@@ -222,6 +224,7 @@ def processInvestments(nodeData : dict,selfData : dict, statusQueue, _, failed,
     #   statusQueue: a multiprocessing Manager queue for all worker threads to send progress bar and status updates. Minimizes database wait time
     #   dbQueue: a multiprocessing manager queue for worker threads to send final database updates to allow the worker to complete and not block the database
     #   failed: a multiprocessing variable. Begins negative. If any worker flags it as true, all workers will see it and halt if they hit the failure checkpoint
+    taskSpan = span('clump', nodeData.get('name'), nodes = 1)
     try:
         months = selfData.get("months") #list of pre-prepared data for each month
         fundList = selfData.get("fundList") #list of funds/investments and some accompanying data (such as asset class level 3)
@@ -258,15 +261,15 @@ def processInvestments(nodeData : dict,selfData : dict, statusQueue, _, failed,
         
         for table in mainTableNames:
             dynTables[table] = []
-            if "positions" == table: #removes duplicates by requiring a balance key
-                uniqueBalances = {accountBalanceKey(entry): entry for monthL in cache.get(table, {}) for entry in cache.get(table, {}).get(monthL, [])}
-                dynTables[table].extend([entry for _,entry in uniqueBalances.items()])
+            if "positions" == table: #a balance is filed under both months it starts and ends
+                dynTables[table].extend(uniqueBalances(cache.get(table, {})))
             else:
                 for monthL in cache.get(table, {}).keys():
                     dynTables[table].extend(cache.get(table, {}).get(monthL, []))
         calculations = nodalToLinkedCalculations(calculations)
         calculations = fullPortfolioCalcs(calculations)
         statusQueue.put((node,len(newMonths),"Completed")) #push completed status update to the main thread
+        taskSpan.rows = len(calculations)
         return calculations, dynTables
     except Exception as e: #halt operations for failure or force close/cancel
         statusQueue.put((node,len(newMonths),"Failed"))
@@ -281,3 +284,6 @@ def processInvestments(nodeData : dict,selfData : dict, statusQueue, _, failed,
         logging.error(e)
         print("\n")
         return [], {}
+    finally:
+        taskSpan.end()
+        flushWorkerCounts() #this task's event counters go to the parent for the run summary
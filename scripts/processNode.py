@@ -5,9 +5,11 @@ from operator import xor
 import traceback
 import copy
 
-from dateutil.relativedelta import relativedelta
-from scripts.commonValues import contributionPhrases, nameHier, balanceTypePriority, mainTableNames, ownershipCorrect, ownershipFlagTolerance, pTransferTtypes, redemptionPhrases
-from scripts.basicFunctions import calculateBackdate, calculate_xirr, accountBalanceKey, findSign
+from classes.engineRecords import positionRecord
+from scripts.commonValues import contributionPhrases, nameHier, mainTableNames, ownershipCorrect, ownershipFlagTolerance, pTransferTtypes, redemptionPhrases
+from scripts.calcLog import logEvent
+from scripts.basicFunctions import calculateBackdate, calculate_xirr, findSign
+from scripts.balanceResolver import balanceRank, uniqueBalances
 from scripts.processInvestments import processAboveBelow, processOneLevelInvestments
 
 def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transactionCalc: bool = False):
@@ -37,7 +39,7 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
         if not noCalculations: #if there are calculations, find all months before the data pull, and then pull those calculations
             for month in months:
                 #if the calculations for the month have already been complete, pull the old data
-                if earliestChangeDate > datetime.strptime(month["endDay"], "%Y-%m-%dT%H:%M:%S"):
+                if earliestChangeDate > month['endDate']:
                     calculationDict.setdefault(month['dateTime'],[]).extend(cache.get("calculations", {}).get(month["dateTime"], []))
                 else:
                     newMonths.append(month)
@@ -53,7 +55,7 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
             if failed.value: #if other workers failed, halt the process
                 print(f"Exiting worker {node} due to other failure...")
                 return [], {}
-            totalDays = int(datetime.strptime(month["endDay"], "%Y-%m-%dT%H:%M:%S").day  - datetime.strptime(month["tranStart"], "%Y-%m-%dT%H:%M:%S").day) + 1 #total days in month for MD den
+            totalDays = month['days'] #total days in month for MD den
             positionsBelow = cache.get("positions_below", {}).get(month["dateTime"], []) #account balances for the pool
             transactionsBelow = cache.get("transactions_below", {}).get(month["dateTime"], []) #account balances for the pool
             _ , cache,aboveData = processOneLevelInvestments(month,node,node,newMonths,cache,positionsBelow,transactionsBelow,IRRtrack,tranEffects)
@@ -69,12 +71,12 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
             abovePositions = cache.get("positions_above", {}).get(month["dateTime"], []) #account balances for investors into the pool for the month
             for pos in abovePositions: #find start and end entries for each investor and sort them
                 source = pos["Source name"]
-                if pos["Date"] == month["accountStart"]:
+                if pos.dateParts.ordinal == month["accountStartOrdinal"]:
                     if source not in aboveStartEntries:
                         aboveStartEntries[source] = [pos,]
                     else:
                         aboveStartEntries[source].append(pos)
-                if pos["Date"] == month["endDay"]:
+                if pos.dateParts.ordinal == month["endOrdinal"]:
                     if source not in aboveEndEntries:
                         aboveEndEntries[source] = [pos,]
                     else:
@@ -106,65 +108,51 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
                 tempAboveDict = {}
                 startEntry_cache = aboveStartEntries.get(source)
                 if startEntry_cache: #use starting entry
-                    if len(startEntry_cache) > 1:
-                        # Choose the balance where Balancetype is the highest of the list, otherwise just the first
-                        type_precedence = balanceTypePriority # Define type precedence
-                        # Sort entries by type precedence and then fall back to first
-                        def type_rank(entry):
-                            btype = entry.get("Balancetype", "")
-                            if btype in type_precedence:
-                                return type_precedence.index(btype)
-                            else:
-                                return len(type_precedence)
-                        # Get the entry with the minimum rank
-                        startEntry = sorted(startEntry_cache, key=type_rank)[0]
-                    else:
-                        startEntry = startEntry_cache[0]
+                    #one effective balance per fund class or sub-account. With several, take the most preferred
+                    startEntry = min(startEntry_cache, key = balanceRank) if len(startEntry_cache) > 1 else startEntry_cache[0]
                     noStartValue = False
                 else: #if no starting entry, take necessary variables and zero out the value
                     noStartValue = True
                     end_cache = aboveEndEntries.get(source)
                     if end_cache: #continue if there is a future entry
                         startEntry = copy.deepcopy(end_cache[0])
-                        startEntry[nameHier["Value"]["dynHigh"]] = 0
+                        startEntry[nameHier["Value"]["dynHigh"]] = 0.0
                     else: #make an empty starting entry to build from
                         startEntry = {}
-                if startEntry.get(nameHier["Value"]["dynHigh"]) in (None,"None"):
-                    startEntry[nameHier["Value"]["dynHigh"]] = 0 #prevent float conversion errors
+                if startEntry.get(nameHier["Value"]["dynHigh"]) is None:
+                    startEntry[nameHier["Value"]["dynHigh"]] = 0.0
                 investorTransactions = aboveTransactionDict.get(source,[]) #all investor transactions in the pool for the month
                 redemptions = startEntry.get('Redemptions',0.0)
                 contributions = startEntry.get('Contributions',0.0)
                 for transaction in investorTransactions: 
                     cashFlow = transaction.get(nameHier["CashFlow"]["dynHigh"])
-                    if  cashFlow not in (None,"None"):
-                        cashFlow = float(cashFlow)
+                    if cashFlow is not None:
                         sourceCashFlow -= cashFlow
                         backDate = calculateBackdate(transaction, noStartValue=noStartValue) #dynamo revert by a day logic
                         backDate = 0
-                        sourceWeightedCashFlow -= cashFlow  *  (totalDays -int(datetime.strptime(transaction["Date"], "%Y-%m-%dT%H:%M:%S").day) + backDate)/totalDays
+                        sourceWeightedCashFlow -= cashFlow  *  (totalDays - transaction.dateParts.day + backDate)/totalDays
                         if backDate:
                             for m in newMonths:
-                                if m["tranStart"] <= month["endDay"] <= m["endDay"]:
+                                if m["tranStartOrdinal"] <= month["endOrdinal"] <= m["endOrdinal"]:
                                     for lst in cache.get('transactions_above', {}).get(m["dateTime"], []):
                                         if all(lst[header] == transaction[header] for header in list(lst.keys())): #if all values match
-                                            date = datetime.strptime(transaction["Date"], "%Y-%m-%dT%H:%M:%S") - relativedelta(days=backDate) #datetime and subtract a day
-                                            date = datetime.strftime(date, "%Y-%m-%dT%H:%M:%S")  #revert to string
-                                            lst['Calculation Date'] = date #add calculation date to transaction in cache
+                                            date = datetime.fromordinal(transaction.dateParts.ordinal - backDate) #subtract a day
+                                            lst['Calculation Date'] = datetime.strftime(date, "%Y-%m-%dT%H:%M:%S") #add calculation date to transaction in cache
                         tType = transaction.get('TransactionType','')  
-                        if transaction.get('HFCashFlowType','') not in (None,'None') and 'overall' in transaction.get('HFCashFlowType','').lower():
+                        if transaction.get('HFCashFlowType','') is not None and 'overall' in transaction.get('HFCashFlowType','').lower():
                             if tType in tranEffects.get('Redemptions',[]):
                                 redemptions += cashFlow
                             elif tType in tranEffects.get('Contributions',[]):
                                 contributions -= cashFlow
-                sourceMDdenominator = float(startEntry[nameHier["Value"]["dynHigh"]]) + sourceWeightedCashFlow
+                sourceMDdenominator = startEntry[nameHier["Value"]["dynHigh"]] + sourceWeightedCashFlow
                 tempAboveDict["MDden"] = sourceMDdenominator
                 tempAboveDict["cashFlow"] = sourceCashFlow
-                tempAboveDict["startVal"] = float(startEntry[nameHier["Value"]["dynHigh"]])
+                tempAboveDict["startVal"] = startEntry[nameHier["Value"]["dynHigh"]]
                 tempAboveDict['Contributions'] = contributions
                 tempAboveDict['Redemptions'] = redemptions
                 sEOM = aboveEndEntries.get(source,[])
                 if len(sEOM) > 0:
-                    if sEOM[0].get(nameHier["Value"]["dynHigh"]) in (None,"None"):
+                    if sEOM[0].get(nameHier["Value"]["dynHigh"]) is None:
                         sEOM[0][nameHier["Value"]["dynHigh"]] = 0
                 aboveMDdenominatorSum += sourceMDdenominator
                 tempAboveDicts[source] = tempAboveDict #store source calculations for secondary iteration for target level data
@@ -173,8 +161,8 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
                 # second investor iteration to find the gain, return,ownership, and NAV values at pool level (i think it is not needed to be split, but remnant from old logic.)
                 EOMcheck = aboveEndEntries.get(source,[])
                 if len(EOMcheck) > 0:
-                    if EOMcheck[0].get(nameHier["Value"]["dynHigh"]) in (None,"None"):
-                        EOMcheck[0][nameHier["Value"]["dynHigh"]] = 0 #prevents float conversion errors
+                    if EOMcheck[0].get(nameHier["Value"]["dynHigh"]) is None:
+                        EOMcheck[0][nameHier["Value"]["dynHigh"]] = 0
                 sourceMDdenominator = tempAboveDicts[source]["MDden"]
                 if aboveMDdenominatorSum == 0:
                     sourceGain = 0 #0 if no true value in the pool. avoids errors
@@ -184,7 +172,7 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
                     sourceReturn = 0 #0 if investor has no value in pool. avoids error
                 else:
                     sourceReturn = abs(sourceGain / sourceMDdenominator) * findSign(sourceGain)
-                if round(tempAboveDicts[source]["startVal"] + tempAboveDicts[source]["cashFlow"]) == 0 or len(EOMcheck) == 0 or round(float(EOMcheck[0].get(nameHier["Value"]["dynHigh"],0))) == 0: 
+                if round(tempAboveDicts[source]["startVal"] + tempAboveDicts[source]["cashFlow"]) == 0 or len(EOMcheck) == 0 or round(EOMcheck[0].get(nameHier["Value"]["dynHigh"],0)) == 0: 
                     #zero values if exited source
                     #exit check: start value and cashflow sums to zero OR no end value OR end value is zero
                     sourceEOM = tempAboveDicts[source]["startVal"] + tempAboveDicts[source]["cashFlow"] + sourceGain
@@ -220,12 +208,12 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
                         elif date == month['endDay']:
                             alloDec = float(pT.get('Amountinsystemcurrency')) / sourceEntry['NAV'] if sourceEntry['NAV'] != 0 else 0
                         else:
-                            print(f'WARNING: Partner transfer date not at BOM or EOM ({source} in {month['Month']}) \n      {pT}')
+                            logEvent('partnerTransfer', f"Partner transfer date not at BOM or EOM in {month['Month']}", subject = source, transfer = pT)
                             continue
                     elif pT.get('Percent') not in (None,'None'): 
                         alloDec = float(pT.get('Percent'))
                     else:
-                        print(f'WARNING: Partner transfer passed with no value ({source} in {month['Month']})')
+                        logEvent('partnerTransfer', f"Partner transfer passed with no value in {month['Month']}", subject = source)
                         continue #Failed
                     amounts = {}
                     for h in ('Redemptions','Contributions'):
@@ -235,7 +223,7 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
                             monthNodeSourceEntryList[idx][0][h] -= alloDec * val
                     recievingPs = pT.get('Transferto').split(';')
                     if not amounts or len(recievingPs) == 0:
-                        print('WARNING: No amounts found or no target partners')
+                        logEvent('partnerTransfer', f"No amounts found or no target partners in {month['Month']}", subject = source, transfer = pT)
                         continue
                     else:
                         amounts = {k : v/len(recievingPs) for k,v in amounts.items()} #evenly divide to partners
@@ -252,12 +240,12 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
                 sourceOwnership = sourceEntry["Ownership"] * 100 /  nodeOwnershipSum if nodeOwnershipSum != 0 and ownershipCorrect else sourceEntry["Ownership"]
                 if len(EOMcheck) > 0:
                     #update cache for the following month's calculations
-                    if any(round(float(EOMcheck[0].get(header,0))) != round(val) for header, val  in ([nameHier["Value"]["dynHigh"],sourceEOM],['Redemptions',sourceEntry['Redemptions']],['Contributions',sourceEntry['Contributions']])): #don't push an update if the values are the same
-                        bTypeChange = round(float(EOMcheck[0].get(nameHier["Value"]["dynHigh"],0))) != round(sourceEOM)
+                    if any(round(EOMcheck[0].get(header,0)) != round(val) for header, val  in ([nameHier["Value"]["dynHigh"],sourceEOM],['Redemptions',sourceEntry['Redemptions']],['Contributions',sourceEntry['Contributions']])): #don't push an update if the values are the same
+                        bTypeChange = round(EOMcheck[0].get(nameHier["Value"]["dynHigh"],0)) != round(sourceEOM)
                         for m in newMonths:
-                            if m["accountStart"] <= month["endDay"] <= m["endDay"]: #access the both the current month and next month
+                            if m["accountStartOrdinal"] <= month["endOrdinal"] <= m["endOrdinal"]: #access the both the current month and next month
                                 for lst in cache.get("positions_above", {}).get(m["dateTime"], []):
-                                    if lst["Source name"] == source and lst["Target name"] == node and lst["Date"] == month["endDay"]:
+                                    if lst["Source name"] == source and lst["Target name"] == node and lst.dateParts.ordinal == month["endOrdinal"]:
                                         #access the EOM current month and BOM next month as endDay hits both of those
                                         lst[nameHier["Value"]["dynHigh"]] = sourceEOM #this does not represent adjusted values
                                         if bTypeChange:
@@ -265,14 +253,14 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
                                         for key in ('Redemptions','Contributions'):
                                             lst[key] = sourceEntry[key]
                 elif len(EOMcheck) == 0: #continue a zero for exited fund calculations
-                    sourceEOMentry = {"Date" : month["endDay"], "Source name" : source, "Target name" : node , nameHier["Value"]["dynLow"] : sourceEOM,
+                    sourceEOMentry = positionRecord.fromDict({"Date" : month["endDay"], "Source name" : source, "Target name" : node , nameHier["Value"]["dynLow"] : sourceEOM,
                                         "Balancetype" : "Calculated_R"
-                                        }
+                                        }, None)
                     for key in ('Redemptions','Contributions'):
                         sourceEOMentry[key] = sourceEntry[key]
                     # update cache for subsequent months
                     for m in newMonths:
-                        if m["accountStart"] <= month["endDay"] <= m["endDay"]:
+                        if m["accountStartOrdinal"] <= month["endOrdinal"] <= m["endOrdinal"]:
                             cache.setdefault("positions_above", {}).setdefault(m["dateTime"], []).append(sourceEOMentry)
 
                 #final (3rd) investor level iteration to use the pool level results for the investor to calculate the fund level information
@@ -311,12 +299,8 @@ def processNode(nodeData : dict,selfData : dict, statusQueue, _, failed, transac
         
         for table in mainTableNames:
             dynTables[table] = []
-            if "positions" == table: #removes duplicates by requiring a balance key
-                uniqueBalances = {accountBalanceKey(entry): entry for monthL in cache.get('positions_below', {}) for entry in cache.get('positions_below', {}).get(monthL, [])}
-                for monthL in cache.get('positions_above', {}): #now add in for positions above
-                    for entry in cache.get('positions_above', {}).get(monthL, []):
-                        uniqueBalances[accountBalanceKey(entry)] = entry
-                dynTables[table].extend([entry for _,entry in uniqueBalances.items()])
+            if "positions" == table: #a balance is filed under both months it starts and ends
+                dynTables[table].extend(uniqueBalances(cache.get('positions_below', {}), cache.get('positions_above', {})))
             elif table == 'transactions':
                 for tableName in ('transactions_below','transactions_above'):
                     for monthL in cache.get(tableName, {}).keys():
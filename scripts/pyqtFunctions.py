@@ -4,32 +4,26 @@ import os
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from classes.DatabaseManager import DatabaseManager, load_from_db
+from classes.DatabaseManager import DatabaseManager
 from classes.widgetClasses import MultiSelectBox
 from scripts.commonValues import fullPortStr, masterFilterOptions, maxPDFheaderUnits, nonFundCols, sqlPlaceholder
 from scripts.instantiate_basics import ASSETS_DIR
-from scripts.render_report import render_report
-from scripts.basicFunctions import headerUnits, rebuildParagraph
+from scripts.basicFunctions import headerUnits, rebuildParagraph, rowColorDepths
 
 from PyQt5.QtWidgets import QApplication, QMessageBox
 import threading
 
-from scripts.reportWorkbooks import portfolioSnapshot
-
 def basicHoldingsReportExport(self, onlyHoldings:bool , sourceName = None, classification = None):
+    #the report modules pull in reportlab, matplotlib and pandas, so they load on the first pdf export
+    from scripts.render_report import render_report
+    from scripts.reportWorkbooks import benchmarksFrame, portfolioSnapshot, snapshotFlows
     if not hasattr(self,'filteredReturnsTableData'):
         QMessageBox.warning(self,'No Table Loaded Yet','WARNING: No table has been loaded and formatted yet for export. Cancelling...')
         return
     elif self.buildTableLoadingBar.isVisible():
         QMessageBox.warning(self,'New table processing','WARNING: The table is currently rebuilding. Allow the table to fully build before attempting to export it. Cancelling...')
         return
-    data = copy.deepcopy(self.filteredReturnsTableData)
-    colorDepths = copy.deepcopy(self.tableColorDepths)
-    if self.headerSort.active:
-        headerOrder = self.headerSort.popup.get_checked_sorted_items()
-    else:
-        headerOrder = None
-    _,unitMax = headerUnits(headerOrder)
+    data, colorDepths, headerOrder, unitMax = currentHoldings(self)
     print(f'Max header units {unitMax}')
     if unitMax > maxPDFheaderUnits + 4:
         r = QMessageBox.question(self,'Continue?','Warning: More headers selected than the recommended maximum for pdf export. Text may be very small or poorly formatted. Continue?')
@@ -44,33 +38,54 @@ def basicHoldingsReportExport(self, onlyHoldings:bool , sourceName = None, class
     report_date = datetime.strptime(report_date,'%B %Y')
     footerData = {'reportDate' : report_date, 'portfolioSource' : sourceName, 'classification' : classification, 'headerUnits' : unitMax}
     if not onlyHoldings: 
-        #use current settings to pull calcs for portfolio snapshot
-        startDate = datetime.strptime(self.dataStartSelect.currentText(), "%B %Y")
         endDate = datetime.strptime(self.dataEndSelect.currentText(), "%B %Y")
-        sortHier = self.sortHierarchy.checkedItems()
-        invSort = any(invStr in sortHier for invStr in ('Source name', 'Family Branch'))
-        condStatement, parameters = filt2Query(self.db, self.filterDict,startDate,endDate, invSort = invSort)
-        calcs = load_from_db(self.db,"calculations",condStatement, tuple(parameters))
-        #Find list of currently selected investors
+        #Find list of currently selected investors. The snapshot pulls only the months it needs for them
         invSelections = self.filterDict["Source name"].checkedItems()
         famSelections = self.filterDict["Family Branch"].checkedItems()
         if invSelections != [] or famSelections != []:
             invs = comboInvestorOpts(self.db,invSelections,famSelections)
-            placeholders = ','.join(sqlPlaceholder for _ in invs)
-            if condStatement in ("", " WHERE"):
-                condStatement = f' WHERE [Source name] in ({placeholders})'
-            else:
-                condStatement += f' AND [Source name] in ({placeholders})'
         else:
             invs = [fullPortStr]
-        snapshotWb = portfolioSnapshot(calcs,self,invs,endDate)
+        #fund, asset class and node filters or a later start date narrow the snapshot to the table's data, as they always have
+        startDate = datetime.strptime(self.dataStartSelect.currentText(), "%B %Y")
+        tableNarrowed = (any(box.checkedItems() != [] for key, box in self.filterDict.items() if key not in ('Source name', 'Family Branch'))
+                         or startDate > self.dataTimeStart) #the start months are listed from dataTimeStart
+        if tableNarrowed:
+            sortHier = self.sortHierarchy.checkedItems()
+            invSort = any(invStr in sortHier for invStr in ('Source name', 'Family Branch'))
+            filters = filt2Query(self.db, self.filterDict, startDate, endDate, invSort = invSort)
+        else:
+            filters = None
+        snapshotWb = portfolioSnapshot(self,invs,endDate, flows = snapshotFlows(self.db, invs, endDate, filters))
         #get summary paragraph
         summary = self.db.loadFromDB('paragraphInputs',condStatement = ' WHERE month = ? AND section = ? ORDER BY lineNum',inputs = (self.dataEndSelect.currentText(),'reportSummary'))
         #summaryText = rebuildParagraph(summary)
+        benchmarks = benchmarksFrame(self.db, endDate)
     else:
         snapshotWb = None
         summary = None
-    render_report(outPath,data,colorDepths, holdings_header_order=headerOrder, footerData= footerData, onlyHoldings = onlyHoldings, snapshotWb=snapshotWb, narrative_text = summary)
+        benchmarks = None
+    render_report(outPath,data,colorDepths, holdings_header_order=headerOrder, footerData= footerData, onlyHoldings = onlyHoldings, snapshotWb=snapshotWb,
+                  benchmarks_df = benchmarks, narrative_text = summary)
+
+def holdingsHeaderOrder(rApp):
+    #the complex table headers the user has sorted, or None for the default order
+    if rApp.headerSort.active:
+        return rApp.headerSort.popup.get_checked_sorted_items()
+    return None
+def currentHoldings(rApp):
+    #copy of the formatted returns table as the pdf holdings pages use it: (rows, colorDepths, headerOrder, max header units)
+    data = copy.deepcopy(rApp.filteredReturnsTableData)
+    colorDepths = copy.deepcopy(rApp.tableColorDepths)
+    headerOrder = holdingsHeaderOrder(rApp)
+    _,unitMax = headerUnits(headerOrder)
+    return data, colorDepths, headerOrder, unitMax
+def viewHoldings(rApp, view : dict, headerOrder : list[str], cancelEvent):
+    #currentHoldings for a view built by rApp.viewTable instead of the table on screen. Safe off the GUI thread
+    rows, _ = rApp.viewTable(view, cancelEvent)
+    data = rApp.visibleRows(rows, view['visible'])
+    _,unitMax = headerUnits(headerOrder)
+    return data, rowColorDepths(data), headerOrder, unitMax
 
 def controlTable(rApp, reset : bool = False, reenable : bool = True, filterChoices : dict[list] = {}, sortHierarchy : list[str] = None, benchmarks : list[str] = None, visChoices : dict[bool] = {}, endDate : datetime = None):
     try:
@@ -126,8 +141,12 @@ def comboInvestorOpts(db: DatabaseManager, invSelections,famSelections):
 def filt2Query(db, filterDict : dict[MultiSelectBox], startDate : datetime, endDate : datetime, invSort:bool = False, hideNonInvestables = False) -> (str,list[str]):
     condStatement = ""
     parameters = []
-    invSelections = filterDict["Source name"].checkedItems()
-    famSelections = filterDict["Family Branch"].checkedItems()
+    def checked(key):
+        #boxes from the returns page or plain lists of selections for a view built without the widgets
+        box = filterDict[key]
+        return box if isinstance(box, list) else box.checkedItems()
+    invSelections = checked("Source name")
+    famSelections = checked("Family Branch")
     if invSelections != [] or famSelections != []: #handle investor level
         invs = comboInvestorOpts(db,invSelections,famSelections)
         placeholders = ','.join(sqlPlaceholder for _ in invs)
@@ -142,8 +161,8 @@ def filt2Query(db, filterDict : dict[MultiSelectBox], startDate : datetime, endD
     else: #if no investor selection, the full portfolio values will work the same and be faster
         condStatement = f' WHERE [Source name] = {sqlPlaceholder}'
         parameters.append(fullPortStr)
-    if filterDict['Node'].checkedItems() != []:
-        selectedNodes = filterDict['Node'].checkedItems()
+    if checked('Node') != []:
+        selectedNodes = checked('Node')
         sNodeIds = [" "+ str(node['id'])+" " for node in db.fetchNodes() if str(node['id']) in selectedNodes]
         # Build LIKE conditions to check if any node ID appears within the nodePath column
         if sNodeIds:
@@ -160,8 +179,8 @@ def filt2Query(db, filterDict : dict[MultiSelectBox], startDate : datetime, endD
     filterParamDict = {}
     for filter in masterFilterOptions:
         if filter["key"] not in nonFundCols:
-            if filterDict[filter["key"]].checkedItems() != []:
-                filterParamDict[filter['key']] = filterDict[filter["key"]].checkedItems()
+            if checked(filter["key"]) != []:
+                filterParamDict[filter['key']] = checked(filter["key"])
     if filterParamDict:
         if condStatement == "":
             condStatement = " WHERE"
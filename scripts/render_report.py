@@ -1,7 +1,9 @@
 import math
+import time
+import hashlib
 import statistics
 from PyQt5.QtWidgets import QFileDialog
-from scripts.commonValues import maxPDFheaderUnits, maxRowPadding, maxRowsPerPage, minRowPadding, minimumFontSize, shrinkPDFthreshold, snapshotColWidths, standardFontSize
+from scripts.commonValues import chartCacheMaxMB, chartCacheMinAgeSecs, maxPDFheaderUnits, maxRowPadding, maxRowsPerPage, minRowPadding, minimumFontSize, shrinkPDFthreshold, snapshotColWidths, standardFontSize
 from scripts.instantiate_basics import ASSETS_DIR
 from reportlab.lib.units import inch
 from datetime import datetime
@@ -15,7 +17,7 @@ from scripts.basicFunctions import separateRowCode
 from scripts.pdf_generator import PDFReportGenerator, CONTENT_WIDTH
 from reportlab.platypus import Frame, PageBreak, Spacer, Table, TableStyle, KeepTogether, FrameBreak
 matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import pandas as pd
 
 
@@ -88,14 +90,61 @@ def create_page_groups(dataTypes, portfolio_holdings_rows, colorDepths, rows_per
     return pages, colorPages
 
 
-def create_benchmark_chart(benchmarks_df, column, title, output_path, y_lim=None, colors=None):
+def chartCacheDir():
+    cacheDir = Path(ASSETS_DIR) / 'temp' / 'chartCache'
+    cacheDir.mkdir(parents=True, exist_ok=True)
+    return cacheDir
+
+
+def chartCacheKey(data, column, title, y_lim, colors):
+    """Hash of everything that changes the chart image so identical charts across reports share one file."""
+    digest = hashlib.sha256()
+    for part in (column, title, repr(y_lim), repr(colors)):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def evictChartCache(cacheDir, maxBytes=chartCacheMaxMB * 1024 * 1024, minAge=chartCacheMinAgeSecs):
+    #oldest used first. mtime is refreshed on every hit so it tracks last use
+    files = []
+    for f in cacheDir.glob('*.png'):
+        try:
+            stat = f.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, f))
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - minAge
+    for mtime, size, f in sorted(files, key=lambda x: x[0]):
+        if total <= maxBytes or mtime > cutoff:
+            break
+        try:
+            f.unlink()
+            total -= size
+        except OSError:
+            pass
+
+
+_chartFigure = None
+def chartFigure():
+    #one figure per process, cleared for each chart instead of building a new one
+    global _chartFigure
+    if _chartFigure is None:
+        _chartFigure = Figure(figsize=(6, 5))
+    _chartFigure.clf()
+    return _chartFigure
+
+
+def create_benchmark_chart(benchmarks_df, column, title, output_path = None, y_lim=None, colors=None):
     """
     Create a vertical bar chart for benchmark returns.
     
     benchmarks_df: DataFrame with Benchmark column and return columns
     column: Column name to plot (e.g., 'MTD', '1Y')
     title: Chart title
-    output_path: Path to save the chart image
+    output_path: Unused, kept for older callers. Charts are written to the chart cache and that path is returned
     y_lim: Tuple (ymin, ymax) for shared y-axis limits
     colors: Optional list of colors for each bar
     """
@@ -119,7 +168,17 @@ def create_benchmark_chart(benchmarks_df, column, title, output_path, y_lim=None
         }
         colors = [color_map.get(bench, '#808080') for bench in data['Benchmark']]
     
-    fig, ax = plt.subplots(figsize=(6, 5))
+    cacheDir = chartCacheDir()
+    cachePath = cacheDir / f"{chartCacheKey(data, column, title, y_lim, colors)}.png"
+    if cachePath.exists():
+        try:
+            os.utime(cachePath) #mark as recently used for eviction
+            return cachePath
+        except OSError:
+            pass #evicted between the check and the touch so render it again
+    
+    fig = chartFigure()
+    ax = fig.add_subplot()
     
     # Convert values to percentages (multiply by 100)
     data_percent = data[column]
@@ -175,15 +234,17 @@ def create_benchmark_chart(benchmarks_df, column, title, output_path, y_lim=None
         ax.set_ylim(y_min, y_max)
     
     # Adjust layout
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    fig.tight_layout()
+    tmpPath = cachePath.with_suffix(f'.{os.getpid()}.tmp')
+    fig.savefig(tmpPath, dpi=150, bbox_inches='tight', format='png')
+    os.replace(tmpPath, cachePath) #other report workers only ever see a complete file
+    evictChartCache(cacheDir)
     
-    return output_path
+    return cachePath
 
 
 def render_report(out_path, holdingDict, colorDepths, snapshotWb = None, benchmarks_df = None,JPMdf = None, narrative_text = None, 
-                  holdings_exclude_keys = None, holdings_header_order = None, onlyHoldings = False, footerData={}):
+                  holdings_exclude_keys = None, holdings_header_order = None, onlyHoldings = False, footerData={}, openAfter = True):
     print(f"Report generation started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     holdings_header_order = ['',*holdings_header_order]
     report_date = footerData.get('reportDate')
@@ -356,16 +417,11 @@ def render_report(out_path, holdingDict, colorDepths, snapshotWb = None, benchma
     benchmark_chart_mtd_path = None
     benchmark_chart_1y_path = None
     
-    if benchmarks_df and not onlyHoldings:
+    if benchmarks_df is not None and not onlyHoldings:
         try:
             # Expected columns: Benchmark, Info, MTD, QTD, YTD, 1Y, 3Y, 5Y, 10Y
             benchmarks_rows = benchmarks_df.to_dict(orient="records")
             
-            # Create output directory for charts
-            base_dir = get_base_dir()
-            output_dir = base_dir / "output"
-            output_dir.mkdir(exist_ok=True)
-            
             # Calculate shared y-axis limits across both MTD and 1Y columns
             # Multiply by 100 to convert from decimal to percentage
             mtd_data = benchmarks_df['MTD'].dropna() * 100
@@ -391,12 +447,10 @@ def render_report(out_path, holdingDict, colorDepths, snapshotWb = None, benchma
             # Create bar charts with shared y-axis
             benchmark_chart_mtd_path = create_benchmark_chart(
                 benchmarks_df, 'MTD', 'Benchmarks, Month-To-Date Returns',
-                output_dir / "benchmark_chart_mtd.png",
                 y_lim=shared_y_lim
             )
             benchmark_chart_1y_path = create_benchmark_chart(
                 benchmarks_df, '1Y', 'Benchmarks, 1 Year Returns',
-                output_dir / "benchmark_chart_1y.png",
                 y_lim=shared_y_lim
             )
             
@@ -587,8 +641,9 @@ def render_report(out_path, holdingDict, colorDepths, snapshotWb = None, benchma
         # Build PDF
         pdf_gen.build()
         print(f"Wrote PDF: {out_path}")
+        written = out_path
         try:
-            if os.path.exists(out_path):
+            if openAfter and os.path.exists(out_path):
                 if sys.platform == "win32":
                     os.startfile(out_path)
                 elif sys.platform == "darwin":
@@ -602,5 +657,7 @@ def render_report(out_path, holdingDict, colorDepths, snapshotWb = None, benchma
         print(f"Error generating PDF: {e}")
         import traceback
         traceback.print_exc()
+        written = None
 
-    print(f"Report generation completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
\ No newline at end of file
+    print(f"Report generation completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    return written
\ No newline at end of file
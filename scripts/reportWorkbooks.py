@@ -1,3 +1,4 @@
+import copy
 import traceback
 from PyQt5.QtWidgets import QApplication, QMessageBox
 from dateutil.relativedelta import relativedelta
@@ -5,10 +6,65 @@ from datetime import datetime
 import pandas as pd
 import threading
 
-from scripts.basicFunctions import separateRowCode
+from scripts.basicFunctions import separateRowCode, setViewFilter
 from scripts.commonValues import defaultSports
 
-def portfolioSnapshot(calcs, rApp, investors :list[str], asOfDate : datetime):
+def snapshotFlows(db, investors : list[str], asOfDate : datetime, filters : tuple = None):
+    """
+    Assets and flows for the snapshot as {row : [Month, 1 Year, Inception]}, from the per investor totals built at calculation time.
+    Only the as of month, the month before and a year back are read. Flows in the calculations are inception to date so each
+    window is the as of value less the value at its start, and gains come from the running Gain ITD.
+    filters is (condStatement, parameters) from filt2Query when the returns table narrows the data past its investors. The sums
+    then come from the calculations those filters select, and inception starts at the table's start date.
+    """
+    prevMonthDt = asOfDate - relativedelta(months=1)
+    yrMonthDt = asOfDate - relativedelta(years=1)
+    fmt = '%Y-%m-%d 00:00:00'
+    asOf, prevMonth, yrMonth = (datetime.strftime(dt, fmt) for dt in (asOfDate, prevMonthDt, yrMonthDt))
+    if filters is None:
+        eom = datetime.strftime(asOfDate + relativedelta(months = 1), fmt)
+        totals = db.loadSnapshotTotals(investors, [asOf, prevMonth, yrMonth])
+        gainITD = db.loadGainITD(investors, eom)
+        yearGain = gainITD - db.loadGainITD(investors, yrMonth)
+    else:
+        condStatement, parameters = filters
+        totals = db.loadFilteredTotals(condStatement, parameters, [asOf, prevMonth, yrMonth])
+        gainITD = db.loadFilteredGain(condStatement, parameters)
+        yearGain = db.loadFilteredGain(condStatement, parameters, fromDate = yrMonth)
+    def val(month, key):
+        return totals.get(month, {}).get(key) or 0.0
+    def outs(month):
+        return val(month, 'Redemptions') + val(month, 'Distributions')
+    endingValue = val(asOf, 'NAV')
+    return {'Starting Value' : [val(prevMonth, 'NAV'), val(yrMonth, 'NAV'), 0],
+            'Ins' : [val(asOf, 'Contributions') - val(prevMonth, 'Contributions'), val(asOf, 'Contributions') - val(yrMonth, 'Contributions'), val(asOf, 'Contributions')],
+            '(Outs)' : [outs(asOf) - outs(prevMonth), outs(asOf) - outs(yrMonth), outs(asOf)],
+            'Gains/(Losses)' : [val(asOf, 'Monthly Gain'), yearGain, gainITD],
+            'Ending Value' : [endingValue, endingValue, endingValue]}
+
+def benchmarksFrame(db, asOfDate : datetime):
+    """
+    The world markets table for the report month: each imported benchmark's returns as decimals under the report's
+    column names (Benchmark, Info, MTD, QTD, YTD, 1Y, 3Y, 5Y, 10Y). None if no benchmark has that month.
+    """
+    benchCols = {'MTD' : 'MTDnet', 'QTD' : 'QTDnet', 'YTD' : 'YTDnet', '1Y' : 'Last1yrnet', '3Y' : 'Last3yrnet', '5Y' : 'Last5yrnet', '10Y' : 'Last10yrnet'}
+    def decimal(val):
+        return float(val) if val not in (None, "None", "") else None
+    benchmarks = db.loadFromDB('benchmarks', condStatement = ' WHERE Asofdate LIKE ? ORDER BY [Index]', inputs = (datetime.strftime(asOfDate,'%Y-%m-') + '%',))
+    rows = [{'Benchmark' : bench['Index'], 'Info' : '', **{col : decimal(bench.get(field)) for col, field in benchCols.items()}}
+            for bench in benchmarks if bench.get('Index') is not None]
+    return pd.DataFrame(rows, columns = ['Benchmark','Info',*benchCols.keys()]) if rows else None
+
+def portfolioSnapshot(rApp, investors :list[str], asOfDate : datetime, holdApp : bool = True, sportsRows : tuple[list] = None, flows : dict = None,
+                      baseView : dict = None, cancelEvent = None):
+    """
+    Builds the snapshot sheets for one report.
+    The tables are built from plain views (rApp.viewTable) starting at baseView, a filter reset of the controls
+    (rApp.resetView) that defaults to the current ones, so the returns page is left as it is. holdApp freezes the app
+    for the build. The batch engine builds off the GUI thread and passes False, the view it captured, its cancelEvent and
+    sportsRows (sportsData, investorSportsData) it has already pulled for every report in one query each, along with the
+    job's snapshotFlows.
+    """
     sheetNames = ['assets_and_flows', 'portfolio returns', 'foundations', 
                 'overall_family_breakdown', 'overall_family_breakdown2', 'returns_vs_benchmark']
                 # INSERT_YOUR_CODE
@@ -16,72 +72,23 @@ def portfolioSnapshot(calcs, rApp, investors :list[str], asOfDate : datetime):
 
     
     #set filter values first then run it
-    rApp.setEnabled(False) #hold the entire app from user input
-    QMessageBox.informativeText
-    blockMSG = QMessageBox(rApp)
-    blockMSG.setWindowTitle('Notice')
-    blockMSG.setText('Application will be frozen until the report generation is complete.')
-    blockMSG.setStandardButtons(QMessageBox.NoButton)
-    blockMSG.setModal(False)  # Make it non-modal so it doesn't block
-    blockMSG.show()
-    QApplication.processEvents()
+    blockMSG = None
+    if holdApp:
+        rApp.setEnabled(False) #hold the entire app from user input
+        blockMSG = QMessageBox(rApp)
+        blockMSG.setWindowTitle('Notice')
+        blockMSG.setText('Application will be frozen until the report generation is complete.')
+        blockMSG.setStandardButtons(QMessageBox.NoButton)
+        blockMSG.setModal(False)  # Make it non-modal so it doesn't block
+        blockMSG.show()
+        QApplication.processEvents()
     try:
         print('Processing report snapshot data...')
-        AFdf = dataFrames['assets_and_flows']
-        aFdict = {name : [0,0,0] for name in ('Starting Value','Ins','(Outs)','Gains/(Losses)','Ending Value')}
-        prevMonthDt = asOfDate - relativedelta(months=1)
-        yrMonthDt = asOfDate - relativedelta(years=1)
-        eomDT = asOfDate + relativedelta(months = 1) - relativedelta(days = 1)
         print(f'as of dt: {asOfDate}')
-        print(f'prev month dt: {prevMonthDt}')
-        print(f'eom dt: {eomDT}')
-        print(f'yr dt: {yrMonthDt}')
-        print(f'Processing {len(calcs)} calculations...')
-        def addInOut(aFdict,lvl : int,contributions,redemptions,distributions, subtract:bool = False):
-            if subtract:
-                modify = -1
-            else:
-                modify = 1
-            if contributions not in (None,'None','',0.0):
-                aFdict['Ins'][lvl] += contributions * modify
-            if redemptions not in (None,'None','',0.0):
-                aFdict['(Outs)'][lvl] += redemptions * modify
-            if distributions not in (None,'None','',0.0):
-                aFdict['(Outs)'][lvl] += distributions * modify
-            return aFdict
-        for c in calcs:
-            cDt = datetime.strptime(c['dateTime'],'%Y-%m-%d 00:00:00')
-            NAV = c['NAV']
-            contributions = c.get('Contributions')
-            redemptions = c.get('Redemptions')
-            distributions = c.get('Distributions')
-            #Handle ending val (add 0 index value to 1 and 2 once done as they are the same)
-            # 0: Month, 1: 1 Year   2: Inception
-            if cDt == asOfDate:
-                aFdict['Ending Value'][0] += NAV
-                aFdict = addInOut(aFdict,0,contributions,redemptions,distributions) #add current to subtract the previous month
-                aFdict = addInOut(aFdict,1,contributions,redemptions,distributions) #add current to subtract the previous year
-                aFdict = addInOut(aFdict,2,contributions,redemptions,distributions) #current is the Inception
-            elif cDt == prevMonthDt:
-                aFdict = addInOut(aFdict,0,contributions,redemptions,distributions,subtract=True) #Month is Current minus previous month's
-            elif cDt == yrMonthDt:
-                aFdict = addInOut(aFdict,1,contributions,redemptions,distributions,subtract=True) #1 Year is Current minus previous year's
-            #Handle Gain
-            if  cDt < eomDT:#before as of date
-                mGain = c['Monthly Gain']
-                aFdict['Gains/(Losses)'][2] += mGain
-                if cDt >= yrMonthDt: #within the year
-                    aFdict['Gains/(Losses)'][1] += mGain
-                    if cDt == asOfDate: #the months gain
-                        aFdict['Gains/(Losses)'][0] += mGain
-                
-            #Handle starting val
-            if cDt == prevMonthDt:
-                aFdict['Starting Value'][0] += NAV
-            elif cDt == yrMonthDt:
-                aFdict['Starting Value'][1] += NAV
-        for num in (1,2):
-            aFdict['Ending Value'][num] = aFdict['Ending Value'][0]
+        prevMonthDt = asOfDate - relativedelta(months=1)
+        if flows is None:
+            flows = snapshotFlows(rApp.db, investors, asOfDate)
+        aFdict = {key : list(vals) for key, vals in flows.items()}
         print('Finalizing dataframe...')
         for key in aFdict.keys():
             for idx in range(len(aFdict[key])):
@@ -102,16 +109,17 @@ def portfolioSnapshot(calcs, rApp, investors :list[str], asOfDate : datetime):
         dataFrames['assets_and_flows'] = AFdf
 
         #Performance Data Collection by table builds
-        rApp.instantiateFilters()
-        rApp.filterDict['Source name'].setCheckedItems(investors)
-        rApp.sortHierarchy.setCheckedItem("assetClass")
-        rApp.filterRadioBtnDict['Target name'].setChecked(False)
+        if cancelEvent is None:
+            cancelEvent = threading.Event() #never set for a single report
+        view = copy.deepcopy(baseView) if baseView is not None else rApp.resetView()
+        view['end'] = datetime.strftime(asOfDate,'%B %Y')
+        setViewFilter(view, 'Source name', investors) #the full portfolio is no investor selection
+        if "assetClass" not in view['sortHierarchy']: #added to the current grouping
+            view['sortHierarchy'] = [*view['sortHierarchy'], "assetClass"]
         # HF Portfolio ------------------------------------
         benches = ['Overall Policy Benchmark','Overall Implementation Benchmark','60% MSCI ACWI / 40% BB Aggregate']
-        rApp.benchmarkSelection.setCheckedItems(benches)
-        cancelEvent = threading.Event() #useless here but the function wants it
-        rApp.buildTable(cancelEvent, populateTable = False)
-        table = rApp.currentTableData
+        view['benchmarks'] = benches
+        table, _ = rApp.viewTable(view, cancelEvent)
         keyLinks = {'NAV' : '$MM', 'MTD' : 'Month', 'YTD' : 'YTD',
                     '1YR' : '1 Year', '3YR' : '3 Year' ,'ITD':  'Inception' }
         rowHeaders = ['Illiquid','Liquid','Cash','HF Capital',*benches]
@@ -122,12 +130,9 @@ def portfolioSnapshot(calcs, rApp, investors :list[str], asOfDate : datetime):
         dataFrames['portfolio returns'] = df
 
         # Foundations ------------------------------------
-        rApp.filterDict['Classification'].clearSelection()
-        rApp.filterDict['Classification'].setCheckedItem('Foundation')
-        rApp.sortHierarchy.clearSelection()
-        rApp.sortHierarchy.setCheckedItem("subAssetClass")
-        rApp.buildTable(cancelEvent, populateTable = False)
-        table = rApp.currentTableData
+        setViewFilter(view, 'Classification', ['Foundation'])
+        view['sortHierarchy'] = ["subAssetClass"]
+        table, _ = rApp.viewTable(view, cancelEvent)
         keyLinks = {'NAV' : '$MM', '%' : '% Allocation'}
         rowHeaders = ['Absolute Return','Fixed Income','Public Equity','Long/Short','Cash','Total']
         searchDict = {item : item for item in ('Absolute Return','Fixed Income','Public Equity','Long/Short','Cash','Total')} #dict for rowKey to excel table row name
@@ -135,14 +140,11 @@ def portfolioSnapshot(calcs, rApp, investors :list[str], asOfDate : datetime):
         df = buildPerfDF(table,keyLinks,rowHeaders,searchDict,cashHeaders=['NAV',],cornerTxt='Asset Class')
         dataFrames['foundations'] = df
         #Overal Family Breakdown -------------------------------------
-        rApp.filterDict['Classification'].clearSelection()
-        rApp.sortHierarchy.clearSelection()
-        rApp.sortHierarchy.setCheckedItems(["Classification",'subClassification'])
-        rApp.filterDict['Classification'].setCheckedItems(['Foundation','HFC','Non-HFC'])
-        rApp.monthlyTableBtn.setChecked(True)
-        rApp.returnOutputType.setCurrentText('NAV')
-        rApp.buildTable(cancelEvent, populateTable = False)
-        table = rApp.currentTableData
+        view['sortHierarchy'] = ["Classification",'subClassification']
+        setViewFilter(view, 'Classification', ['Foundation','HFC','Non-HFC'])
+        view['mode'] = 'Monthly Table'
+        view['outputType'] = 'NAV'
+        table, _ = rApp.viewTable(view, cancelEvent)
         currMonth = datetime.strftime(asOfDate,'%B %Y')
         prevMonth = datetime.strftime(prevMonthDt,'%B %Y')
         keyLinks = {prevMonth : 'LM $MM', 1:"delta_mm", currMonth : 'CM $MM', 0 : '%'}
@@ -152,8 +154,11 @@ def portfolioSnapshot(calcs, rApp, investors :list[str], asOfDate : datetime):
         dataFrames['overall_family_breakdown'] = df
         #Sports Data ----------------------------------------
         rowHeaders = (*defaultSports, 'Total')
-        sportsData = rApp.db.loadFromDB('sportsData',condStatement = ' WHERE month = ?', inputs = (currMonth,))
-        if investors:
+        sportsData = rApp.db.loadFromDB('sportsData',condStatement = ' WHERE month = ?', inputs = (currMonth,)) if sportsRows is None else sportsRows[0]
+        if sportsRows is not None: #pulled once for the whole batch
+            invSet = set(investors)
+            investorSportsData = [r for r in sportsRows[1] if r.get('investor') in invSet]
+        elif investors:
             invPh = ','.join('?' for _ in investors)
             investorSportsData = rApp.db.loadFromDB('investorSportsData', f' WHERE month = ? AND investor IN ({invPh})', inputs =(currMonth,*investors))
         else:
@@ -195,15 +200,11 @@ def portfolioSnapshot(calcs, rApp, investors :list[str], asOfDate : datetime):
             sportDf = dictToExcelDf(sportsDict,[h for h in rowHeaders if h in sportsDict],'sports')
         dataFrames['overall_family_breakdown2'] = sportDf
         #Returns vs Benchmarks ------------------------------
-        rApp.monthlyTableBtn.setChecked(False)
-        rApp.complexTableBtn.setChecked(True)
-        rApp.filterDict['Classification'].clearSelection()
-        rApp.filterDict['Classification'].setCheckedItem('HFC')
-        rApp.sortHierarchy.clearSelection()
-        rApp.sortHierarchy.setCheckedItem('subAssetClass')
-        rApp.showBenchmarkLinksBtn.setChecked(True)
-        rApp.buildTable(cancelEvent, populateTable = False)
-        table = rApp.currentTableData
+        view['mode'] = 'Complex Table'
+        setViewFilter(view, 'Classification', ['HFC'])
+        view['sortHierarchy'] = ['subAssetClass']
+        view['benchmarkLinks'] = True
+        table, _ = rApp.viewTable(view, cancelEvent)
         benchLinks = rApp.db.fetchBenchmarkLinks()
 
  
@@ -229,10 +230,12 @@ def portfolioSnapshot(calcs, rApp, investors :list[str], asOfDate : datetime):
 
     except:
         print(traceback.format_exc())
-        rApp.setEnabled(True) #release the app back to the user
-        blockMSG.destroy()
+        if holdApp:
+            rApp.setEnabled(True) #release the app back to the user
+            blockMSG.destroy()
         raise
-    rApp.populateReturnsTable(rApp.currentTableData,flagStruc = rApp.currentTableFlags)
+    if not holdApp: #batch runs skip the test workbook for each report
+        return dataFrames
     rApp.setEnabled(True) #release the app back to the user
     blockMSG.destroy()
     # Create an Excel writer using pandas (with openpyxl engine)
@@ -0,0 +1,107 @@
+import numpy as np
+from datetime import datetime
+from scripts.basicFunctions import annualizeITD
+
+def buildReturnSeries(rows : dict[dict], endTime : datetime):
+    """
+    Lays each row's monthly returns (month string -> percent) onto one contiguous month axis ending at endTime.
+    Returns (monthCount, factors, present, zeros) where factors holds 1 + r/100 (1.0 where missing),
+    present flags months that have a value and zeros flags months whose return is exactly 0.
+    Months after endTime are ignored.
+    """
+    if not rows:
+        return 0, np.ones((0, 0)), np.zeros((0, 0), dtype=bool), np.zeros((0, 0), dtype=bool)
+    parsed = {}
+    for lvl_month in rows.values():
+        for m in lvl_month:
+            if m != "dataType" and m not in parsed:
+                parsed[m] = datetime.strptime(m, "%B %Y")
+    endIdx = endTime.year * 12 + endTime.month - 1
+    startIdx = min((dt.year * 12 + dt.month - 1 for dt in parsed.values()), default=endIdx)
+    startIdx = min(startIdx, endIdx)
+    monthCount = endIdx - startIdx + 1
+    colOf = {m : dt.year * 12 + dt.month - 1 - startIdx for m, dt in parsed.items() if dt <= endTime}
+
+    factors = np.ones((len(rows), monthCount))
+    present = np.zeros((len(rows), monthCount), dtype=bool)
+    zeros = np.zeros((len(rows), monthCount), dtype=bool)
+    for r, lvl_month in enumerate(rows.values()):
+        for m, val in lvl_month.items():
+            col = colOf.get(m)
+            if col is None:
+                continue
+            val = float(val)
+            factors[r, col] = 1.0 + val / 100.0
+            present[r, col] = True
+            zeros[r, col] = val == 0
+    return monthCount, factors, present, zeros
+
+def prefixSums(arr):
+    #prefix sums with a leading zero column so a window [s, e) is prefix[:, e] - prefix[:, s]
+    prefix = np.zeros((arr.shape[0], arr.shape[1] + 1))
+    np.cumsum(arr, axis=1, out=prefix[:, 1:])
+    return prefix
+
+def trailingWindowReturns(rows : dict[dict], endTime : datetime, windows : dict[str,int], yearWindows : dict[str,int], navZero : list[bool]):
+    """
+    Compounds every trailing window for all rows at once using prefix sums of log growth factors.
+    windows: {header : month length} compounded over whichever months are present (MTD/QTD/YTD).
+    yearWindows: {header : years} requiring every month present, then annualized.
+    navZero: per row, skips year windows containing a 0 return when the row's NAV is zero.
+    Returns a list (same order as rows) of {header : value} including ITD.
+    Any non-positive growth factor in a window reproduces the old wiped-out handling ('N/A').
+    """
+    if not rows:
+        return []
+    monthCount, factors, present, zeros = buildReturnSeries(rows, endTime)
+    bad = present & (factors <= 0)
+    logFactors = np.log(np.where(bad, 1.0, factors))
+    logPrefix = prefixSums(logFactors)
+    badPrefix = prefixSums(bad)
+    presentPrefix = prefixSums(present)
+    zeroPrefix = prefixSums(zeros)
+    end = monthCount
+    results = [{} for _ in range(len(rows))]
+
+    def window(prefix, length):
+        start = max(end - length, 0)
+        return prefix[:, end] - prefix[:, start], end - start == length
+
+    for header, length in windows.items():
+        logs, _ = window(logPrefix, length)
+        bads, _ = window(badPrefix, length)
+        growth = np.exp(logs)
+        for r in range(len(rows)):
+            results[r][header] = float(growth[r] - 1.0) * 100.0 if not bads[r] and growth[r] > 0 else 'N/A'
+
+    for header, years in yearWindows.items():
+        length = 12 * years
+        logs, fullSpan = window(logPrefix, length)
+        if not fullSpan: #window reaches before the earliest month so no row can be complete
+            continue
+        bads, _ = window(badPrefix, length)
+        counts, _ = window(presentPrefix, length)
+        zeroCounts, _ = window(zeroPrefix, length)
+        annualized = np.exp(logs / years)
+        for r in range(len(rows)):
+            if counts[r] != length or (navZero[r] and zeroCounts[r]):
+                continue
+            results[r][header] = float(annualized[r] - 1.0) * 100.0 if not bads[r] else 'N/A'
+
+    #ITD runs over every present month up to the end month, in order
+    firstBad = bad.argmax(axis=1)
+    for r in range(len(rows)):
+        if not present[r, end - 1]:
+            continue
+        count = int(presentPrefix[r, end])
+        if count < 2:
+            #ITD is just the end month if no more months are found
+            results[r]["ITD"] = float(factors[r, end - 1] - 1.0) * 100.0
+        elif badPrefix[r, end]:
+            if factors[r, firstBad[r]] < 0: #went negative part way through
+                results[r]["ITD"] = annualizeITD(-1.999, 14)
+            else: #wiped out to zero, which stays zero for the remaining months
+                results[r]["ITD"] = annualizeITD(0.0, count)
+        else:
+            results[r]["ITD"] = annualizeITD(float(np.exp(logPrefix[r, end])), count)
+    return results
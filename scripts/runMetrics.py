@@ -0,0 +1,185 @@
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from scripts.commonValues import runTracesKept
+
+#Span timings for the import and calculation pipeline. The parent keeps spans only while a run is active. Pool workers
+#send theirs to the parent through the calculation log queue (scripts.calcLog). finishRunMetrics saves every span of
+#the run to the runMetrics table under the run's lastImport, next to the history row, and writes a Chrome trace of it.
+_lock = threading.Lock()
+_spans = []
+_runId = None
+
+def peakRSSmb():
+    #peak resident memory of this process in MB, or None if the platform does not report it
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+        class memoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD), ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t), ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+        info = memoryCounters()
+        info.cb = ctypes.sizeof(info)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(info), info.cb)
+        return round(info.PeakWorkingSetSize / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+class span:
+    """
+    Times one stage of the current run. Use as a context manager, or call end() yourself when the stage spans a try/finally.
+    rows can be set on the span before it ends. Extra keyword arguments are stored with it.
+    """
+    def __init__(self, name : str, detail : str = None, rows : int = None, **attrs):
+        self.name = name
+        self.detail = detail
+        self.rows = rows
+        self.attrs = attrs
+        self.start = time.time()
+        self._perfStart = time.perf_counter()
+        self._ended = False
+    def __enter__(self):
+        return self
+    def __exit__(self, excType, exc, trace):
+        if excType is not None:
+            self.attrs['error'] = excType.__name__
+        self.end()
+        return False
+    def end(self, rows : int = None):
+        if self._ended:
+            return
+        self._ended = True
+        if rows is not None:
+            self.rows = rows
+        entry = {'name' : self.name, 'detail' : self.detail, 'start' : self.start, 'duration' : time.perf_counter() - self._perfStart,
+                 'pid' : os.getpid(), 'thread' : threading.current_thread().name, 'rows' : self.rows, 'peakRSSmb' : peakRSSmb(), 'attrs' : self.attrs}
+        if multiprocessing.parent_process() is not None:
+            from scripts.calcLog import calcLogger
+            calcLogger.info('span', extra = {'span' : entry})
+        else:
+            addSpan(entry)
+
+def addSpan(entry : dict):
+    with _lock:
+        if _runId is not None:
+            _spans.append(entry)
+
+def startRunMetrics():
+    """Parent side, when an import starts. Spans recorded from here belong to this run"""
+    global _runId
+    with _lock:
+        _spans.clear()
+        _runId = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def finishRunMetrics(db, lastImport : str = None, status : str = 'completed'):
+    """
+    Parent side, after the worker log queue is drained. Saves the run's spans and writes its Chrome trace.
+    Returns the per stage comparison against earlier runs.
+    """
+    global _runId
+    with _lock:
+        runId, spans = _runId, list(_spans)
+        _spans.clear()
+        _runId = None
+    if runId is None or not spans:
+        return ''
+    try:
+        db.saveRunMetrics(runId, lastImport, status, spans)
+        writeChromeTrace(runId, spans)
+        return compareRuns(db)
+    except Exception as e:
+        print(f"Failed to save run metrics: {e} {e.args}")
+        return ''
+
+def chromeTrace(spans : list[dict]):
+    #trace event json for chrome://tracing or ui.perfetto.dev. One track per process and thread
+    if not spans:
+        return {'traceEvents' : []}
+    origin = min(s['start'] for s in spans)
+    mainPid = os.getpid()
+    threadIds = {}
+    events = []
+    for s in spans:
+        tid = threadIds.setdefault((s['pid'], s['thread']), len(threadIds) + 1)
+        args = {key : val for key, val in (s.get('attrs') or {}).items()}
+        if s.get('detail') is not None:
+            args['detail'] = s['detail']
+        if s.get('rows') is not None:
+            args['rows'] = s['rows']
+        if s.get('peakRSSmb') is not None:
+            args['peakRSSmb'] = s['peakRSSmb']
+        events.append({'name' : s['name'] if s.get('detail') is None else f"{s['name']} {s['detail']}", 'cat' : s['name'], 'ph' : 'X',
+                       'ts' : round((s['start'] - origin) * 1e6), 'dur' : round(s['duration'] * 1e6), 'pid' : s['pid'], 'tid' : tid, 'args' : args})
+    for (pid, thread), tid in threadIds.items():
+        events.append({'name' : 'thread_name', 'ph' : 'M', 'pid' : pid, 'tid' : tid, 'args' : {'name' : thread}})
+    for pid in {pid for pid, _ in threadIds}:
+        events.append({'name' : 'process_name', 'ph' : 'M', 'pid' : pid, 'args' : {'name' : 'app' if pid == mainPid else f'worker {pid}'}})
+    return {'traceEvents' : events, 'displayTimeUnit' : 'ms'}
+
+def runTraceDir():
+    from scripts.instantiate_basics import ASSETS_DIR
+    if not ASSETS_DIR:
+        return None
+    folder = Path(ASSETS_DIR) / 'runTraces'
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder
+
+def writeChromeTrace(runId : str, spans : list[dict]):
+    #assets/runTraces/<runId>.json, keeping the newest runTracesKept
+    folder = runTraceDir()
+    if folder is None:
+        return None
+    path = folder / f"{runId.replace(':', '').replace(' ', '_')}.json"
+    with open(path, 'w') as file:
+        json.dump(chromeTrace(spans), file, default=str)
+    for old in sorted(folder.glob('*.json'), reverse = True)[runTracesKept:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+    return path
+
+def exportChromeTrace(db, runId : str, path : str):
+    """Writes any saved run from the runMetrics table as a Chrome trace, to compare against another day's run"""
+    with open(path, 'w') as file:
+        json.dump(chromeTrace(db.loadRunMetrics(runId)), file, default=str)
+
+def stageTotals(spans : list[dict]):
+    #stage name : [seconds, rows, spans]. Worker stages overlap, so their seconds add up to more than the wall time
+    totals = {}
+    for s in spans:
+        total = totals.setdefault(s['name'], [0.0, 0, 0])
+        total[0] += s['duration']
+        total[1] += s['rows'] or 0
+        total[2] += 1
+    return totals
+
+def compareRuns(db, runs : int = 5):
+    """Per stage seconds of the latest run next to the average of the runs before it"""
+    runIds = db.runMetricsIds()[:runs]
+    if not runIds:
+        return ''
+    latest = db.loadRunMetrics(runIds[0])
+    previous = [stageTotals(db.loadRunMetrics(runId)) for runId in runIds[1:]]
+    wall = max(s['start'] + s['duration'] for s in latest) - min(s['start'] for s in latest)
+    peak = max((s['peakRSSmb'] or 0 for s in latest), default = 0)
+    lines = [f"Run {runIds[0]}: {wall:.1f}s wall, peak RSS {peak:.0f}MB" + (f", compared to the average of {len(previous)} earlier runs" if previous else '')]
+    for name, (seconds, rows, count) in sorted(stageTotals(latest).items(), key = lambda item: -item[1][0]):
+        earlier = [totals[name][0] for totals in previous if name in totals]
+        before = f"  (before {sum(earlier) / len(earlier):8.2f}s)" if earlier else ''
+        lines.append(f"  {name:<22} {seconds:8.2f}s  {count:5} spans  {rows:9} rows{before}")
+    return '\n'.join(lines)
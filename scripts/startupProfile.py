@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+#imported first in calculateReturns so every phase is timed from process start
+_start = time.perf_counter()
+_marks = [] #(phase, secondsSinceStart, modulesLoaded, newTopLevelPackages)
+_seen = set(sys.modules)
+_painted = False
+
+def mark(phase : str):
+    """Records the time since startup and the top level packages imported since the previous mark"""
+    global _seen
+    loaded = set(sys.modules)
+    new = loaded - _seen
+    _seen = loaded
+    counts = {}
+    for name in new:
+        top = name.split('.')[0]
+        counts[top] = counts.get(top, 0) + 1
+    _marks.append((phase, time.perf_counter() - _start, len(loaded), counts))
+
+def watchFirstPaint(widget, onPainted = None):
+    """Marks 'first paint' the first time widget paints, then writes the report. Call before widget.show()"""
+    from PyQt5.QtCore import QObject, QEvent
+    class paintWatcher(QObject):
+        def eventFilter(self, obj, event):
+            global _painted
+            if event.type() == QEvent.Paint and not _painted:
+                _painted = True
+                mark('first paint')
+                obj.removeEventFilter(self)
+                writeReport()
+                if onPainted:
+                    onPainted()
+            return False
+    watcher = paintWatcher(widget)
+    widget.installEventFilter(watcher)
+    return watcher
+
+def deferredLoadedEarly():
+    #modules that should load on first use but were already imported at the last mark
+    from scripts.commonValues import startupDeferredModules
+    return [name for name in startupDeferredModules if name in sys.modules]
+
+def report():
+    lines = ['Startup profile:']
+    previous = 0.0
+    for phase, elapsed, modules, counts in _marks:
+        heaviest = sorted(counts.items(), key = lambda item: -item[1])[:6]
+        newText = ', '.join(f'{name}({count})' for name, count in heaviest)
+        lines.append(f'  {phase:<22} {elapsed * 1000:8.0f}ms  +{(elapsed - previous) * 1000:6.0f}ms  {modules} modules  new: {newText}')
+        previous = elapsed
+    early = deferredLoadedEarly()
+    if early:
+        lines.append(f'  WARNING: deferred modules loaded before first paint: {", ".join(early)}')
+    return '\n'.join(lines)
+
+def writeReport():
+    """Prints the report and appends one json line per startup to assets/startupProfile.jsonl to track regressions"""
+    from scripts.instantiate_basics import ASSETS_DIR
+    print(report())
+    if not ASSETS_DIR:
+        return
+    entry = {'time' : datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'frozen' : bool(getattr(sys, 'frozen', False)),
+             'phases' : {phase : round(elapsed, 4) for phase, elapsed, _, _ in _marks},
+             'modules' : _marks[-1][2] if _marks else len(sys.modules), 'deferredLoadedEarly' : deferredLoadedEarly()}
+    try:
+        with open(os.path.join(ASSETS_DIR, 'startupProfile.jsonl'), 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+    except Exception as e:
+        print(f'Could not write the startup profile: {e}')
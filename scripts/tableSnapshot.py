@@ -0,0 +1,65 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from scripts.commonValues import currentVersion, tableSnapshotsKept
+from scripts.instantiate_basics import ASSETS_DIR
+
+def tableSnapshotDir():
+    folder = Path(ASSETS_DIR) / 'tableSnapshots'
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder
+
+def tableSnapshotPath(configKey : str):
+    return tableSnapshotDir() / f"{hashlib.sha1(configKey.encode('utf-8')).hexdigest()}.json.gz"
+
+def saveTableSnapshot(configKey : str, generation : str, rows : dict, flags : dict, headers : list[str], colorDepths : list[float]):
+    """
+    Writes the last built returns table for one control configuration as gzipped json.
+    generation is the database stamp the table was built from, so a later launch can tell if it is still current.
+    """
+    try:
+        payload = {'version' : currentVersion, 'configKey' : configKey, 'generation' : generation, 'savedAt' : datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                   'rows' : rows, 'flags' : flags, 'headers' : headers, 'colorDepths' : colorDepths}
+        path = tableSnapshotPath(configKey)
+        tmpPath = path.with_suffix('.tmp')
+        with gzip.open(tmpPath, 'wt', encoding='utf-8', compresslevel=3) as file:
+            json.dump(payload, file, default=str, separators=(',', ':'))
+        os.replace(tmpPath, path) #a launch never reads a half written snapshot
+        evictTableSnapshots()
+    except Exception as e:
+        print(f"Failed to save the returns table snapshot: {e}")
+
+def loadTableSnapshot(configKey : str):
+    #the snapshot for this configuration or None if there is none or it came from another version
+    path = tableSnapshotPath(configKey)
+    if not path.exists():
+        return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            payload = json.load(file)
+    except Exception as e:
+        print(f"Ignoring unreadable returns table snapshot: {e}")
+        return None
+    if payload.get('version') != currentVersion or payload.get('configKey') != configKey:
+        return None
+    os.utime(path) #mtime tracks last use for eviction
+    return payload
+
+def evictTableSnapshots(keep : int = tableSnapshotsKept):
+    #least recently used first
+    files = sorted(tableSnapshotDir().glob('*.json.gz'), key = lambda f: f.stat().st_mtime, reverse = True)
+    for f in files[keep:]:
+        try:
+            f.unlink()
+        except OSError:
+            pass
+
+def clearTableSnapshots():
+    for f in tableSnapshotDir().glob('*.json.gz'):
+        try:
+            f.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,23 @@
+from classes.engineRecords import toEngineRecords
+from scripts.balanceResolver import resolveBalances, uniqueBalances
+
+def effectiveBalances():
+    #one winner per date, source, target, fund class and sub-account, picked as handleFundClasses did before
+    base = {'Date' : '2024-03-31T00:00:00', 'Source name' : 'Pool', 'Target name' : 'Fund'}
+    rows = [{**base, 'Balancetype' : 'Manager Estimate', 'ValueInSystemCurrency' : 10.0},
+            {**base, 'Balancetype' : 'Actual', 'ValueInSystemCurrency' : 11.0},
+            {**base, 'Balancetype' : 'Actual', 'ValueInSystemCurrency' : 11.0}, #exact duplicate loses to the first
+            {**base, 'Balancetype' : 'Actual', 'ValueInSystemCurrency' : None, 'Fundclass' : 'B'},
+            {**base, 'Balancetype' : 'Adjusted', 'ValueInSystemCurrency' : 5.0, 'Fundclass' : 'B'},
+            {**base, 'Balancetype' : 'Actual', 'ValueInSystemCurrency' : 7.0, 'InvestsThrough' : 'Sub'},
+            {**base, 'Date' : '2024-04-30T00:00:00', 'Balancetype' : 'Calculated_R', 'ValueInSystemCurrency' : None}]
+    records = toEngineRecords('positions', rows)
+    winners, losers, index = resolveBalances(records)
+    if [rec.rowId for rec in winners] != [1, 4, 5, 6] or [rec.rowId for rec in losers] != [0, 2, 3]:
+        return False
+    if records[1].overrides != (0, 2) or records[4].overrides != (3,) or records[5].overrides != ():
+        return False
+    if index[('2024-03-31T00:00:00', 'Pool', 'Fund', 'B', None)] is not records[4]:
+        return False
+    byMonth = {'2024-03' : winners[:3], '2024-04' : winners} #a month end balance is filed under two months
+    return uniqueBalances(byMonth) == winners
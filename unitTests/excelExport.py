@@ -0,0 +1,58 @@
+import os
+import time
+import tempfile
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import PatternFill
+from scripts.commonValues import percent_headers
+from scripts.excelExport import exportRows
+
+def cellByCellExport(path, columns, rows):
+    #the export path used before the streaming engine: a normal workbook with a new fill object per cell
+    wb = Workbook()
+    ws = wb.active
+    for idx, colname in enumerate(columns, start=1):
+        ws.cell(row=1, column=idx, value=colname)
+    for r, row in enumerate(rows, start=2):
+        fill = PatternFill("solid", "EEEEEE", "EEEEEE")
+        for c, (colname, val) in enumerate(zip(columns, row), start=1):
+            cell = ws.cell(row=r, column=c, value=val)
+            cell.fill = fill
+            if isinstance(val, (int, float)):
+                if colname not in percent_headers:
+                    cell.number_format = "#,##0.00"
+                else:
+                    cell.value = val / 100.0
+                    cell.number_format = "0.00%"
+    wb.save(path)
+
+exportColumns = ['Name', 'NAV', 'MTD', 'YTD', 'Monthly Gain', 'Commitment']
+def exportTestRows(rowCount):
+    return [(f'Fund {i}', i * 1000.5, (i % 40) - 20.25, (i % 15) * 1.5, float(i), None if i % 7 else 5.0) for i in range(rowCount)]
+
+def streamingExport():
+    #checks the streaming engine writes the same values as the cell by cell path
+    rowCount = 500
+    columns = exportColumns
+    rows = exportTestRows(rowCount)
+    with tempfile.TemporaryDirectory() as tmp:
+        oldPath, newPath = os.path.join(tmp, 'old.xlsx'), os.path.join(tmp, 'new.xlsx')
+        cellByCellExport(oldPath, columns, rows)
+        exportRows(newPath, columns, iter(rows), total = rowCount)
+        #unstyled empty trailing cells are not written, so rows are padded before comparing
+        oldVals, newVals = [[tuple(row) + (None,) * (len(columns) - len(row)) for row in load_workbook(p, read_only = True).active.iter_rows(values_only = True)]
+                            for p in (oldPath, newPath)]
+    return oldVals == newVals
+
+def streamingExportBenchmark(rowCount = 20000):
+    #opt in timing of both export paths on the same rows. Ignored in runUnitTests by default since it takes a while
+    rows = exportTestRows(rowCount)
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, export in (('cell by cell', lambda path: cellByCellExport(path, exportColumns, rows)),
+                             ('streaming', lambda path: exportRows(path, exportColumns, iter(rows), total = rowCount))):
+            start = time.perf_counter()
+            export(os.path.join(tmp, f'{name}.xlsx'))
+            timings[name] = time.perf_counter() - start
+    print(f"Excel export of {rowCount} rows: cell by cell {timings['cell by cell']:.2f}s, streaming {timings['streaming']:.2f}s "
+          f"({timings['cell by cell'] / max(timings['streaming'], 1e-9):.1f}x)")
+    return True
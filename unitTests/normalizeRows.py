@@ -0,0 +1,29 @@
+from scripts.normalizeRows import isoDateParts, monthOrdinals, normalizeRows, rowMonths
+from datetime import datetime, timedelta
+import calendar
+
+def monthFiling():
+    #months filed by index must match the old string range checks, including the EOM = next BOM overlap for positions
+    months = []
+    for year in (2023, 2024):
+        for month in range(1, 13):
+            prevYear, prevMonth = (year, month - 1) if month > 1 else (year - 1, 12)
+            months.append({'dateTime' : f"{year}-{month:02d}", 'tranStart' : f"{year}-{month:02d}-01T00:00:00",
+                           'endDay' : f"{year}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}T00:00:00",
+                           'accountStart' : f"{prevYear}-{prevMonth:02d}-{calendar.monthrange(prevYear, prevMonth)[1]:02d}T00:00:00"})
+    monthsByIdx = monthOrdinals(months)
+    day = datetime(2022, 12, 25)
+    while day < datetime(2025, 1, 5):
+        date = day.strftime("%Y-%m-%dT%H:%M:%S")
+        for positions in (True, False):
+            old = [m['dateTime'] for m in months if (m['accountStart'] if positions else m['tranStart']) <= date <= m['endDay']]
+            if [m['dateTime'] for m in rowMonths(isoDateParts(date), monthsByIdx, positions)] != old:
+                return False
+        day += timedelta(days = 1)
+    if months[1]['days'] != 28 or months[13]['days'] != 29:
+        return False
+
+    rows = normalizeRows('positions', [{'Date' : '2024-02-29 00:00:00', 'ValueInSystemCurrency' : '12.5', 'Fundclass' : 'None'},
+                                       {'Date' : 'None', 'ValueInSystemCurrency' : 3}])
+    return (len(rows) == 1 and rows[0]['Date'] == '2024-02-29T00:00:00' and rows[0]['ValueInSystemCurrency'] == 12.5
+            and rows[0]['Fundclass'] is None and isoDateParts(rows[0]['Date']).monthEnd)
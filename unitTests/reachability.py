@@ -0,0 +1,11 @@
+from TreeScripts.create_all_paths import ReachabilityIndex
+
+def cyclicReachability():
+    #a cycle leaves the closure unbuilt, so lookups must walk the graph instead
+    children = {'root' : ['a'], 'a' : ['b'], 'b' : ['a', 'leaf']}
+    parents = {'a' : ['root', 'b'], 'b' : ['a'], 'leaf' : ['b']}
+    reach = ReachabilityIndex(children, parents)
+    if reach.is_dag:
+        return False
+    return (reach.descendants('root') == {'root', 'a', 'b', 'leaf'} and reach.descendants('root', max_depth = 1) == {'root', 'a'}
+            and reach.ancestors('leaf') == {'leaf', 'b', 'a', 'root'})
@@ -7,7 +7,7 @@ import sys
 
 def pSnap():
     try:
-        workbook = portfolioSnapshot([],testApp)
+        workbook = portfolioSnapshot(testApp,[])
     except:
         print(traceback.format_exc())
         return False
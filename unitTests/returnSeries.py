@@ -0,0 +1,19 @@
+from scripts.returnSeries import buildReturnSeries, trailingWindowReturns
+from datetime import datetime
+import math
+
+def complexWindows():
+    endTime = datetime(2024,3,1)
+    rows = {
+        'steady' : {'January 2024' : 10.0, 'February 2024' : 10.0, 'March 2024' : 10.0, 'dataType' : 'Total'},
+        'wipedOut' : {'January 2024' : 5.0, 'February 2024' : -150.0, 'March 2024' : 1.0, 'dataType' : 'Total'},
+        'gap' : {'January 2024' : 10.0, 'March 2024' : 10.0, 'dataType' : 'Total'},
+    }
+    results = trailingWindowReturns(rows, endTime, {'MTD' : 1, 'QTD' : 3}, {'1YR' : 1}, [False, False, False])
+    steady, wipedOut, gap = results
+    if trailingWindowReturns({}, endTime, {'MTD' : 1}, {'1YR' : 1}, []) != [] or buildReturnSeries(None, endTime)[0] != 0:
+        return False
+    return (math.isclose(steady['MTD'], 10.0) and math.isclose(steady['QTD'], 33.1)
+            and math.isclose(steady['ITD'], 33.1) and '1YR' not in steady
+            and wipedOut['QTD'] == 'N/A' and math.isclose(wipedOut['MTD'], 1.0)
+            and math.isclose(gap['QTD'], 21.0))